@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compares the event throughput of the dispatcher and the latency of the
+HTTP client on the default asyncio loop and on uvloop.
+
+The Discord gateway and REST API are replaced by local stand-ins, so
+the numbers only reflect the overhead of the library and the loop.
+
+Usage::
+
+    python benchmarks/event_loop.py [--events 20000] [--requests 2000]
+"""
+
+import asyncio
+import json
+from argparse import ArgumentParser
+from statistics import mean, quantiles
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from aiohttp import web
+from websockets import serve
+
+from pincer import Client
+from pincer._config import GatewayConfig
+from pincer.core.http import HTTPClient
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+HOST = "127.0.0.1"
+GATEWAY_PORT = 8710
+REST_PORT = 8711
+TOKEN = "x" * 59
+
+
+class BenchClient(Client):
+    """
+    Closes itself and the gateway stand-in after receiving the expected
+    amount of events.
+    """
+    server = None
+    expected: int = 0
+    received: int = 0
+    first: float = 0
+    last: float = 0
+
+    @Client.event
+    async def on_typing_start(self):
+        if not self.received:
+            self.first = perf_counter()
+
+        self.received += 1
+
+        if self.received == self.expected:
+            self.last = perf_counter()
+            self.server.close()
+            await self.close()
+
+
+async def mock_gateway(events: int):
+    """Gateway stand-in which sends a burst of dispatches after hello."""
+    message = json.dumps({
+        "op": 0, "s": 1, "t": "TYPING_START",
+        "d": {"channel_id": "1", "user_id": "2", "timestamp": 0}
+    })
+
+    async def handler(socket, *_):
+        await socket.send(json.dumps(
+            {"op": 10, "d": {"heartbeat_interval": 45000}}
+        ))
+        await socket.recv()  # identify
+        await socket.recv()  # first heartbeat
+
+        for _ in range(events):
+            await socket.send(message)
+
+        await socket.wait_closed()
+
+    return await serve(handler, HOST, GATEWAY_PORT)
+
+
+async def mock_rest() -> web.AppRunner:
+    """REST stand-in which answers every request with a small object."""
+    async def handler(_):
+        return web.json_response({"id": "1", "name": "bench"})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, REST_PORT).start()
+    return runner
+
+
+def bench_events(new_loop: Callable, events: int) -> float:
+    """
+    :return:
+        The amount of events per second which reached the handler.
+    """
+    loop = new_loop()
+    asyncio.set_event_loop(loop)
+    BenchClient.server = loop.run_until_complete(mock_gateway(events))
+    BenchClient.expected = events
+
+    client = BenchClient(TOKEN)
+    client.run(loop=loop)
+    return events / (client.last - client.first)
+
+
+def bench_http(new_loop: Callable, requests: int) -> List[float]:
+    """
+    :return:
+        The latency of every request in seconds.
+    """
+    loop = new_loop()
+    asyncio.set_event_loop(loop)
+
+    async def run():
+        runner = await mock_rest()
+        timings = []
+
+        # The mock has no rate limits, a high global rate keeps the
+        # limiter from pacing the requests and skewing the latencies.
+        async with HTTPClient(
+            TOKEN,
+            base_url=f"http://{HOST}:{REST_PORT}/api/v9",
+            global_rate=requests + 1
+        ) as http:
+
+            for _ in range(requests):
+                start = perf_counter()
+                await http.get("guilds/123456789012345678")
+                timings.append(perf_counter() - start)
+
+        await runner.cleanup()
+        return timings
+
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    GatewayConfig.socket_base_url = f"ws://{HOST}:{GATEWAY_PORT}/"
+    loops: Dict[str, Callable] = {"asyncio": asyncio.new_event_loop}
+
+    if uvloop:
+        loops["uvloop"] = uvloop.new_event_loop
+    else:
+        print("uvloop is not installed, only benchmarking asyncio.\n")
+
+    print(
+        f"{'loop':<10}{'events/s':>12}{'http mean':>14}"
+        f"{'http p50':>12}{'http p99':>12}"
+    )
+
+    for name, new_loop in loops.items():
+        throughput = bench_events(new_loop, args.events)
+        timings = bench_http(new_loop, args.requests)
+        percentiles = quantiles(timings, n=100)
+
+        print(
+            f"{name:<10}{throughput:>12.0f}"
+            f"{mean(timings) * 1000:>12.3f}ms"
+            f"{percentiles[49] * 1000:>10.3f}ms"
+            f"{percentiles[98] * 1000:>10.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,6 @@ __license__ = "MIT"
 __version__ = "0.4.1-dev"
 __description__ = "Discord API wrapper rebuild from scratch."
 
-from pincer.client import Client, Bot
+from pincer.client import Client, Bot, ClientPool
 
-__all__ = ("Client", "Bot")
+__all__ = ("Client", "Bot", "ClientPool")
@@ -37,8 +37,11 @@ class GatewayConfig:
     compression: str = "zlib-stream"
 
     @staticmethod
-    def uri() -> str:
+    def uri(compressed: bool = False) -> str:
         """
+        :param compressed:
+            Whether or not to ask for transport compression.
+
         :return uri:
             The GatewayConfig's uri.
         """
@@ -46,7 +49,7 @@ class GatewayConfig:
             f"{GatewayConfig.socket_base_url}"
             f"?v={GatewayConfig.version}"
             f"&encoding={GatewayConfig.encoding}"
-        )
+        ) + (f"&compress={GatewayConfig.compression}" if compressed else "")
 
 
 events = [
@@ -25,20 +25,44 @@
 from __future__ import annotations
 
 import logging
-from asyncio import iscoroutinefunction
-from typing import Optional, Any, Union, Dict, Tuple, List
+from asyncio import AbstractEventLoop, gather, iscoroutinefunction, sleep
+from concurrent.futures import Executor
+from typing import (
+    TYPE_CHECKING, Optional, Any, Union, Dict, Tuple, List, Iterable,
+    Sequence, Type
+)
+
+from aiohttp import BaseConnector, TCPConnector
 
 from pincer import __package__
 from pincer._config import events
+from pincer.core.cache import ResponseCache
 from pincer.core.dispatch import GatewayDispatch
-from pincer.core.gateway import Dispatcher
-from pincer.core.http import HTTPClient
-from pincer.exceptions import InvalidEventName
+from pincer.core.download import using_default_downloader
+from pincer.core.gateway import Dispatcher, new_loop
+from pincer.core.http import HTTPClient, create_connector
+from pincer.core.metrics import MetricsServer
+from pincer.core.ratelimit_store import SharedRateLimitStore
+from pincer.core.tracing import (
+    TraceConfig, HandlerEndParams, HandlerStartParams, MiddlewareEndParams,
+    MiddlewareStartParams, send_trace
+)
+from pincer.core.upload import File
+from pincer.exceptions import (
+    DisallowedIntentsError, InvalidEventName, InvalidTokenError
+)
+from pincer.objects.channel import Channel
+from pincer.objects.embed import Embed
+from pincer.objects.guild import Guild
+from pincer.objects.guild_member import GuildMember
 from pincer.objects.user import User
 from pincer.utils.extraction import get_index
 from pincer.utils.insertion import should_pass_cls
 from pincer.utils.types import Coro
 
+if TYPE_CHECKING:
+    from pincer.objects.message import Message
+
 _log = logging.getLogger(__package__)
 
 middleware_type = Optional[Union[Coro, Tuple[str, List[Any], Dict[str, Any]]]]
@@ -139,6 +163,7 @@ def middleware(call: str, *, override: bool = False):
                 else await func(payload)
             )
 
+        wrapper.__wrapped__ = func
         _events[call] = wrapper
         return wrapper
 
@@ -146,7 +171,24 @@ def middleware(call: str, *, override: bool = False):
 
 
 class Client(Dispatcher):
-    def __init__(self, token: str):
+    def __init__(
+            self,
+            token: str, *,
+            metrics_port: Optional[int] = None,
+            metrics_host: str = "127.0.0.1",
+            trace_configs: Optional[Iterable[TraceConfig]] = None,
+            stall_threshold: Optional[float] = None,
+            heartbeat_thread: bool = False,
+            compressed: bool = False,
+            decode_threshold: int = 512 * 1024,
+            decode_executor: Optional[Executor] = None,
+            stream_events: Optional[Dict[str, Iterable[str]]] = None,
+            queue_size: int = 256,
+            connector: Optional[BaseConnector] = None,
+            ratelimit_store: Optional[SharedRateLimitStore] = None,
+            http_base_url: Optional[str] = None,
+            response_cache: Optional[ResponseCache] = None
+    ):
         """
         The client is the main instance which is between the programmer
             and the discord API.
@@ -156,6 +198,76 @@ class Client(Dispatcher):
         :param token:
             The secret bot token which can be found in
             `<https://discord.com/developers/applications/\<bot_id\>/bot>`_
+
+        Keyword Arguments:
+
+        :param metrics_port:
+            If set, the client its metrics get served in the Prometheus
+            text format on ``http://<metrics_host>:<port>/metrics``.
+
+        :param metrics_host:
+            The interface on which the metrics endpoint listens.
+            Defaults to localhost only.
+
+        :param trace_configs:
+            Hooks which get called for every stage of an event and the
+            REST requests which are made while handling it.
+            See :class:`~.core.tracing.TraceConfig`.
+
+        :param stall_threshold:
+            If set, every time a handler or middleware blocks the event
+            loop for longer than this amount of seconds, it gets logged
+            together with a stack sample.
+
+        :param heartbeat_thread:
+            Keep the heartbeat schedule on a dedicated thread, so it
+            keeps its timing while the event loop is blocked. The beats
+            are still sent from the loop.
+
+        :param compressed:
+            Use ``zlib-stream`` transport compression for the gateway.
+
+        :param decode_threshold:
+            Gateway messages of at least this amount of bytes get
+            inflated on a worker thread and, if a ``decode_executor`` is
+            given, decoded on that executor.
+
+        :param decode_executor:
+            The executor on which large gateway payloads get decoded.
+            Use a :class:`~concurrent.futures.ProcessPoolExecutor` to
+            keep the event loop free while decoding. They are decoded
+            inline by default.
+
+        :param stream_events:
+            Event names with the keys of their data which contain large
+            arrays, eg ``{"guild_create": ("members", "presences")}``.
+            These arrays are decoded one element at a time while they
+            are iterated over, instead of all at once.
+            See :class:`~.core.streaming.StreamedArray`.
+
+        :param queue_size:
+            The maximum amount of gateway messages which can wait
+            between the read, decode and dispatch stages.
+
+        :param connector:
+            The connection pool for REST requests, this lets multiple
+            clients share their connections and DNS cache.
+            See :class:`~.ClientPool`.
+
+        :param ratelimit_store:
+            Share the REST rate limits with the other processes of the
+            bot on this host, eg when every shard runs in its own
+            process. See
+            :class:`~.core.ratelimit_store.SharedRateLimitStore`.
+
+        :param http_base_url:
+            Send REST requests to this url instead of the Discord API,
+            eg to a :mod:`pincer.proxy` which rate limits the requests
+            of all processes of the bot.
+
+        :param response_cache:
+            Cache the responses of REST routes which rarely change.
+            See :class:`~.core.cache.ResponseCache`.
         """
         # TODO: Implement intents
         super().__init__(
@@ -163,18 +275,36 @@ class Client(Dispatcher):
             handlers={
                 # Use this event handler for opcode 0.
                 0: self.event_handler
-            }
+            },
+            metrics_port=metrics_port,
+            metrics_host=metrics_host,
+            trace_configs=trace_configs,
+            stall_threshold=stall_threshold,
+            heartbeat_thread=heartbeat_thread,
+            compressed=compressed,
+            decode_threshold=decode_threshold,
+            decode_executor=decode_executor,
+            stream_events=stream_events,
+            queue_size=queue_size
         )
 
         self.bot: Optional[User] = None
+        self.connector = connector
+        self.ratelimit_store = ratelimit_store
+        self.http_base_url = http_base_url
+        self.response_cache = response_cache
         self.__token = token
+        self.__http: Optional[HTTPClient] = None
 
     @property
-    def _http(self):
+    def _http(self) -> HTTPClient:
         """
         Returns a http client with the current client its
         authentication credentials.
 
+        The same http client, and so its connections, are reused for
+        all requests. It gets closed when the client stops.
+
         :Usage example:
 
         .. code-block:: pycon
@@ -190,7 +320,162 @@ class Client(Dispatcher):
             ...    )
 
         """
-        return HTTPClient(self.__token)
+        if self.__http is None:
+            self.__http = HTTPClient(
+                self.__token,
+                trace_configs=self.trace_configs,
+                connector=self.connector,
+                persistent=True,
+                ratelimit_store=self.ratelimit_store,
+                base_url=self.http_base_url,
+                cache=self.response_cache
+            )
+
+        return self.__http
+
+    async def start(self):
+        """
+        Start the client and wait until it has been closed, see
+        :meth:`~.Dispatcher.start`.
+        """
+        try:
+            async with using_default_downloader():
+                await super().start()
+        finally:
+            if self.__http:
+                await self.__http.close()
+
+    async def fetch_guild(
+            self,
+            guild_id: Union[int, str], *,
+            with_counts: bool = False,
+            raw: bool = False
+    ) -> Union[Guild, Dict]:
+        """
+        Fetch a guild with ``GET guilds/{guild_id}``.
+
+        :param guild_id:
+            The id of the guild.
+
+        Keyword Arguments:
+
+        :param with_counts:
+            Include the approximate member and presence counts.
+
+        :param raw:
+            Return the response dict instead of parsing it, for hot paths
+            which don't need the object.
+        """
+        route = f"guilds/{guild_id}"
+
+        if with_counts:
+            route += "?with_counts=true"
+
+        data = await self._http.get(route)
+        return data if raw else Guild.from_dict(data)
+
+    async def fetch_channel(
+            self,
+            channel_id: Union[int, str], *,
+            raw: bool = False
+    ) -> Union[Channel, Dict]:
+        """
+        Fetch a channel with ``GET channels/{channel_id}``.
+
+        :param channel_id:
+            The id of the channel.
+
+        Keyword Arguments:
+
+        :param raw:
+            Return the response dict instead of parsing it.
+        """
+        data = await self._http.get(f"channels/{channel_id}")
+        return data if raw else Channel.from_dict(data)
+
+    async def send_message(
+            self,
+            channel_id: Union[int, str],
+            content: Optional[str] = None, *,
+            embeds: Iterable[Embed] = (),
+            files: Sequence[File] = (),
+            raw: bool = False,
+            **fields: Any
+    ) -> Union[Message, Dict]:
+        """
+        Send a message with ``POST channels/{channel_id}/messages``.
+
+        :param channel_id:
+            The id of the channel to send the message to.
+
+        :param content:
+            The text of the message.
+
+        Keyword Arguments:
+
+        :param embeds:
+            The embeds of the message.
+
+        :param files:
+            Attachments which get streamed with the request.
+
+        :param raw:
+            Return the response dict instead of parsing it.
+
+        :param fields:
+            Other fields of the message, eg ``tts`` or
+            ``message_reference``.
+        """
+        data = {**fields}
+
+        if content is not None:
+            data["content"] = content
+
+        if embeds:
+            data["embeds"] = [embed.to_dict() for embed in embeds]
+
+        response = await self._http.post(
+            f"channels/{channel_id}/messages", data, files=files or None
+        )
+
+        if raw:
+            return response
+
+        # Imported here, as the message module imports the interactions
+        # module, which imports it back.
+        from pincer.objects.message import Message
+        return Message.from_dict(response)
+
+    async def edit_member(
+            self,
+            guild_id: Union[int, str],
+            user_id: Union[int, str], *,
+            raw: bool = False,
+            **fields: Any
+    ) -> Union[GuildMember, Dict]:
+        """
+        Edit a guild member with
+        ``PATCH guilds/{guild_id}/members/{user_id}``.
+
+        :param guild_id:
+            The id of the guild.
+
+        :param user_id:
+            The id of the member.
+
+        Keyword Arguments:
+
+        :param raw:
+            Return the response dict instead of parsing it.
+
+        :param fields:
+            The fields to change, eg ``nick``, ``roles``, ``mute``,
+            ``deaf`` or ``channel_id``.
+        """
+        data = await self._http.patch(
+            f"guilds/{guild_id}/members/{user_id}", fields
+        )
+        return data if raw else GuildMember.from_dict(data)
 
     @staticmethod
     def event(coroutine: Coro):
@@ -299,7 +584,31 @@ class Client(Dispatcher):
         next_call, arguments, params = ware, list(), dict()
 
         if iscoroutinefunction(ware):
-            extractable = await ware(self, payload, *args, **kwargs)
+            await send_trace(
+                self.trace_configs,
+                "on_middleware_start",
+                MiddlewareStartParams(key, payload, ware)
+            )
+
+            try:
+                extractable = await ware(self, payload, *args, **kwargs)
+            except Exception as exc:
+                await send_trace(
+                    self.trace_configs,
+                    "on_middleware_end",
+                    MiddlewareEndParams(key, None, exc)
+                )
+                raise
+
+            await send_trace(
+                self.trace_configs,
+                "on_middleware_end",
+                MiddlewareEndParams(
+                    key,
+                    get_index(extractable, 0)
+                    if isinstance(extractable, tuple) else None
+                )
+            )
 
             if not isinstance(extractable, tuple):
                 raise RuntimeError(
@@ -341,10 +650,30 @@ class Client(Dispatcher):
         call = _events.get(key)
 
         if iscoroutinefunction(call):
-            if should_pass_cls(call):
-                await call(self, *args, **kwargs)
-            else:
-                await call(*args, **kwargs)
+            await send_trace(
+                self.trace_configs,
+                "on_handler_start",
+                HandlerStartParams(key, call)
+            )
+
+            try:
+                if should_pass_cls(call):
+                    await call(self, *args, **kwargs)
+                else:
+                    await call(*args, **kwargs)
+            except Exception as exc:
+                await send_trace(
+                    self.trace_configs,
+                    "on_handler_end",
+                    HandlerEndParams(key, call, exc)
+                )
+                raise
+
+            await send_trace(
+                self.trace_configs,
+                "on_handler_end",
+                HandlerEndParams(key, call)
+            )
 
     @middleware("ready")
     async def on_ready_middleware(self, payload: GatewayDispatch):
@@ -357,4 +686,230 @@ class Client(Dispatcher):
         return "on_ready",
 
 
+class ClientPool:
+    """
+    Runs the clients of multiple bot tokens on one event loop.
+
+    The clients share a single REST connection pool and decode executor,
+    instead of every client opening its own. JSON is handled by the
+    :mod:`json` module, which holds no state per client, so the codec
+    is shared as well. The metrics of all clients are served once, by
+    the pool.
+
+    Every client runs on its own, a client which crashes is restarted
+    without stopping the others. Clients with an invalid token or
+    disallowed intents are not restarted.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> pool = ClientPool(("token_one", "token_two"))
+        >>> pool.run()
+    """
+
+    def __init__(
+            self,
+            tokens: Iterable[str] = (), *,
+            client_cls: Type[Client] = Client,
+            decode_executor: Optional[Executor] = None,
+            connector_limit: int = 100,
+            keepalive_timeout: float = 30,
+            dns_ttl: int = 300,
+            metrics_port: Optional[int] = None,
+            metrics_host: str = "127.0.0.1",
+            restart_delay: Optional[float] = 5,
+            max_restart_delay: float = 300,
+            **client_options: Any
+    ):
+        """
+        :param tokens:
+            The bot tokens for which a client gets created.
+
+        Keyword Arguments:
+
+        :param client_cls:
+            The client class which gets instantiated for every token.
+
+        :param decode_executor:
+            The executor on which large gateway payloads of all clients
+            get decoded. See :class:`~.Client`.
+
+        :param connector_limit:
+            The maximum amount of simultaneous REST connections of all
+            clients combined.
+
+        :param keepalive_timeout:
+            The amount of seconds for which an idle REST connection is
+            kept open.
+
+        :param dns_ttl:
+            The amount of seconds for which resolved hosts get cached.
+
+        :param metrics_port:
+            If set, the metrics of all clients get served on
+            ``http://<metrics_host>:<port>/metrics``.
+
+        :param metrics_host:
+            The interface on which the metrics endpoint listens.
+
+        :param restart_delay:
+            The amount of seconds after which a crashed client gets
+            started again, it doubles for every next crash of the same
+            client. ``None`` to not restart clients.
+
+        :param max_restart_delay:
+            The maximum amount of seconds before a restart.
+
+        :param client_options:
+            Passed on to every client. A ``response_cache`` can be
+            shared, as it keeps the responses of every bot apart.
+
+        :raises ValueError:
+            An option is given which can't be shared by the clients of
+            different bots.
+        """
+        for option in ("ratelimit_store",):
+            if option in client_options:
+                raise ValueError(
+                    f"`{option}` can't be shared by different bots, as "
+                    "Discord rate limits every bot separately. Create "
+                    "the clients which need it with `Client` instead."
+                )
+
+        self.clients: List[Client] = []
+        self.connector: Optional[TCPConnector] = None
+        self.metrics_server: Optional[MetricsServer] = (
+            MetricsServer(metrics_port, host=metrics_host)
+            if metrics_port is not None else None
+        )
+
+        self.__client_cls = client_cls
+        self.__decode_executor = decode_executor
+        self.__connector_limit = connector_limit
+        self.__keepalive_timeout = keepalive_timeout
+        self.__dns_ttl = dns_ttl
+        self.__restart_delay = restart_delay
+        self.__max_restart_delay = max_restart_delay
+        self.__client_options = client_options
+
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token: str) -> Client:
+        """
+        Create a client for a token, clients which get added after the
+        pool has started are not started automatically.
+
+        :param token:
+            The bot token of the client.
+
+        :return:
+            The new client.
+        """
+        client = self.__client_cls(
+            token,
+            decode_executor=self.__decode_executor,
+            connector=self.connector,
+            **self.__client_options
+        )
+        self.clients.append(client)
+        return client
+
+    async def start(self):
+        """Start all clients and wait until they have been closed."""
+        if self.connector is None or self.connector.closed:
+            self.connector = create_connector(
+                limit=self.__connector_limit,
+                keepalive_timeout=self.__keepalive_timeout,
+                dns_ttl=self.__dns_ttl
+            )
+
+        for client in self.clients:
+            client.connector = self.connector
+
+        _log.debug("Starting %s clients" % len(self.clients))
+
+        if self.metrics_server:
+            await self.metrics_server.start()
+
+        try:
+            await gather(*map(self.__supervise, self.clients))
+        finally:
+            await self.close()
+
+            if self.metrics_server:
+                await self.metrics_server.stop()
+
+    async def __supervise(self, client: Client):
+        """
+        Run a client until it closes, restarting it when it crashes.
+
+        :meta public:
+
+        :param client:
+            The client to run.
+        """
+        index = self.clients.index(client)
+        delay = self.__restart_delay
+
+        while True:
+            try:
+                await client.start()
+                return
+
+            except (InvalidTokenError, DisallowedIntentsError) as exc:
+                _log.error(
+                    "Client %i of the pool stopped and is not restarted: "
+                    "%r" % (index, exc)
+                )
+                return
+
+            except Exception:
+                if delay is None:
+                    _log.exception("Client %i of the pool crashed" % index)
+                    return
+
+                _log.exception(
+                    "Client %i of the pool crashed, restarting in %.0fs"
+                    % (index, delay)
+                )
+
+            await sleep(delay)
+            delay = min(delay * 2, self.__max_restart_delay)
+
+    async def close(self):
+        """Close all clients and the shared connection pool."""
+        # Clients which never connected raise, there is nothing to close.
+        await gather(
+            *(client.close() for client in self.clients),
+            return_exceptions=True
+        )
+
+        if self.connector:
+            await self.connector.close()
+
+    def run(
+            self, *,
+            loop: Optional[AbstractEventLoop] = None,
+            use_uvloop: bool = False
+    ):
+        """
+        Run all clients, see :meth:`~.Dispatcher.run`.
+
+        Keyword Arguments:
+
+        :param loop:
+            The loop in which the clients will run. If no loop is
+            provided it will get a new one.
+
+        :param use_uvloop:
+            If no loop is provided, run on a new uvloop loop when it
+            is installed.
+        """
+        loop = loop or new_loop(use_uvloop)
+        loop.run_until_complete(self.start())
+        loop.close()
+
+
 Bot = Client
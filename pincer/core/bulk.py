@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+from asyncio import Semaphore, gather, iscoroutine
+from dataclasses import dataclass, field
+from time import time
+from typing import (
+    Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence,
+    Union
+)
+
+from pincer import __package__
+from pincer.core.http import HTTPClient
+from pincer.utils.snowflake import Snowflake
+
+_log = logging.getLogger(__package__)
+
+Progress = Callable[[int, int], Union[Any, Awaitable[Any]]]
+
+#: Discord only bulk deletes messages which are younger than this.
+BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60
+
+#: The maximum amount of messages of one bulk delete request.
+BULK_DELETE_LIMIT = 100
+
+
+@dataclass
+class BulkResult:
+    """
+    The outcome of a bulk operation, a failed item doesn't stop the
+    others.
+
+    :param succeeded:
+        The ids which were processed successfully.
+
+    :param failed:
+        The ids which failed, with their exception.
+    """
+    succeeded: List[Snowflake] = field(default_factory=list)
+    failed: Dict[Snowflake, BaseException] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        """Whether all items succeeded."""
+        return not self.failed
+
+
+async def _report(progress: Optional[Progress], done: int, total: int):
+    """
+    Call a sync or async progress callback.
+
+    :param progress:
+        The callback, which receives the amount of processed items and
+        the total amount.
+
+    :param done:
+        The amount of processed items.
+
+    :param total:
+        The total amount of items.
+    """
+    if progress and iscoroutine(result := progress(done, total)):
+        await result
+
+
+async def _pipeline(
+        ids: Sequence[Snowflake],
+        call: Callable[[Snowflake], Awaitable[Any]],
+        concurrency: int,
+        progress: Optional[Progress]
+) -> BulkResult:
+    """
+    Run a request for every id, with up to ``concurrency`` in flight.
+    The rate limiter releases as many of them as their bucket allows.
+
+    :param ids:
+        The ids to process.
+
+    :param call:
+        Sends the request for one id.
+
+    :param concurrency:
+        The maximum amount of requests in flight.
+
+    :param progress:
+        Called after every processed id.
+    """
+    result = BulkResult()
+    semaphore = Semaphore(concurrency)
+
+    async def run(snowflake: Snowflake):
+        async with semaphore:
+            try:
+                await call(snowflake)
+            except Exception as exc:
+                result.failed[snowflake] = exc
+            else:
+                result.succeeded.append(snowflake)
+
+            await _report(
+                progress,
+                len(result.succeeded) + len(result.failed),
+                len(ids)
+            )
+
+    await gather(*map(run, ids))
+    return result
+
+
+def _snowflakes(ids: Iterable[Union[int, str]]) -> List[Snowflake]:
+    """Convert ids to unique snowflakes, keeping their order."""
+    return list(dict.fromkeys(Snowflake(int(i)) for i in ids))
+
+
+def _concurrency(
+        http: HTTPClient,
+        method: str,
+        route: str,
+        ids: Sequence[Snowflake],
+        concurrency: Optional[int],
+        default: int
+) -> int:
+    """
+    Get the amount of requests to keep in flight.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param method:
+        The HTTP method of the requests.
+
+    :param route:
+        The endpoint of the requests, with ``{}`` in place of the id.
+
+    :param ids:
+        The ids to process, the first one looks up the bucket. Ids in
+        the path decide the bucket, so a placeholder would not match.
+
+    :param concurrency:
+        The amount which was asked for, if any.
+
+    :param default:
+        The amount if none was asked for and the limit of the rate limit
+        bucket of the route is not known yet.
+    """
+    if concurrency or not ids:
+        return concurrency or default
+
+    return http.bucket(route.format(ids[0]), method).limit or default
+
+
+async def bulk_delete_messages(
+        http: HTTPClient,
+        channel_id: Union[int, str],
+        message_ids: Iterable[Union[int, str]], *,
+        delete_old: bool = True,
+        concurrency: Optional[int] = None,
+        progress: Optional[Progress] = None
+) -> BulkResult:
+    """
+    Delete messages in chunks of 100 with the bulk delete endpoint.
+
+    Discord refuses to bulk delete messages older than 14 days, their
+    age is read from their id. These get deleted one by one, just like a
+    single recent message which is left over after the chunks.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param channel_id:
+        The channel of the messages.
+
+    :param message_ids:
+        The messages to delete.
+
+    Keyword Arguments:
+
+    :param delete_old:
+        Delete the messages which are too old one by one, instead of
+        reporting them as failed.
+
+    :param concurrency:
+        The maximum amount of single deletes in flight, defaults to the
+        limit of their rate limit bucket once it is known, else 5.
+
+    :param progress:
+        Called with the amount of processed messages and the total
+        amount, after every request.
+    """
+    ids = _snowflakes(message_ids)
+    route = f"channels/{channel_id}/messages"
+
+    # A minute of margin, so a message doesn't age during the request.
+    cutoff = Snowflake.from_timestamp(time() - BULK_DELETE_MAX_AGE + 60)
+    recent = [i for i in ids if i >= cutoff]
+    old = [i for i in ids if i < cutoff]
+
+    result = BulkResult()
+
+    for start in range(0, len(recent), BULK_DELETE_LIMIT):
+        chunk = recent[start:start + BULK_DELETE_LIMIT]
+
+        try:
+            # The bulk endpoint requires at least two messages.
+            if len(chunk) == 1:
+                await http.delete(f"{route}/{chunk[0]}")
+            else:
+                await http.post(
+                    f"{route}/bulk-delete",
+                    {"messages": [str(i) for i in chunk]}
+                )
+        except Exception as exc:
+            _log.warning(
+                "Bulk delete of %s messages in %s failed: %r"
+                % (len(chunk), channel_id, exc)
+            )
+            result.failed.update(dict.fromkeys(chunk, exc))
+        else:
+            result.succeeded.extend(chunk)
+
+        await _report(
+            progress, len(result.succeeded) + len(result.failed), len(ids)
+        )
+
+    if not old:
+        return result
+
+    if not delete_old:
+        exc = ValueError("Message is too old to be bulk deleted.")
+        result.failed.update(dict.fromkeys(old, exc))
+        await _report(progress, len(ids), len(ids))
+        return result
+
+    offset = len(result.succeeded) + len(result.failed)
+
+    singles = await _pipeline(
+        old,
+        lambda i: http.delete(f"{route}/{i}"),
+        _concurrency(http, "DELETE", f"{route}/{{}}", old, concurrency, 5),
+        progress and (lambda done, _: progress(offset + done, len(ids)))
+    )
+
+    result.succeeded.extend(singles.succeeded)
+    result.failed.update(singles.failed)
+    return result
+
+
+async def bulk_add_role(
+        http: HTTPClient,
+        guild_id: Union[int, str],
+        role_id: Union[int, str],
+        member_ids: Iterable[Union[int, str]], *,
+        concurrency: Optional[int] = None,
+        progress: Optional[Progress] = None
+) -> BulkResult:
+    """
+    Add a role to many members.
+
+    The requests are pipelined, as many as the rate limit bucket allows
+    are in flight at once.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param guild_id:
+        The guild of the members.
+
+    :param role_id:
+        The role to add.
+
+    :param member_ids:
+        The members which get the role.
+
+    Keyword Arguments:
+
+    :param concurrency:
+        The maximum amount of requests in flight, defaults to the limit
+        of their rate limit bucket once it is known, else 10.
+
+    :param progress:
+        Called with the amount of processed members and the total
+        amount, after every request.
+    """
+    ids = _snowflakes(member_ids)
+    route = f"guilds/{guild_id}/members/{{}}/roles/{role_id}"
+
+    return await _pipeline(
+        ids,
+        lambda i: http.put(route.format(i), {}),
+        _concurrency(http, "PUT", route, ids, concurrency, 10),
+        progress
+    )
+
+
+async def bulk_remove_role(
+        http: HTTPClient,
+        guild_id: Union[int, str],
+        role_id: Union[int, str],
+        member_ids: Iterable[Union[int, str]], *,
+        concurrency: Optional[int] = None,
+        progress: Optional[Progress] = None
+) -> BulkResult:
+    """
+    Remove a role from many members, see :func:`bulk_add_role`.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param guild_id:
+        The guild of the members.
+
+    :param role_id:
+        The role to remove.
+
+    :param member_ids:
+        The members which lose the role.
+
+    Keyword Arguments:
+
+    :param concurrency:
+        The maximum amount of requests in flight, defaults to the limit
+        of their rate limit bucket once it is known, else 10.
+
+    :param progress:
+        Called with the amount of processed members and the total
+        amount, after every request.
+    """
+    ids = _snowflakes(member_ids)
+    route = f"guilds/{guild_id}/members/{{}}/roles/{role_id}"
+
+    return await _pipeline(
+        ids,
+        lambda i: http.delete(route.format(i)),
+        _concurrency(http, "DELETE", route, ids, concurrency, 10),
+        progress
+    )
+
+
+async def bulk_ban(
+        http: HTTPClient,
+        guild_id: Union[int, str],
+        user_ids: Iterable[Union[int, str]], *,
+        delete_message_days: int = 0,
+        concurrency: Optional[int] = None,
+        progress: Optional[Progress] = None
+) -> BulkResult:
+    """
+    Ban many users, eg the accounts of a raid.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param guild_id:
+        The guild from which the users get banned.
+
+    :param user_ids:
+        The users to ban.
+
+    Keyword Arguments:
+
+    :param delete_message_days:
+        The amount of days (0-7) of which the messages of the users get
+        deleted.
+
+    :param concurrency:
+        The maximum amount of requests in flight, defaults to the limit
+        of their rate limit bucket once it is known, else 10.
+
+    :param progress:
+        Called with the amount of processed users and the total amount,
+        after every request.
+    """
+    ids = _snowflakes(user_ids)
+    route = f"guilds/{guild_id}/bans/{{}}"
+
+    return await _pipeline(
+        ids,
+        lambda i: http.put(
+            route.format(i), {"delete_message_days": delete_message_days}
+        ),
+        _concurrency(http, "PUT", route, ids, concurrency, 10),
+        progress
+    )
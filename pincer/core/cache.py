@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import re
+from collections import OrderedDict
+from copy import deepcopy
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+from pincer import __package__
+from pincer.core.metrics import metrics
+from pincer.core.ratelimiter import route_template
+
+_log = logging.getLogger(__package__)
+
+_cache_bytes = metrics.gauge(
+    "pincer_http_cache_bytes",
+    "Size of the cached REST responses."
+)
+_cache_lookups = metrics.counter(
+    "pincer_http_cache_lookups_total",
+    "Amount of cache lookups by result (hit, miss or revalidated).",
+    ("result",)
+)
+
+# A channel and its permission overwrites are part of the channel list
+# of its guild.
+_channel_re = re.compile(r"^/?channels/(\d+)(?:/permissions/\d+)?$")
+
+#: The routes which get cached by default, with their TTL in seconds.
+DEFAULT_TTLS: Dict[str, float] = {
+    "channels/{id}": 60,
+    "guilds/{id}": 60,
+    "guilds/{id}/channels": 60,
+    "guilds/{id}/roles": 60,
+    "applications/{id}/commands": 300,
+    "applications/{id}/guilds/{id}/commands": 300,
+    "sticker-packs": 3600
+}
+
+
+class CacheEntry:
+    """A cached response."""
+    __slots__ = ("data", "etag", "expires_at", "size")
+
+    def __init__(
+            self,
+            data: Any,
+            etag: Optional[str],
+            expires_at: float,
+            size: int
+    ):
+        self.data = data
+        self.etag = etag
+        self.expires_at = expires_at
+        self.size = size
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the entry can be used without asking Discord."""
+        return monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """
+    Cache for the responses of GET requests to routes which rarely
+    change.
+
+    Expired entries with an ``ETag`` are revalidated with an
+    ``If-None-Match`` request. When the cache grows past its size the
+    least recently used entries are dropped. A mutating request to a
+    resource drops the cached responses of that resource, its children
+    and its parent, a modified channel also drops the cached channel
+    list of its guild.
+
+    Responses are kept per scope, the http client uses a hash of its
+    token. A cache can so be shared by clients of different bots
+    without one getting the responses of another.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> cache = ResponseCache({"guilds/{id}/roles": 30})
+        >>> client = Client("token", response_cache=cache)
+    """
+
+    def __init__(
+            self,
+            ttls: Optional[Dict[str, float]] = None,
+            *,
+            max_bytes: int = 8 * 1024 * 1024
+    ):
+        """
+        :param ttls:
+            Route templates (eg ``guilds/{id}/roles``) with the amount of
+            seconds for which their responses are used, defaults to
+            :data:`DEFAULT_TTLS`.
+
+        Keyword Arguments:
+
+        :param max_bytes:
+            The maximum size of the cached response bodies.
+        """
+        self.ttls: Dict[str, float] = (
+            DEFAULT_TTLS.copy() if ttls is None else ttls
+        )
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+
+        self.__entries: OrderedDict[Tuple[str, str], CacheEntry] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def ttl(self, endpoint: str) -> Optional[float]:
+        """
+        Get for how long the responses of an endpoint are cached.
+
+        :param endpoint:
+            The endpoint to which a GET request is sent.
+
+        :return:
+            The TTL in seconds, or ``None`` if it is not cached.
+        """
+        return self.ttls.get(route_template(endpoint))
+
+    def get(
+            self,
+            endpoint: str, *,
+            scope: str = ""
+    ) -> Optional[CacheEntry]:
+        """
+        Get the cached response of an endpoint, which can be expired.
+
+        :param endpoint:
+            The endpoint to which a GET request is sent.
+
+        Keyword Arguments:
+
+        :param scope:
+            The scope of the response, eg the client which requests it.
+        """
+        entry = self.__entries.get((scope, endpoint))
+
+        if entry is None:
+            _cache_lookups.inc(result="miss")
+            return None
+
+        self.__entries.move_to_end((scope, endpoint))
+
+        if entry.fresh:
+            _cache_lookups.inc(result="hit")
+        elif not entry.etag:
+            _cache_lookups.inc(result="miss")
+
+        return entry
+
+    def set(
+            self,
+            endpoint: str,
+            data: Any,
+            etag: Optional[str],
+            size: int, *,
+            scope: str = ""
+    ):
+        """
+        Cache the response of an endpoint.
+
+        :param endpoint:
+            The endpoint to which the GET request was sent.
+
+        :param data:
+            The decoded response, a copy of it gets stored.
+
+        :param etag:
+            The ``ETag`` header of the response.
+
+        :param size:
+            The size of the response body.
+
+        Keyword Arguments:
+
+        :param scope:
+            The scope of the response, see :meth:`get`.
+        """
+        ttl = self.ttl(endpoint)
+
+        if ttl is None or size > self.max_bytes:
+            return
+
+        self.__drop((scope, endpoint))
+        self.__entries[(scope, endpoint)] = CacheEntry(
+            deepcopy(data), etag, monotonic() + ttl, size
+        )
+        self.__resize(size)
+
+        while self.size > self.max_bytes:
+            self.__drop(next(iter(self.__entries)))
+
+    def refresh(
+            self,
+            endpoint: str, *,
+            scope: str = ""
+    ) -> Optional[CacheEntry]:
+        """
+        Extend the TTL of an entry after Discord reported that it has
+        not been modified.
+
+        :param endpoint:
+            The endpoint to which the GET request was sent.
+
+        Keyword Arguments:
+
+        :param scope:
+            The scope of the response, see :meth:`get`.
+        """
+        entry = self.__entries.get((scope, endpoint))
+
+        if entry:
+            _cache_lookups.inc(result="revalidated")
+            entry.expires_at = monotonic() + (self.ttl(endpoint) or 0)
+
+        return entry
+
+    def invalidate(self, endpoint: str, *, scope: str = ""):
+        """
+        Drop the cached responses of a resource which gets modified,
+        together with those of its children and parent. The channel
+        list of a guild is dropped as well if it contains a modified
+        channel.
+
+        :param endpoint:
+            The endpoint to which a mutating request is sent.
+
+        Keyword Arguments:
+
+        :param scope:
+            The scope of the responses, see :meth:`get`.
+        """
+        path = endpoint.split("?", 1)[0].rstrip("/")
+        parent = path.rsplit("/", 1)[0]
+        channel = _channel_re.match(path)
+
+        for key, entry in tuple(self.__entries.items()):
+            cached = key[1].split("?", 1)[0]
+
+            if key[0] == scope and (
+                cached in (path, parent)
+                or cached.startswith(path + "/")
+                or channel and _lists_channel(cached, entry, channel[1])
+            ):
+                _log.debug("Invalidating cached `%s`" % key[1])
+                self.__drop(key)
+
+    def clear(self):
+        """Drop all cached responses."""
+        self.__resize(-self.size)
+        self.__entries.clear()
+
+    def __drop(self, key: Tuple[str, str]):
+        """
+        Drop a cached response.
+
+        :meta public:
+
+        :param key:
+            The scope and endpoint of the response.
+        """
+        entry = self.__entries.pop(key, None)
+
+        if entry:
+            self.__resize(-entry.size)
+
+    def __resize(self, amount: int):
+        """
+        Change the size of the cache.
+
+        :meta public:
+
+        :param amount:
+            The amount of bytes which were added or removed.
+        """
+        self.size += amount
+        _cache_bytes.inc(amount)
+
+
+def _lists_channel(endpoint: str, entry: CacheEntry, channel_id: str) -> bool:
+    """
+    Whether a cached response is a guild channel list with a channel.
+
+    :param endpoint:
+        The endpoint of the cached response.
+
+    :param entry:
+        The cached response.
+
+    :param channel_id:
+        The id of the channel.
+    """
+    return (
+        route_template(endpoint) == "guilds/{id}/channels"
+        and isinstance(entry.data, list)
+        and any(
+            isinstance(item, dict) and str(item.get("id")) == channel_id
+            for item in entry.data
+        )
+    )
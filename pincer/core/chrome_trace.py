@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import os
+from json import dumps
+from queue import SimpleQueue
+from threading import Lock, Thread, get_ident
+from time import perf_counter, time
+from typing import Any, Dict, IO, List, Optional
+
+from pincer import __package__
+from pincer.core.tracing import (
+    TraceConfig, TraceContext, DecodedParams, FrameReceivedParams,
+    HandlerEndParams, HandlerStartParams, MiddlewareEndParams,
+    MiddlewareStartParams, RequestCoalescedParams, RequestEndParams,
+    RequestRatelimitedParams, RequestRetryParams, RequestStartParams
+)
+
+_log = logging.getLogger(__package__)
+
+
+class ChromeTracer(TraceConfig):
+    """
+    Trace config which writes the lifecycle of every event
+    (receive, decode, middleware, handler and the REST requests made
+    while handling it) in the Chrome Trace Event format.
+
+    Every trace gets its own async track, so overlapping handlers and
+    rate limit stalls are visible when the file is opened in
+    `Perfetto <https://ui.perfetto.dev>`_ or ``chrome://tracing``.
+
+    The output rotates like :class:`logging.handlers.RotatingFileHandler`,
+    ``trace.json`` is the current file and ``trace.json.1`` the
+    previous one. The files are written and rotated by a background
+    thread, so the event loop never waits on the disk.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> tracer = ChromeTracer("trace.json", interval=60)
+        >>> Client("token", trace_configs=[tracer]).run()
+    """
+
+    def __init__(
+            self,
+            path: str, *,
+            max_bytes: int = 64 * 1024 * 1024,
+            interval: Optional[float] = None,
+            backup_count: int = 5
+    ):
+        """
+        :param path:
+            The file to which the trace gets written.
+
+        Keyword Arguments:
+
+        :param max_bytes:
+            Rotate the file when it has grown beyond this size.
+            ``0`` disables size based rotation.
+
+        :param interval:
+            Rotate the file after this amount of seconds.
+            ``None`` disables time based rotation.
+
+        :param backup_count:
+            The amount of rotated files which are kept.
+        """
+        super().__init__()
+        self.path: str = path
+        self.max_bytes: int = max_bytes
+        self.interval: Optional[float] = interval
+        self.backup_count: int = backup_count
+
+        self.__lock = Lock()
+        self.__queue: SimpleQueue = SimpleQueue()
+        self.__writer: Optional[Thread] = None
+        self.__file: Optional[IO[str]] = None
+        self.__size: int = 0
+        self.__opened: float = 0
+        self.__pid: int = os.getpid()
+
+        self.on_frame_received.append(self.__frame_received)
+        self.on_decoded.append(self.__decoded)
+        self.on_middleware_start.append(self.__middleware_start)
+        self.on_middleware_end.append(self.__middleware_end)
+        self.on_handler_start.append(self.__handler_start)
+        self.on_handler_end.append(self.__handler_end)
+        self.on_request_start.append(self.__request_start)
+        self.on_request_end.append(self.__request_end)
+        self.on_request_retry.append(self.__request_retry)
+        self.on_request_ratelimited.append(self.__request_ratelimited)
+        self.on_request_coalesced.append(self.__request_coalesced)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __open(self):
+        self.__file = open(self.path, "w", encoding="utf-8")
+        self.__file.write("[\n")
+        self.__size = 2
+        self.__opened = time()
+
+    def __rotate(self):
+        """Close the current file and shift the backups."""
+        self.__close_file()
+
+        if self.backup_count > 0:
+            for idx in range(self.backup_count - 1, 0, -1):
+                src = f"{self.path}.{idx}"
+
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{idx + 1}")
+
+            os.replace(self.path, f"{self.path}.1")
+
+        _log.debug("Rotated chrome trace file `%s`" % self.path)
+
+    def __close_file(self):
+        if self.__file:
+            self.__file.write("\n]\n")
+            self.__file.close()
+            self.__file = None
+
+    def __write(self, events: List[Dict[str, Any]]):
+        """
+        Hand events to the writer thread, which gets started on the
+        first write.
+
+        :param events:
+            The trace events to write.
+        """
+        with self.__lock:
+            if self.__writer is None:
+                self.__writer = Thread(
+                    target=self.__run,
+                    name="pincer-chrome-trace",
+                    daemon=True
+                )
+                self.__writer.start()
+
+            self.__queue.put(events)
+
+    def __run(self):
+        """
+        Write the queued events until :meth:`close` is called.
+
+        :meta public:
+        """
+        while (events := self.__queue.get()) is not None:
+            try:
+                self.__write_file(events)
+            except OSError:
+                _log.exception(
+                    "Failed to write chrome trace file `%s`" % self.path
+                )
+
+        self.__close_file()
+
+    def __write_file(self, events: List[Dict[str, Any]]):
+        """
+        Write events to the current file, rotating it if required.
+
+        :meta public:
+
+        :param events:
+            The trace events to write.
+        """
+        if self.__file and (
+                (self.max_bytes and self.__size >= self.max_bytes)
+                or (
+                    self.interval is not None
+                    and time() - self.__opened >= self.interval
+                )
+        ):
+            self.__rotate()
+
+        if not self.__file:
+            self.__open()
+
+        for event in events:
+            line = ("" if self.__size == 2 else ",\n") + dumps(event)
+            self.__file.write(line)
+            self.__size += len(line)
+
+    def close(self):
+        """
+        Write the queued events and finish the current file, this makes
+        it valid JSON.
+        """
+        with self.__lock:
+            writer, self.__writer = self.__writer, None
+
+            if writer:
+                self.__queue.put(None)
+                writer.join()
+
+    def __span(
+            self,
+            ctx: TraceContext,
+            name: str,
+            category: str,
+            start: float,
+            end: float,
+            args: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Write a span as a begin and end pair on the track of the trace.
+        Both are written at once, so a span never gets split over two
+        files.
+
+        :param ctx:
+            The trace to which the span belongs.
+
+        :param name:
+            The name of the span.
+
+        :param category:
+            The category, eg ``gateway`` or ``http``.
+
+        :param start:
+            The :func:`time.perf_counter` value at which the span started.
+
+        :param end:
+            The :func:`time.perf_counter` value at which the span ended.
+
+        :param args:
+            Extra information which is shown for the span.
+        """
+        base = {
+            "name": name,
+            "cat": category,
+            "id": ctx.trace_id,
+            "pid": self.__pid,
+            "tid": get_ident()
+        }
+
+        self.__write([
+            {**base, "ph": "b", "ts": start * 1e6, "args": args or {}},
+            {**base, "ph": "e", "ts": end * 1e6}
+        ])
+
+    def __instant(
+            self,
+            ctx: TraceContext,
+            name: str,
+            category: str,
+            args: Dict[str, Any]
+    ):
+        self.__write([{
+            "name": name,
+            "cat": category,
+            "ph": "n",
+            "id": ctx.trace_id,
+            "ts": perf_counter() * 1e6,
+            "pid": self.__pid,
+            "tid": get_ident(),
+            "args": args
+        }])
+
+    @staticmethod
+    def __push(ctx: TraceContext, key: str):
+        ctx.attributes.setdefault(key, []).append(perf_counter())
+
+    @staticmethod
+    def __pop(ctx: TraceContext, key: str) -> Optional[float]:
+        stack = ctx.attributes.get(key)
+        return stack.pop() if stack else None
+
+    def __frame_received(self, ctx: TraceContext, params: FrameReceivedParams):
+        ctx.attributes["chrome:frame_size"] = params.size
+
+    def __decoded(self, ctx: TraceContext, params: DecodedParams):
+        end = perf_counter()
+        self.__span(
+            ctx,
+            f"decode {params.payload.event_name or params.payload.op}",
+            "gateway",
+            end - params.duration,
+            end,
+            {
+                "op": params.payload.op,
+                "seq": params.payload.seq,
+                "size": ctx.attributes.get("chrome:frame_size")
+            }
+        )
+
+    def __middleware_start(
+            self,
+            ctx: TraceContext,
+            params: MiddlewareStartParams
+    ):
+        self.__push(ctx, f"chrome:middleware:{params.key}")
+
+    def __middleware_end(self, ctx: TraceContext, params: MiddlewareEndParams):
+        start = self.__pop(ctx, f"chrome:middleware:{params.key}")
+
+        if start is not None:
+            self.__span(
+                ctx, f"middleware {params.key}", "middleware",
+                start, perf_counter(),
+                {"next": params.next_call, "error": repr(params.exception)}
+            )
+
+    def __handler_start(self, ctx: TraceContext, params: HandlerStartParams):
+        self.__push(ctx, f"chrome:handler:{params.name}")
+
+    def __handler_end(self, ctx: TraceContext, params: HandlerEndParams):
+        start = self.__pop(ctx, f"chrome:handler:{params.name}")
+
+        if start is not None:
+            self.__span(
+                ctx, params.name, "handler", start, perf_counter(),
+                {"error": repr(params.exception)}
+            )
+
+    def __request_start(self, ctx: TraceContext, params: RequestStartParams):
+        # Attempts may overlap within a trace, so they are paired by id
+        # instead of on a stack.
+        ctx.attributes[f"chrome:request:{params.attempt_id}"] = perf_counter()
+
+    def __request_end(self, ctx: TraceContext, params: RequestEndParams):
+        start = ctx.attributes.pop(f"chrome:request:{params.attempt_id}", None)
+
+        if start is not None:
+            self.__span(
+                ctx, f"{params.method} {params.route}", "http",
+                start, perf_counter(), {"status": params.status}
+            )
+
+    def __request_retry(self, ctx: TraceContext, params: RequestRetryParams):
+        self.__instant(
+            ctx, f"retry {params.method} {params.route}", "http",
+            {"status": params.status, "delay": params.delay}
+        )
+
+    def __request_ratelimited(
+            self,
+            ctx: TraceContext,
+            params: RequestRatelimitedParams
+    ):
+        self.__instant(
+            ctx, f"rate limited {params.method} {params.route}", "http",
+            {"retry_after": params.retry_after}
+        )
+
+    def __request_coalesced(
+            self,
+            ctx: TraceContext,
+            params: RequestCoalescedParams
+    ):
+        self.__instant(
+            ctx, f"coalesced {params.method} {params.route}", "http", {}
+        )
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from asyncio import Queue, ensure_future, get_event_loop
+from time import time
+from typing import Any, AsyncIterator, List, Optional, Union
+
+from pincer import __package__
+from pincer.core.http import HTTPClient
+from pincer.core.pagination import history
+from pincer.utils.files import write_atomic
+from pincer.utils.snowflake import Snowflake
+
+_log = logging.getLogger(__package__)
+
+Id = Union[int, str]
+
+
+class HistoryCrawler:
+    """
+    Crawls the history of a channel in several ranges at once.
+
+    Message ids encode their creation time, so the history is split in
+    ranges of equal duration which are paginated concurrently. The
+    messages are still yielded oldest first, ranges ahead of the
+    consumer are buffered.
+
+    With a checkpoint file an interrupted crawl resumes after the last
+    processed message. The file is written after every page and when
+    the iteration is closed, so at most a page is yielded again.
+
+    >>> crawler = HistoryCrawler(http, channel_id, checkpoint="crawl.json")
+    >>> async for message in crawler:
+    ...     archive(message)
+    """
+
+    def __init__(
+            self,
+            http: HTTPClient,
+            channel_id: Id, *,
+            after: Optional[Id] = None,
+            before: Optional[Id] = None,
+            partitions: int = 16,
+            concurrency: int = 4,
+            buffer: int = 8,
+            checkpoint: Optional[str] = None,
+            raw: bool = False
+    ):
+        """
+        :param http:
+            The http client which sends the requests.
+
+        :param channel_id:
+            The channel of the messages.
+
+        Keyword Arguments:
+
+        :param after:
+            Only messages after this id, defaults to the creation of the
+            channel.
+
+        :param before:
+            Only messages before this id, defaults to the start of the
+            crawl.
+
+        :param partitions:
+            The amount of ranges the history is split in. More ranges
+            than workers keep the workers busy when the messages are
+            unevenly spread over time.
+
+        :param concurrency:
+            The amount of ranges which are crawled at once.
+
+        :param buffer:
+            The amount of pages which are buffered per range.
+
+        :param checkpoint:
+            A file to which the progress is written after every page.
+            If it exists, the crawl resumes from it and ``after``,
+            ``before`` and ``partitions`` are ignored.
+
+        :param raw:
+            Yield the raw dicts instead of :class:`~pincer.objects.Message`
+            objects.
+
+        :raises ValueError:
+            The checkpoint file belongs to the crawl of another channel.
+        """
+        self.http = http
+        self.channel_id = channel_id
+        self.concurrency = concurrency
+        self.buffer = buffer
+        self.checkpoint = checkpoint
+        self.raw = raw
+
+        #: Pairs of the last processed and the last id of every range.
+        self.partitions: List[List[int]] = self.__load() or self.split(
+            int(channel_id if after is None else after),
+            int(
+                Snowflake.from_timestamp(time())
+                if before is None else before
+            ) - 1,
+            partitions
+        )
+
+    @staticmethod
+    def split(after: int, last: int, amount: int) -> List[List[int]]:
+        """
+        Split the ids after ``after`` up to and including ``last`` in
+        ranges of equal duration.
+
+        :param after:
+            The id before the first range.
+
+        :param last:
+            The last id of the last range.
+
+        :param amount:
+            The amount of ranges.
+        """
+        bounds = sorted({
+            after + (last - after) * i // amount for i in range(amount + 1)
+        })
+        return [[low, high] for low, high in zip(bounds, bounds[1:])]
+
+    @property
+    def done(self) -> bool:
+        """Whether all ranges have been crawled."""
+        return all(low >= high for low, high in self.partitions)
+
+    def __load(self) -> Optional[List[List[int]]]:
+        """
+        Read the ranges from the checkpoint file, if it exists.
+
+        :meta public:
+        """
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return None
+
+        with open(self.checkpoint) as file:
+            state = json.load(file)
+
+        if int(state["channel_id"]) != int(self.channel_id):
+            raise ValueError(
+                f"{self.checkpoint} is the checkpoint of channel "
+                f"{state['channel_id']}, not of channel {self.channel_id}."
+            )
+
+        _log.info(
+            "Resuming the crawl of channel %s from %s"
+            % (self.channel_id, self.checkpoint)
+        )
+        return state["partitions"]
+
+    async def __save(self):
+        """
+        Write the ranges to the checkpoint file on the default executor.
+
+        :meta public:
+        """
+        if self.checkpoint:
+            await get_event_loop().run_in_executor(
+                None, write_atomic, self.checkpoint, json.dumps({
+                    "channel_id": str(self.channel_id),
+                    "partitions": self.partitions
+                })
+            )
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        queues = [Queue(self.buffer) for _ in self.partitions]
+        pending = iter(range(len(self.partitions)))
+
+        async def work():
+            # The workers take the ranges in order, so the range the
+            # consumer waits on is always being crawled.
+            for index in pending:
+                low, high = self.partitions[index]
+
+                try:
+                    if low < high:
+                        pages = history(
+                            self.http, self.channel_id,
+                            after=low, before=high + 1, raw=True
+                        ).pages()
+
+                        async for page in pages:
+                            await queues[index].put(page)
+
+                except Exception as exc:
+                    await queues[index].put(exc)
+                    return
+
+                await queues[index].put(None)
+
+        workers = [
+            ensure_future(work())
+            for _ in range(min(self.concurrency, len(self.partitions)))
+        ]
+
+        parser = None
+
+        if not self.raw:
+            # Imported here, as the message module imports the
+            # interactions module, which imports it back.
+            from pincer.objects.message import Message
+            parser = Message.from_dict
+
+        try:
+            for partition, queue in zip(self.partitions, queues):
+                while (page := await queue.get()) is not None:
+                    if isinstance(page, Exception):
+                        raise page
+
+                    for message in page:
+                        yield parser(message) if parser else message
+                        partition[0] = int(message["id"])
+
+                    await self.__save()
+
+                partition[0] = partition[1]
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            # A message is only marked as processed once the next one is
+            # requested, so a consumer which stops gets it again.
+            await self.__save()
+
+    async def flatten(self) -> List[Any]:
+        """Collect all messages in a list."""
+        return [message async for message in self]
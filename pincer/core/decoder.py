@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import zlib
+from asyncio import Future, get_event_loop
+from concurrent.futures import Executor
+from typing import Dict, Iterable, Optional, Union
+
+from pincer import __package__
+from pincer.core.dispatch import GatewayDispatch
+from pincer.core.streaming import stream_decode
+
+_log = logging.getLogger(__package__)
+
+ZLIB_SUFFIX = b"\x00\x00\xff\xff"
+
+def _decode(
+        message: str,
+        stream_events: Dict[str, Iterable[str]]
+) -> GatewayDispatch:
+    """
+    Decode the JSON text of a message, streaming the configured arrays.
+    This is a module level function so process pools can run it.
+
+    :param message:
+        The JSON text of the message.
+
+    :param stream_events:
+        The event names with the keys of their data of which the arrays
+        must be streamed.
+    """
+    if stream_events and (payload := stream_decode(message, stream_events)):
+        return payload
+
+    return GatewayDispatch.from_string(message)
+
+
+class PayloadDecoder:
+    """
+    Turns the raw messages of one websocket connection into
+    :class:`~.core.dispatch.GatewayDispatch` objects.
+
+    Small messages are decoded inline. Messages of at least
+    ``threshold`` bytes get inflated on a worker thread, zlib releases
+    the GIL so the event loop keeps running meanwhile. Their JSON gets
+    decoded inline too, unless an executor is given.
+
+    The json module holds the GIL while decoding, so decoding on a
+    thread does not free up the loop. A
+    :class:`~concurrent.futures.ProcessPoolExecutor` does, at the cost
+    of sending the payload to another process and unpickling the
+    result on the loop. Such a pool is not used by default: its workers
+    import ``__main__`` again on platforms which spawn processes, which
+    starts the bot again in scripts without a ``__main__`` guard.
+
+    Inflating has to happen in order, parsing does not. The dispatcher
+    hands payloads to the handlers in the order the messages arrived,
+    no matter when they finished parsing.
+
+    The configured arrays in the data of events which are configured
+    for streaming become :class:`~.core.streaming.StreamedArray`
+    objects, which are decoded element by element when iterated. Their
+    bounds are found without decoding the elements, on the executor for
+    large messages.
+    """
+
+    def __init__(
+            self,
+            *,
+            compressed: bool = False,
+            threshold: int = 512 * 1024,
+            executor: Optional[Executor] = None,
+            stream_events: Optional[Dict[str, Iterable[str]]] = None
+    ):
+        """
+        Keyword Arguments:
+
+        :param compressed:
+            Whether the connection uses ``zlib-stream`` transport
+            compression.
+
+        :param threshold:
+            The size in bytes from which a message gets offloaded.
+
+        :param executor:
+            The executor on which the JSON of large messages gets
+            decoded, they are decoded inline if this is ``None``.
+
+        :param stream_events:
+            The event names with the keys of their data of which the
+            arrays must be streamed.
+            Eg ``{"GUILD_CREATE": ("members", "presences")}``.
+        """
+        self.threshold: int = threshold
+        self.executor: Optional[Executor] = executor
+        self.stream_events: Dict[str, Iterable[str]] = {
+            event.upper(): keys
+            for event, keys in (stream_events or {}).items()
+        }
+        self.__inflator = zlib.decompressobj() if compressed else None
+        self.__buffer = bytearray()
+
+    def __inflate(self, data: bytes) -> str:
+        """
+        Inflate a complete zlib-stream message.
+
+        :param data:
+            The compressed message.
+        """
+        return self.__inflator.decompress(data).decode("utf-8")
+
+    async def inflate(self, message: Union[str, bytes]) -> Optional[str]:
+        """
+        Turn a message which was received from the websocket into text.
+        Messages must be inflated in the order they were received.
+
+        :param message:
+            The raw message. Compressed messages are bytes and might be
+            split over multiple websocket messages.
+
+        :return:
+            The JSON text, or ``None`` if the message is part of
+            a compressed payload which has not been completely received.
+        """
+        if not isinstance(message, (bytes, bytearray)):
+            return message
+
+        if not self.__inflator:
+            return message.decode("utf-8")
+
+        self.__buffer.extend(message)
+
+        if not self.__buffer.endswith(ZLIB_SUFFIX):
+            return None
+
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+
+        if len(data) >= self.threshold:
+            return await get_event_loop().run_in_executor(
+                None, self.__inflate, data
+            )
+
+        return self.__inflate(data)
+
+    def parse(
+            self,
+            message: str
+    ) -> Union[GatewayDispatch, Future[GatewayDispatch]]:
+        """
+        Decode the JSON text of a message. Unlike inflating this does not
+        depend on previous messages, so multiple messages can be parsed
+        at the same time.
+
+        :param message:
+            The JSON text of the message.
+
+        :return:
+            The payload, or a future of it if it is being decoded on the
+            executor.
+        """
+        if self.executor and len(message) >= self.threshold:
+            _log.debug(
+                "Decoding payload of %i bytes on executor." % len(message)
+            )
+            return get_event_loop().run_in_executor(
+                self.executor, _decode, message, self.stream_events
+            )
+
+        return _decode(message, self.stream_events)
+
+    async def decode(
+            self,
+            message: Union[str, bytes]
+    ) -> Optional[GatewayDispatch]:
+        """
+        Inflate and parse a message which was received from the websocket.
+
+        :param message:
+            The raw message.
+
+        :return:
+            The decoded payload, or ``None`` if the message is part of
+            a compressed payload which has not been completely received.
+        """
+        text = await self.inflate(message)
+
+        if text is None:
+            return None
+
+        payload = self.parse(text)
+        return await payload if isinstance(payload, Future) else payload
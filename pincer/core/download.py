@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from asyncio import Semaphore, gather, get_event_loop
+from contextlib import asynccontextmanager
+from hashlib import sha256
+from tempfile import mkstemp
+from typing import (
+    AsyncIterator, BinaryIO, Iterable, List, Optional, Tuple, Union
+)
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+from aiohttp import BaseConnector, ClientSession
+
+from pincer import __package__
+from pincer.core.http import create_connector
+from pincer.core.metrics import metrics
+from pincer.utils.files import write_atomic
+
+_log = logging.getLogger(__package__)
+
+_downloaded = metrics.counter(
+    "pincer_download_bytes_total",
+    "Amount of downloaded bytes by source (network or cache).",
+    ("source",)
+)
+
+#: The amount of bytes which are read or written at once.
+CHUNK_SIZE = 64 * 1024
+
+_defaults: WeakKeyDictionary = WeakKeyDictionary()
+_users: WeakKeyDictionary = WeakKeyDictionary()
+
+
+class Downloader:
+    """
+    Downloads files, such as attachments, from the Discord CDN.
+
+    Files are streamed in chunks straight to disk, and at most
+    ``concurrency`` downloads run at the same time. An interrupted
+    :meth:`save` resumes from where it stopped with a range request.
+
+    With a ``cache_dir`` every downloaded file is stored by the hash of
+    its content, repeated downloads of the same url are then read from
+    disk.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> async with Downloader(cache_dir=".cache") as downloader:
+        ...     await downloader.save_all(
+        ...         (a.url, a.filename) for a in message.attachments
+        ...     )
+    """
+
+    def __init__(
+            self,
+            *,
+            concurrency: int = 4,
+            max_streams: int = 16,
+            cache_dir: Optional[str] = None,
+            connector: Optional[BaseConnector] = None,
+            chunk_size: int = CHUNK_SIZE
+    ):
+        """
+        Keyword Arguments:
+
+        :param concurrency:
+            The maximum amount of simultaneous downloads.
+
+        :param max_streams:
+            The maximum amount of streams which keep a connection open,
+            further streams wait until one of them has finished.
+
+        :param cache_dir:
+            The directory of the content-addressed cache, files are not
+            cached if it is not given.
+
+        :param connector:
+            A connection pool which is shared with other clients, see
+            :func:`~.core.http.create_connector`.
+
+        :param chunk_size:
+            The amount of bytes which are read or written at once.
+        """
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+
+        self.__semaphore = Semaphore(concurrency)
+        self.__streams = Semaphore(max_streams)
+        self.__connector = connector
+        self.__session: Optional[ClientSession] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close the connections of the downloader."""
+        if self.__session:
+            await self.__session.close()
+            self.__session = None
+
+    @property
+    def session(self) -> ClientSession:
+        """The session which is used for the downloads."""
+        if self.__session is None or self.__session.closed:
+            self.__session = ClientSession(
+                connector=self.__connector or create_connector(),
+                connector_owner=self.__connector is None
+            )
+
+        return self.__session
+
+    def __path(self, *parts: str) -> str:
+        """
+        Get a path in the cache directory.
+
+        :meta public:
+        """
+        return os.path.join(self.cache_dir, *parts)
+
+    def __index(self, url: str) -> str:
+        """
+        Get the path of the index entry of a url. The query is ignored,
+        the CDN signs the same file with different parameters.
+
+        :meta public:
+
+        :param url:
+            The url of the file.
+        """
+        split = urlsplit(url)
+        key = sha256(f"{split.netloc}{split.path}".encode()).hexdigest()
+        return self.__path("index", key[:2], key)
+
+    def cached(self, url: str) -> Optional[str]:
+        """
+        Get the cached copy of a url.
+
+        :param url:
+            The url of the file.
+
+        :return:
+            The path of the cached file, or ``None``.
+        """
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self.__index(url)) as index:
+                digest = index.read().strip()
+        except OSError:
+            return None
+
+        blob = self.__path("objects", digest[:2], digest)
+        return blob if os.path.exists(blob) else None
+
+    def __store(self, url: str, path: str, digest: str):
+        """
+        Add a downloaded file to the cache. Runs on an executor.
+
+        :meta public:
+
+        :param url:
+            The url of the file.
+
+        :param path:
+            The downloaded file.
+
+        :param digest:
+            The sha256 hash of the file its content.
+        """
+        blob = self.__path("objects", digest[:2], digest)
+        index = self.__index(url)
+
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.makedirs(os.path.dirname(index), exist_ok=True)
+
+        if not os.path.exists(blob):
+            _copy(path, blob)
+
+        write_atomic(index, digest)
+
+    def __temp(self) -> Tuple[BinaryIO, str]:
+        """
+        Open a new temporary file in the cache. Runs on an executor.
+
+        :meta public:
+
+        :return:
+            The opened file and its path.
+        """
+        os.makedirs(self.__path("tmp"), exist_ok=True)
+        fd, temp = mkstemp(dir=self.__path("tmp"))
+        return os.fdopen(fd, "wb"), temp
+
+    async def stream(self, url: str) -> AsyncIterator[bytes]:
+        """
+        Read a file chunk by chunk.
+
+        A download slot is only taken while a chunk is being read, so a
+        slow consumer doesn't keep other downloads waiting. The
+        connection of the stream counts towards ``max_streams`` until
+        the response has been read or the stream is closed.
+
+        :param url:
+            The url of the file.
+        """
+        chunks = self.__chunks(url)
+
+        try:
+            while True:
+                async with self.__semaphore:
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        return
+
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def __chunks(self, url: str) -> AsyncIterator[bytes]:
+        """
+        Read a file chunk by chunk from the cache or the network, and
+        add downloaded files to the cache.
+
+        :meta public:
+
+        :param url:
+            The url of the file.
+        """
+        loop = get_event_loop()
+
+        if cached := await loop.run_in_executor(None, self.cached, url):
+            async for chunk in _read_file(cached, self.chunk_size):
+                _downloaded.inc(len(chunk), source="cache")
+                yield chunk
+
+            return
+
+        file, temp, digest = None, None, sha256()
+
+        if self.cache_dir:
+            file, temp = await loop.run_in_executor(None, self.__temp)
+
+        try:
+            async with self.__streams, self.session.get(url) as res:
+                res.raise_for_status()
+
+                async for chunk in res.content.iter_chunked(
+                        self.chunk_size
+                ):
+                    _downloaded.inc(len(chunk), source="network")
+
+                    if file:
+                        digest.update(chunk)
+                        await loop.run_in_executor(None, file.write, chunk)
+
+                    yield chunk
+
+            if file:
+                file.close()
+                await loop.run_in_executor(
+                    None, self.__store, url, temp, digest.hexdigest()
+                )
+
+        finally:
+            if file:
+                file.close()
+                await loop.run_in_executor(None, os.remove, temp)
+
+    async def save(self, url: str, path: str) -> str:
+        """
+        Download a file to disk.
+
+        The file is written to ``<path>.part`` first. If that exists
+        from an earlier attempt, only the missing bytes are requested.
+        It is downloaded again if its size doesn't match the file.
+
+        :param url:
+            The url of the file.
+
+        :param path:
+            Where the file gets saved.
+
+        :return:
+            The path of the saved file.
+        """
+        loop = get_event_loop()
+
+        async with self.__semaphore:
+            if cached := await loop.run_in_executor(None, self.cached, url):
+                size = await loop.run_in_executor(None, _copy, cached, path)
+                _downloaded.inc(size, source="cache")
+                return path
+
+            part = f"{path}.part"
+            digest = sha256()
+            offset = await loop.run_in_executor(
+                None, _hash_file, part, digest
+            )
+
+            while True:
+                headers = {"Range": f"bytes={offset}-"} if offset else None
+
+                async with self.session.get(url, headers=headers) as res:
+                    if res.status == 416 and offset:
+                        if _range_size(res.headers) == offset:
+                            _log.debug(
+                                "%s was already completely downloaded" % url
+                            )
+                            break
+
+                        _log.debug(
+                            "%s doesn't match the size of %s, restarting"
+                            % (part, url)
+                        )
+                        offset, digest = 0, sha256()
+                        continue
+
+                    res.raise_for_status()
+
+                    if offset and res.status != 206:
+                        _log.debug("%s can not be resumed, restarting" % url)
+                        offset, digest = 0, sha256()
+
+                    file = await loop.run_in_executor(
+                        None, open, part, "ab" if offset else "wb"
+                    )
+
+                    try:
+                        async for chunk in res.content.iter_chunked(
+                                self.chunk_size
+                        ):
+                            _downloaded.inc(len(chunk), source="network")
+                            digest.update(chunk)
+                            await loop.run_in_executor(
+                                None, file.write, chunk
+                            )
+                    finally:
+                        file.close()
+
+                    break
+
+            await loop.run_in_executor(None, os.replace, part, path)
+
+            if self.cache_dir:
+                await loop.run_in_executor(
+                    None, self.__store, url, path, digest.hexdigest()
+                )
+
+            return path
+
+    async def save_all(
+            self,
+            files: Iterable[Tuple[str, str]]
+    ) -> List[Union[str, BaseException]]:
+        """
+        Download multiple files to disk, at most ``concurrency`` at the
+        same time.
+
+        :param files:
+            The url and path of every file.
+
+        :return:
+            The path of every saved file, or the exception if it failed.
+        """
+        return await gather(
+            *(self.save(url, path) for url, path in files),
+            return_exceptions=True
+        )
+
+
+def default_downloader() -> Downloader:
+    """
+    Get the downloader which is used by attachments when none is given.
+    There is one per event loop, it is created on first use and closed
+    when the last client on the loop stops, see
+    :func:`using_default_downloader`.
+    """
+    loop = get_event_loop()
+
+    if (downloader := _defaults.get(loop)) is None:
+        downloader = _defaults[loop] = Downloader()
+
+    return downloader
+
+
+@asynccontextmanager
+async def using_default_downloader() -> AsyncIterator[Downloader]:
+    """
+    Keep the default downloader of the loop open while the block runs.
+    It gets closed when the last block which uses it ends, so clients
+    on the same loop don't close it for each other.
+    """
+    loop = get_event_loop()
+    _users[loop] = _users.get(loop, 0) + 1
+
+    try:
+        yield default_downloader()
+    finally:
+        _users[loop] -= 1
+
+        if not _users[loop]:
+            del _users[loop]
+            await default_downloader().close()
+
+
+def _range_size(headers) -> Optional[int]:
+    """
+    Get the size of the complete file from a ``Content-Range`` header,
+    such as ``bytes */1024``.
+
+    :param headers:
+        The headers of the response.
+
+    :return:
+        The size in bytes, or ``None`` if it is unknown.
+    """
+    size = headers.get("Content-Range", "").rpartition("/")[2]
+    return int(size) if size.isdigit() else None
+
+
+async def _read_file(path: str, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Read a file chunk by chunk on the default executor.
+
+    :param path:
+        The path of the file.
+
+    :param chunk_size:
+        The amount of bytes which are read at once.
+    """
+    loop = get_event_loop()
+    file: BinaryIO = await loop.run_in_executor(None, open, path, "rb")
+
+    try:
+        while chunk := await loop.run_in_executor(
+                None, file.read, chunk_size
+        ):
+            yield chunk
+    finally:
+        file.close()
+
+
+def _hash_file(path: str, digest) -> int:
+    """
+    Add the content of a file to a hash.
+
+    :param path:
+        The path of the file.
+
+    :param digest:
+        The hash object.
+
+    :return:
+        The size of the file, ``0`` if it doesn't exist.
+    """
+    size = 0
+
+    if not os.path.exists(path):
+        return size
+
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return size
+
+
+def _copy(source: str, target: str):
+    """
+    Copy a file through a temporary file, so a half written copy never
+    exists under the target path.
+
+    Files are copied instead of linked, changing a saved file must not
+    change the cached file.
+
+    :param source:
+        The existing file.
+
+    :param target:
+        The path of the new file.
+
+    :return:
+        The size of the copy.
+    """
+    fd, temp = mkstemp(dir=os.path.dirname(target) or ".")
+    os.close(fd)
+
+    try:
+        shutil.copyfile(source, temp)
+        os.replace(temp, target)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+    return os.path.getsize(target)
+
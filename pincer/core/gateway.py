@@ -25,9 +25,17 @@
 from __future__ import annotations
 
 import logging
-from asyncio import get_event_loop, AbstractEventLoop, ensure_future
+from asyncio import (
+    get_event_loop, set_event_loop, AbstractEventLoop, Future, Queue,
+    ensure_future, gather
+)
+from concurrent.futures import Executor
 from platform import system
-from typing import Dict, Callable, Awaitable, Optional
+from time import perf_counter
+from typing import (
+    Dict, Callable, Awaitable, Optional, Iterable, List, Union
+)
+from weakref import WeakSet
 
 from websockets import connect
 from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
@@ -35,16 +43,118 @@ from websockets.legacy.client import WebSocketClientProtocol
 
 from pincer import __package__
 from pincer._config import GatewayConfig
+from pincer.core.decoder import PayloadDecoder
 from pincer.core.dispatch import GatewayDispatch
 from pincer.core.heartbeat import Heartbeat
+from pincer.core.metrics import MetricsServer, metrics
+from pincer.core.tracing import (
+    TraceConfig, TraceContext, DecodedParams, FrameReceivedParams,
+    send_trace, start_trace, use_trace
+)
+from pincer.core.watchdog import LoopWatchdog
 from pincer.exceptions import (
     PincerError, InvalidTokenError, UnhandledException,
     _InternalPerformReconnectError, DisallowedIntentsError
 )
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 Handler = Callable[[WebSocketClientProtocol, GatewayDispatch], Awaitable[None]]
 _log = logging.getLogger(__package__)
 
+_events_received = metrics.counter(
+    "pincer_gateway_events_total",
+    "Amount of gateway payloads received per opcode and event.",
+    ("op", "event")
+)
+_decode_time = metrics.histogram(
+    "pincer_gateway_decode_seconds",
+    "Time spent decoding gateway payloads.",
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1)
+)
+_pending_handlers = metrics.gauge(
+    "pincer_gateway_pending_handlers",
+    "Amount of scheduled handlers which have not finished yet."
+)
+_queue_depth = metrics.gauge(
+    "pincer_gateway_queue_depth",
+    "Amount of messages waiting for a stage of the dispatcher.",
+    ("queue",)
+)
+_queue_wait = metrics.histogram(
+    "pincer_gateway_queue_wait_seconds",
+    "Time messages spent waiting for a stage of the dispatcher.",
+    ("queue",),
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1)
+)
+
+# Every dispatcher of the process, eg of a ClientPool, has its own
+# queues, the gauge reports the sum of them.
+_queues: Dict[str, WeakSet] = {"decode": WeakSet(), "dispatch": WeakSet()}
+
+for _stage, _live in _queues.items():
+    _queue_depth.set_function(
+        lambda live=_live: sum(queue.qsize() for queue in tuple(live)),
+        queue=_stage
+    )
+
+
+class _Frame:
+    """A message on its way from the decode to the dispatch stage."""
+    __slots__ = ("trace", "start", "payload", "decoded")
+
+    def __init__(
+            self,
+            trace: Optional[TraceContext],
+            start: float,
+            payload: Union[GatewayDispatch, Future]
+    ):
+        self.trace: Optional[TraceContext] = trace
+        self.start: float = start
+        self.payload: Union[GatewayDispatch, Future] = payload
+        self.decoded: Optional[float] = None
+
+        if isinstance(payload, Future):
+            # The time is taken by the task itself, so it is known once
+            # the dispatch stage has awaited the payload. A done callback
+            # could still be pending at that point.
+            self.payload = ensure_future(self.__decode(payload))
+        else:
+            self.decoded = perf_counter()
+
+    async def __decode(self, payload: Future) -> GatewayDispatch:
+        result = await payload
+        self.decoded = perf_counter()
+        return result
+
+
+def new_loop(use_uvloop: bool = False) -> AbstractEventLoop:
+    """
+    Get the loop in which a dispatcher will run when no loop
+    was provided.
+
+    :param use_uvloop:
+        Whether or not to create a uvloop loop, if uvloop is
+        installed.
+    """
+    if not use_uvloop:
+        return get_event_loop()
+
+    if uvloop is None:
+        _log.warning(
+            "uvloop was requested but is not installed, falling back "
+            "to the default event loop. (pip install uvloop)"
+        )
+        return get_event_loop()
+
+    _log.debug("Using uvloop event loop.")
+    loop = uvloop.new_event_loop()
+    set_event_loop(loop)
+    return loop
+
 
 class Dispatcher:
     """
@@ -59,11 +169,73 @@ class Dispatcher:
     """
 
     # TODO: Add intents argument
-    # TODO: Implement compression
-    def __init__(self, token: str, *, handlers: Dict[int, Handler]) -> None:
+    def __init__(
+            self,
+            token: str, *,
+            handlers: Dict[int, Handler],
+            metrics_port: Optional[int] = None,
+            metrics_host: str = "127.0.0.1",
+            trace_configs: Optional[Iterable[TraceConfig]] = None,
+            stall_threshold: Optional[float] = None,
+            heartbeat_thread: bool = False,
+            compressed: bool = False,
+            decode_threshold: int = 512 * 1024,
+            decode_executor: Optional[Executor] = None,
+            stream_events: Optional[Dict[str, Iterable[str]]] = None,
+            queue_size: int = 256
+    ) -> None:
         """
         :param token:
             Bot token for discord's API.
+
+        Keyword Arguments:
+
+        :param handlers:
+            The handlers for the opcodes which the client handles.
+
+        :param metrics_port:
+            If set, the internal metrics get served in the Prometheus
+            text format on ``http://<metrics_host>:<port>/metrics``.
+
+        :param metrics_host:
+            The interface on which the metrics endpoint listens.
+            Defaults to localhost only.
+
+        :param trace_configs:
+            Hooks which get called for every stage of an event.
+
+        :param stall_threshold:
+            If set, the event loop gets watched and every time it is
+            blocked for longer than this amount of seconds, the handler
+            or middleware which blocked it gets logged.
+            See :class:`~.core.watchdog.LoopWatchdog`.
+
+        :param heartbeat_thread:
+            Keep the heartbeat schedule on a dedicated thread, so it
+            does not drift when the event loop gets blocked. The beats
+            are still sent from the loop.
+
+        :param compressed:
+            Use ``zlib-stream`` transport compression.
+
+        :param decode_threshold:
+            Messages of at least this amount of bytes get inflated on a
+            worker thread and, if a ``decode_executor`` is given,
+            decoded on that executor.
+            See :class:`~.core.decoder.PayloadDecoder`.
+
+        :param decode_executor:
+            The executor on which large payloads get decoded, they are
+            decoded inline if none is given.
+
+        :param stream_events:
+            Event names with the keys of their data of which the arrays
+            get decoded lazily, one element at a time.
+
+        :param queue_size:
+            The maximum amount of messages which can wait between the
+            read, decode and dispatch stages.
+
         :raises InvalidTokenError:
             Discord Token length is not 59 characters.
         """
@@ -76,6 +248,24 @@ class Dispatcher:
         self.__token = token
         self.__keep_alive = True
         self.__socket: Optional[WebSocketClientProtocol] = None
+        self.__heartbeat = Heartbeat()
+        self.__reconnect = False
+        self.trace_configs: List[TraceConfig] = list(trace_configs or ())
+        self.__watchdog: Optional[LoopWatchdog] = None
+        self.__compressed = compressed
+        self.__decode_threshold = decode_threshold
+        self.__decode_executor = decode_executor
+        self.__stream_events = stream_events
+        self.__queue_size = queue_size
+        self.__decoder: Optional[PayloadDecoder] = None
+
+        if stall_threshold is not None:
+            self.__watchdog = LoopWatchdog(stall_threshold)
+            self.trace_configs.append(self.__watchdog)
+        self.__metrics_server: Optional[MetricsServer] = (
+            MetricsServer(metrics_port, host=metrics_host)
+            if metrics_port is not None else None
+        )
 
         async def identify_and_handle_hello(
                 socket: WebSocketClientProtocol,
@@ -112,24 +302,28 @@ class Dispatcher:
                 )
             )
 
-            await Heartbeat.handle_hello(socket, payload)
+            await self.__heartbeat.handle_hello(
+                socket, payload, threaded=heartbeat_thread
+            )
 
         async def handle_reconnect(_, payload: GatewayDispatch):
             """
-            Closes the client and then reconnects it.
+            Closes the connection, :meth:`~.Dispatcher.start` then
+            reconnects the client.
             """
-            _log.debug("Reconnecting client...")
-            await self.close()
+            _log.debug("Reconnect requested, closing connection...")
+            self.__heartbeat.stop()
+            self.__heartbeat.update_sequence(payload.seq)
 
-            Heartbeat.update_sequence(payload.seq)
-            self.run()
+            self.__reconnect = True
+            await self.__socket.close()
 
         self.__dispatch_handlers: Dict[int, Handler] = {
             **handlers,
             7: handle_reconnect,
             9: handle_reconnect,
             10: identify_and_handle_hello,
-            11: Heartbeat.handle_heartbeat
+            11: self.__heartbeat.handle_heartbeat
         }
 
         self.__dispatch_errors: Dict[int, PincerError] = {
@@ -167,6 +361,7 @@ class Dispatcher:
             "New event received, checking if handler exists for opcode: %i"
             % payload.op
         )
+        _events_received.inc(op=payload.op, event=payload.event_name or "")
 
         handler: Handler = self.__dispatch_handlers.get(payload.op)
 
@@ -180,60 +375,202 @@ class Dispatcher:
 
         _log.debug(
             "Event handler found, ensuring async future in current loop.")
-        ensure_future(handler(socket, payload), loop=loop)
+        _pending_handlers.inc()
+        ensure_future(
+            handler(socket, payload), loop=loop
+        ).add_done_callback(lambda _: _pending_handlers.dec())
+
+    async def __read_stage(
+            self,
+            socket: WebSocketClientProtocol,
+            outbox: Queue
+    ):
+        """
+        Receives messages from the socket, so it always gets drained
+        promptly. A ``None`` gets queued when the connection closed.
+
+        :meta public:
+
+        :param socket:
+            The socket to read from.
+
+        :param outbox:
+            The queue of the decode stage.
+        """
+        try:
+            while self.__keep_alive:
+                _log.debug("Waiting for new event.")
+                message = await socket.recv()
+                await outbox.put((perf_counter(), message))
+
+        except ConnectionClosedOK:
+            _log.debug("Connection closed successfully.")
+
+        await outbox.put(None)
+
+    async def __decode_stage(self, inbox: Queue, outbox: Queue):
+        """
+        Inflates the messages in order and starts parsing them.
+        Parsing happens on the executor for large messages, so multiple
+        messages can be parsed at once.
 
-    async def __dispatcher(self, loop: AbstractEventLoop):
+        When tracing is enabled every message starts a new trace.
+
+        :meta public:
+
+        :param inbox:
+            The queue of the read stage.
+
+        :param outbox:
+            The queue of the dispatch stage.
+        """
+        while (item := await inbox.get()) is not None:
+            queued, message = item
+            _queue_wait.observe(perf_counter() - queued, queue="decode")
+
+            trace = None
+
+            if self.trace_configs:
+                trace = start_trace()
+                await send_trace(
+                    self.trace_configs,
+                    "on_frame_received",
+                    FrameReceivedParams(len(message))
+                )
+
+            start = perf_counter()
+            text = await self.__decoder.inflate(message)
+
+            if text is not None:
+                frame = _Frame(trace, start, self.__decoder.parse(text))
+                await outbox.put((perf_counter(), frame))
+
+        await outbox.put(None)
+
+    async def __dispatch_stage(
+            self,
+            socket: WebSocketClientProtocol,
+            inbox: Queue,
+            loop: AbstractEventLoop
+    ):
+        """
+        Hands the payloads to their handlers, in the order in which they
+        were received.
+
+        :meta public:
+
+        :param socket:
+            The socket which the handlers can use.
+
+        :param inbox:
+            The queue of the decode stage.
+
+        :param loop:
+            The loop in which the handlers get scheduled.
+        """
+        while (item := await inbox.get()) is not None:
+            queued, frame = item
+            _queue_wait.observe(perf_counter() - queued, queue="dispatch")
+
+            payload: GatewayDispatch = (
+                await frame.payload
+                if isinstance(frame.payload, Future) else frame.payload
+            )
+            duration = frame.decoded - frame.start
+            _decode_time.observe(duration)
+
+            if frame.trace:
+                use_trace(frame.trace)
+                frame.trace.event_name = payload.event_name
+                await send_trace(
+                    self.trace_configs,
+                    "on_decoded",
+                    DecodedParams(payload, duration)
+                )
+
+            await self.__handler_manager(socket, payload, loop)
+
+    async def __dispatcher(self, loop: AbstractEventLoop) -> bool:
         """
         The main event loop.
         This handles all interactions with the websocket API.
 
+        Reading, decoding and dispatching run as separate stages which
+        are connected by bounded queues.
+
         :meta public:
 
         :param loop:
             The loop in which the dispatcher is running.
+
+        :return:
+            Whether or not the client must reconnect.
         """
-        _log.debug(
-            "Establishing websocket connection with `%s`" % GatewayConfig.uri()
-        )
+        uri = GatewayConfig.uri(self.__compressed)
+        _log.debug("Establishing websocket connection with `%s`" % uri)
 
-        async with connect(GatewayConfig.uri()) as socket:
+        # Payloads like GUILD_CREATE can exceed the default limit of 1MiB.
+        async with connect(uri, max_size=None) as socket:
             self.__socket = socket
+            self.__decoder = PayloadDecoder(
+                compressed=self.__compressed,
+                threshold=self.__decode_threshold,
+                executor=self.__decode_executor,
+                stream_events=self.__stream_events
+            )
             _log.debug(
                 "Successfully established websocket connection with `%s`"
-                % GatewayConfig.uri()
+                % uri
             )
 
-            while self.__keep_alive:
-                try:
-                    _log.debug("Waiting for new event.")
-                    await self.__handler_manager(
-                        socket,
-                        GatewayDispatch.from_string(await socket.recv()),
-                        loop
-                    )
+            received = Queue(self.__queue_size)
+            decoded = Queue(self.__queue_size)
+            _queues["decode"].add(received)
+            _queues["dispatch"].add(decoded)
+
+            stages = [
+                ensure_future(self.__read_stage(socket, received)),
+                ensure_future(self.__decode_stage(received, decoded)),
+                ensure_future(self.__dispatch_stage(socket, decoded, loop))
+            ]
+
+            try:
+                await gather(*stages)
+
+            except ConnectionClosedError as exc:
+                _log.debug(
+                    "The connection with `%s` has been broken unexpectedly."
+                    " (%i, %s)"
+                    % (uri, exc.code, exc.reason)
+                )
 
-                except ConnectionClosedError as exc:
-                    _log.debug(
-                        "The connection with `%s` has been broken unexpectedly."
-                        " (%i, %s)"
-                        % (GatewayConfig.uri(), exc.code, exc.reason)
-                    )
+                exception = self.__dispatch_errors.get(exc.code)
 
-                    await self.close()
-                    exception = self.__dispatch_errors.get(exc.code)
+                if isinstance(exception, _InternalPerformReconnectError):
+                    self.__heartbeat.stop()
+                    self.__heartbeat.update_sequence(0)
+                    return True
 
-                    if isinstance(exception, _InternalPerformReconnectError):
-                        Heartbeat.update_sequence(0)
-                        await self.close()
-                        return self.run()
+                await self.close()
+                raise exception or UnhandledException(
+                    f"Dispatch error ({exc.code}): {exc.reason}"
+                )
 
-                    raise exception or UnhandledException(
-                        f"Dispatch error ({exc.code}): {exc.reason}"
-                    )
-                except ConnectionClosedOK:
-                    _log.debug("Connection closed successfully.")
+            finally:
+                for stage in stages:
+                    stage.cancel()
 
-    def run(self, *, loop: AbstractEventLoop = None):
+                _queues["decode"].discard(received)
+                _queues["dispatch"].discard(decoded)
+
+        reconnect, self.__reconnect = self.__reconnect, False
+        return reconnect
+
+    def run(
+            self, *,
+            loop: AbstractEventLoop = None,
+            use_uvloop: bool = False
+    ):
         """
         Instantiate the dispatcher, this will create a connection to the
         Discord websocket API on behalf of the client who's token has
@@ -244,12 +581,47 @@ class Dispatcher:
         :param loop:
             The loop in which the Dispatcher will run. If no loop is
             provided it will get a new one.
+
+        :param use_uvloop:
+            If no loop is provided, run on a new
+            `uvloop <https://github.com/MagicStack/uvloop>`_ loop when
+            it is installed. This speeds up the websocket and HTTP I/O.
         """
-        _log.debug("Starting GatewayDispatcher")
-        loop = loop or get_event_loop()
-        loop.run_until_complete(self.__dispatcher(loop))
+        loop = loop or new_loop(use_uvloop)
+        loop.run_until_complete(self.start())
         loop.close()
 
+    async def start(self):
+        """
+        Connect to the Discord websocket API and handle events until the
+        dispatcher gets closed, reconnecting when required.
+
+        Unlike :meth:`~.Dispatcher.run` this does not manage the event
+        loop, so multiple dispatchers can run on the same loop.
+        """
+        _log.debug("Starting GatewayDispatcher")
+        loop = get_event_loop()
+        self.__keep_alive = True
+
+        if self.__metrics_server:
+            await self.__metrics_server.start()
+
+        if self.__watchdog:
+            self.__watchdog.start(loop)
+
+        try:
+            while await self.__dispatcher(loop):
+                _log.debug("Reconnecting client...")
+
+        finally:
+            self.__heartbeat.stop()
+
+            if self.__watchdog:
+                await self.__watchdog.stop()
+
+            if self.__metrics_server:
+                await self.__metrics_server.stop()
+
     async def close(self):
         """
         Stop the dispatcher from listening and responding to gateway
@@ -264,4 +636,5 @@ class Dispatcher:
         )
 
         self.__keep_alive = False
+        self.__heartbeat.stop()
         await self.__socket.close()
@@ -25,17 +25,143 @@
 from __future__ import annotations
 
 import logging
-from asyncio import sleep
-from typing import Optional
+from asyncio import (
+    AbstractEventLoop, CancelledError, Task, ensure_future, get_event_loop,
+    run_coroutine_threadsafe, sleep
+)
+from concurrent.futures import Future, TimeoutError
+from threading import Event, Thread
+from time import perf_counter
+from typing import Callable, Coroutine, Optional
 
 from websockets.legacy.client import WebSocketClientProtocol
 
 from pincer import __package__
 from pincer.core.dispatch import GatewayDispatch
+from pincer.core.metrics import metrics
 from pincer.exceptions import HeartbeatError
 
 _log = logging.getLogger(__package__)
 
+_latency = metrics.gauge(
+    "pincer_heartbeat_latency_seconds",
+    "Round trip time of the last acknowledged heartbeat."
+)
+_late = metrics.counter(
+    "pincer_heartbeat_late_total",
+    "Amount of heartbeats which could not be sent in time because the "
+    "event loop was blocked."
+)
+
+
+class _HeartbeatThread(Thread):
+    """
+    Keeps the heartbeat schedule on its own thread, so it does not
+    depend on the event loop waking up in time.
+
+    The websocket protocol is not thread safe, so the heartbeat itself
+    still gets sent from the loop with
+    :func:`~asyncio.run_coroutine_threadsafe`. It is submitted the
+    moment it is due, and runs as soon as the loop is free again. A
+    blocked loop thus still delays the beat, but the schedule does not
+    drift and beats which could not be sent within the interval get
+    reported.
+    """
+
+    def __init__(
+            self,
+            loop: AbstractEventLoop,
+            interval: float,
+            send: Callable[[], Coroutine]
+    ):
+        """
+        :param loop:
+            The loop which owns the websocket.
+
+        :param interval:
+            The heartbeat interval in seconds.
+
+        :param send:
+            Returns the coroutine which sends a heartbeat.
+        """
+        super().__init__(name="pincer-heartbeat", daemon=True)
+        self.loop: AbstractEventLoop = loop
+        self.interval: float = interval
+        self.send: Callable[[], Coroutine] = send
+        self.acknowledged: bool = True
+        self.__stopped = Event()
+        self.__future: Optional[Future] = None
+
+    def stop(self):
+        """
+        Stop the heartbeat, the thread exits on its next wake up. A
+        heartbeat which has not been sent yet is cancelled.
+        """
+        self.__stopped.set()
+
+        if self.__future:
+            self.__future.cancel()
+
+    def run(self):
+        next_beat = perf_counter() + self.interval
+
+        while not self.__stopped.wait(max(next_beat - perf_counter(), 0)):
+            next_beat += self.interval
+
+            if not self.acknowledged:
+                _log.warning(
+                    "Previous heartbeat has not been acknowledged, the "
+                    "connection might be broken."
+                )
+
+            try:
+                future = self.__future = run_coroutine_threadsafe(
+                    self.send(), self.loop
+                )
+            except RuntimeError:
+                _log.debug("Event loop has been closed, stopping heartbeat.")
+                return
+
+            self.acknowledged = False
+            due = perf_counter()
+
+            try:
+                while not self.__wait(future):
+                    continue
+            except Exception as exc:
+                if not future.cancelled():
+                    _log.error("Failed to send heartbeat: %r" % exc)
+
+                return
+
+            if perf_counter() - due > self.interval:
+                _late.inc()
+                _log.warning(
+                    "Heartbeat was sent %.3fs late, the event loop was "
+                    "blocked." % (perf_counter() - due)
+                )
+
+            # Don't send the beats which were missed while the loop
+            # was blocked in a burst, continue the regular schedule.
+            next_beat = max(next_beat, perf_counter() + self.interval / 2)
+
+    def __wait(self, future) -> bool:
+        """
+        Wait a while for a heartbeat to be sent.
+
+        :param future:
+            The future of the heartbeat which was submitted to the loop.
+
+        :return:
+            Whether the thread can continue, either because the
+            heartbeat has been sent or the thread got stopped.
+        """
+        try:
+            future.result(timeout=self.interval)
+            return True
+        except TimeoutError:
+            return self.__stopped.is_set()
+
 
 class Heartbeat:
     """
@@ -43,12 +169,28 @@ class Heartbeat:
 
     This is what lets the server and client know that they are still
         both online and properly connected.
+
+    Every dispatcher has its own heartbeat, so multiple clients can
+        run in the same process.
+
+    The heartbeat is sent from the event loop, as the websocket and its
+        TLS state belong to it and can't be written from another thread.
+        A loop which is blocked for longer than the heartbeat interval
+        therefore delays the heartbeat, and Discord may close the
+        connection. Such beats get logged and counted, keep blocking
+        work off the loop with the ``decode_executor`` and find it with
+        the ``stall_threshold`` of the client. With ``heartbeat_thread``
+        the schedule is kept on a thread, so it doesn't drift.
     """
-    __heartbeat: float = 0
-    __sequence: Optional[int] = None
 
-    @classmethod
-    async def __send(cls, socket: WebSocketClientProtocol):
+    def __init__(self):
+        self.__heartbeat: float = 0
+        self.__sequence: Optional[int] = None
+        self.__last_send: Optional[float] = None
+        self.__thread: Optional[_HeartbeatThread] = None
+        self.__pending: Optional[Task] = None
+
+    async def __send(self, socket: WebSocketClientProtocol):
         """
         Sends a heartbeat to the API gateway.
         :meta public:
@@ -56,11 +198,11 @@ class Heartbeat:
         :param socket:
             The socket to send the heartbeat to.
         """
-        _log.debug("Sending heartbeat (seq: %s)" % str(cls.__sequence))
-        await socket.send(str(GatewayDispatch(1, cls.__sequence)))
+        _log.debug("Sending heartbeat (seq: %s)" % str(self.__sequence))
+        self.__last_send = perf_counter()
+        await socket.send(str(GatewayDispatch(1, self.__sequence)))
 
-    @classmethod
-    def get(cls) -> float:
+    def get(self) -> float:
         """
         Get the current heartbeat.
 
@@ -68,13 +210,14 @@ class Heartbeat:
             The current heartbeat of the client.
             Default is 0 (client has not initialized the heartbeat yet.)
         """
-        return cls.__heartbeat
+        return self.__heartbeat
 
-    @classmethod
     async def handle_hello(
-            cls,
+            self,
             socket: WebSocketClientProtocol,
-            payload: GatewayDispatch
+            payload: GatewayDispatch,
+            *,
+            threaded: bool = False
     ):
         """
         Handshake between the discord API and the client.
@@ -85,11 +228,18 @@ class Heartbeat:
 
         :param payload:
             The received hello message from the Discord gateway.
+
+        Keyword Arguments:
+
+        :param threaded:
+            Keep the heartbeat schedule on a dedicated thread instead of
+            resting on the event loop after every acknowledgement.
         """
         _log.debug("Handling initial discord hello websocket message.")
-        cls.__heartbeat = payload.data.get("heartbeat_interval")
+        self.stop()
+        self.__heartbeat = payload.data.get("heartbeat_interval")
 
-        if not cls.__heartbeat:
+        if not self.__heartbeat:
             _log.error(
                 "No `heartbeat_interval` is present. Has the API changed? "
                 "(payload: %s)" % payload
@@ -101,25 +251,32 @@ class Heartbeat:
                 "Check logging for more information."
             )
 
-        cls.__heartbeat /= 1000
+        self.__heartbeat /= 1000
 
         _log.debug(
-            "Maintaining a connection with heartbeat: %s" % cls.__heartbeat
+            "Maintaining a connection with heartbeat: %s" % self.__heartbeat
         )
 
-        if Heartbeat.__sequence:
+        if self.__sequence:
             await socket.send(
-                str(GatewayDispatch(6, cls.__sequence, seq=cls.__sequence))
+                str(GatewayDispatch(6, self.__sequence, seq=self.__sequence))
             )
 
         else:
-            await cls.__send(socket)
+            await self.__send(socket)
 
-    @classmethod
-    async def handle_heartbeat(cls, socket: WebSocketClientProtocol, _):
+        if threaded:
+            self.__thread = _HeartbeatThread(
+                get_event_loop(), self.__heartbeat, lambda: self.__send(socket)
+            )
+            self.__thread.start()
+
+    async def handle_heartbeat(self, socket: WebSocketClientProtocol, _):
         """
         Handles a heartbeat, which means that it rests
         and then sends a new heartbeat.
+        When the heartbeat runs on a thread this only registers the
+        acknowledgement.
 
         :param socket:
             The socket to send the heartbeat to.
@@ -127,13 +284,71 @@ class Heartbeat:
         :param _:
             Filling param for auto event handling.
         """
+        if self.__last_send is not None:
+            _latency.set(perf_counter() - self.__last_send)
+            self.__last_send = None
+
+        if self.__thread:
+            self.__thread.acknowledged = True
+            return
+
+        _log.debug("Resting heart for %is" % self.__heartbeat)
+        task = self.__pending = ensure_future(
+            self.__rest(socket, perf_counter() + self.__heartbeat)
+        )
+
+        try:
+            await task
+        except CancelledError:
+            # Only a heartbeat which got stopped is cancelled quietly.
+            if self.__pending is task:
+                raise
+        finally:
+            if self.__pending is task:
+                self.__pending = None
+
+    async def __rest(self, socket: WebSocketClientProtocol, due: float):
+        """
+        Rest until the next heartbeat is due, then send it.
+
+        :meta public:
+
+        :param socket:
+            The socket to send the heartbeat to.
+
+        :param due:
+            When the heartbeat is due, in :func:`time.perf_counter`
+            seconds.
+        """
+        await sleep(max(due - perf_counter(), 0))
+
+        if (late := perf_counter() - due) > self.__heartbeat / 10:
+            _late.inc()
+            _log.warning(
+                "Heartbeat is sent %.3fs late, the event loop was "
+                "blocked." % late
+            )
+
+        await self.__send(socket)
+
+    def stop(self):
+        """
+        Stop the heartbeat thread or the heartbeat which is resting, so
+        nothing gets sent on a closed connection. The heartbeat in
+        flight is forgotten, so its acknowledgement isn't measured as
+        latency of a new connection.
+        """
+        self.__last_send = None
+
+        if self.__thread:
+            self.__thread.stop()
+            self.__thread = None
 
-        _log.debug("Resting heart for %is" % cls.__heartbeat)
-        await sleep(cls.__heartbeat)
-        await cls.__send(socket)
+        if self.__pending:
+            pending, self.__pending = self.__pending, None
+            pending.cancel()
 
-    @classmethod
-    def update_sequence(cls, seq: int):
+    def update_sequence(self, seq: int):
         """
         Update the heartbeat sequence.
 
@@ -141,4 +356,4 @@ class Heartbeat:
             The new heartbeat sequence to be updated with.
         """
         _log.debug("Updating heartbeat sequence...")
-        cls.__sequence = seq
+        self.__sequence = seq
@@ -24,23 +24,136 @@
 
 import asyncio
 import logging
+from copy import copy, deepcopy
+from hashlib import sha256
+from itertools import count
 from json import dumps
-from typing import Dict, Any, Optional, Protocol
+from time import perf_counter
+from typing import Dict, Any, Optional, Protocol, Iterable, Sequence, Type
 
-from aiohttp import ClientSession, ClientResponse
+from aiohttp import (
+    BaseConnector, ClientConnectionError, ClientSession, ClientResponse,
+    ClientTimeout, TCPConnector
+)
 from aiohttp.client import _RequestContextManager
 from aiohttp.typedefs import StrOrURL
 
 from pincer import __package__
 from pincer._config import GatewayConfig
+from pincer.core.cache import ResponseCache
+from pincer.core.metrics import metrics
+from pincer.core.ratelimit_store import SharedRateLimitStore
+from pincer.core.ratelimiter import (
+    Bucket, RateLimiter, parse_ratelimit, route_template
+)
+from pincer.core.retry import RetryPolicy
+from pincer.core.tracing import (
+    TraceConfig, RequestCoalescedParams, RequestEndParams,
+    RequestRatelimitedParams, RequestRetryParams, RequestStartParams,
+    ensure_trace, send_trace
+)
+from pincer.core.upload import File, multipart_form
 from pincer.exceptions import (
     NotFoundError, BadRequestError, NotModifiedError, UnauthorizedError,
     ForbiddenError, MethodNotAllowedError, RateLimitError, ServerError,
-    HTTPError
+    HTTPError, GatewayError
 )
 
 _log = logging.getLogger(__package__)
 
+_requests = metrics.counter(
+    "pincer_http_requests_total",
+    "Amount of HTTP requests per route and status code.",
+    ("method", "route", "status")
+)
+_request_time = metrics.histogram(
+    "pincer_http_request_duration_seconds",
+    "Time until the response headers of a request were received.",
+    ("method", "route")
+)
+_ratelimits = metrics.counter(
+    "pincer_http_ratelimits_total",
+    "Amount of requests which got rate limited (status 429).",
+    ("method", "route")
+)
+_queue_depth = metrics.gauge(
+    "pincer_http_queue_depth",
+    "Amount of requests waiting for their rate limit per route.",
+    ("route",)
+)
+_queue_wait = metrics.histogram(
+    "pincer_http_queue_wait_seconds",
+    "Time requests waited for their rate limit per route.",
+    ("route",)
+)
+_coalesced = metrics.counter(
+    "pincer_http_coalesced_total",
+    "Amount of GET requests which shared the response of an identical "
+    "request that was already in flight.",
+    ("route",)
+)
+
+_attempt_ids = count(1)
+
+
+def _fresh_exception(exception: Exception) -> Exception:
+    """
+    Copy an exception, so callers which shared a request don't raise,
+    and add tracebacks to, the same object.
+
+    :param exception:
+        The exception of the shared request.
+
+    :return:
+        The copy, or the exception itself if it can't be copied.
+    """
+    try:
+        return copy(exception)
+    except Exception:
+        return exception
+
+
+def create_connector(
+        *,
+        limit: int = 100,
+        keepalive_timeout: float = 30,
+        dns_ttl: int = 300
+) -> TCPConnector:
+    """
+    Create a connection pool for REST requests, its connections are kept
+    open between requests so they skip the DNS lookup and TLS handshake.
+
+    Keyword Arguments:
+
+    :param limit:
+        The maximum amount of simultaneous connections.
+
+    :param keepalive_timeout:
+        The amount of seconds for which an idle connection is kept open.
+
+    :param dns_ttl:
+        The amount of seconds for which resolved hosts get cached.
+    """
+    return TCPConnector(
+        limit=limit,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=dns_ttl
+    )
+
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_http_exceptions: Dict[int, Type[HTTPError]] = {
+    304: NotModifiedError,
+    400: BadRequestError,
+    401: UnauthorizedError,
+    403: ForbiddenError,
+    404: NotFoundError,
+    405: MethodNotAllowedError,
+    429: RateLimitError,
+    502: GatewayError
+}
+
 
 class HttpCallable(Protocol):
     """aiohttp HTTP method"""
@@ -55,7 +168,20 @@ class HttpCallable(Protocol):
 class HTTPClient:
     """Interacts with Discord API through HTTP protocol"""
 
-    def __init__(self, token: str, *, version: int = None, ttl: int = 5):
+    def __init__(
+            self,
+            token: str, *,
+            version: int = None,
+            ttl: int = 5,
+            trace_configs: Optional[Iterable[TraceConfig]] = None,
+            connector: Optional[BaseConnector] = None,
+            persistent: bool = False,
+            global_rate: int = 50,
+            ratelimit_store: Optional[SharedRateLimitStore] = None,
+            base_url: Optional[str] = None,
+            cache: Optional[ResponseCache] = None,
+            retry_policy: Optional[RetryPolicy] = None
+    ):
         """
         Instantiate a new HttpApi object.
 
@@ -69,49 +195,110 @@ class HTTPClient:
             See `<https://discord.com/developers/docs/reference#api-versioning>`_.
 
         :param ttl:
-            Max amount of attempts after error code 5xx
+            Max amount of attempts after error code 5xx, used if no
+            ``retry_policy`` is given.
+
+        :param trace_configs:
+            Hooks which get called for every stage of a request.
+
+        :param connector:
+            A connection pool which is shared with other clients. It
+            does not get closed together with this client. If no
+            connector is given, one from :func:`create_connector` is
+            used.
+
+        :param persistent:
+            Keep the session open when leaving an ``async with`` block,
+            it only gets closed by :meth:`~.HTTPClient.close`.
+
+        :param global_rate:
+            The maximum amount of requests per second over all routes,
+            Discord raises this limit for some large bots.
+
+        :param ratelimit_store:
+            Share the rate limit state with the other processes of the
+            bot on this host, see
+            :class:`~.core.ratelimit_store.SharedRateLimitStore`.
+
+        :param base_url:
+            Send the requests to this url instead of the Discord API, eg
+            a :mod:`pincer.proxy` at ``http://127.0.0.1:8080/api/v9``.
+
+        :param cache:
+            Cache the responses of GET requests to routes which rarely
+            change, see :class:`~.core.cache.ResponseCache`.
+
+        :param retry_policy:
+            Decides which failed requests get retried and when, see
+            :class:`~.core.retry.RetryPolicy`.
         """
         version = version or GatewayConfig.version
-        self.url: str = f"https://discord.com/api/v{version}"
+        self.url: str = base_url or f"https://discord.com/api/v{version}"
         self.max_ttl: int = ttl
+        self.retry_policy = retry_policy or RetryPolicy(ttl)
+        self.trace_configs = list(trace_configs or ())
+        self.cache = cache
+
+        # Keys the cached responses, so a cache which is shared by the
+        # clients of several bots never mixes up their responses.
+        self.__cache_scope = sha256(token.encode()).hexdigest()[:16]
 
-        headers: Dict[str, str] = {
+        self.persistent = persistent
+
+        self.__headers: Dict[str, str] = {
             "Authorization": f"Bot {token}",
             "Content-Type": "application/json"
         }
-        self.__session: ClientSession = ClientSession(headers=headers)
-
-        self.__http_exceptions: Dict[int, HTTPError] = {
-            304: NotModifiedError(),
-            400: BadRequestError(),
-            401: UnauthorizedError(),
-            403: ForbiddenError(),
-            404: NotFoundError(),
-            405: MethodNotAllowedError(),
-            429: RateLimitError()
-        }
+        self.__connector = connector
+        self.__client_session: Optional[ClientSession] = None
+        self.__ratelimiter = RateLimiter(global_rate, ratelimit_store)
+        self.__inflight: Dict[str, asyncio.Future] = {}
+
 
     # for with block
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.close()
+        if not self.persistent:
+            await self.close()
+
+    @property
+    def __session(self) -> ClientSession:
+        """
+        The session which is used for all requests. It gets created on
+        its first use, and again after it has been closed.
+
+        :meta public:
+        """
+        if self.__client_session is None or self.__client_session.closed:
+            self.__client_session = ClientSession(
+                headers=self.__headers,
+                connector=self.__connector or create_connector(),
+                connector_owner=self.__connector is None
+            )
+
+        return self.__client_session
 
     async def close(self):
         """Closes :attr:`~.HTTPClient.__session`"""
-        await self.__session.close()
+        if self.__client_session and not self.__client_session.closed:
+            await self.__client_session.close()
 
     async def __send(
             self,
             method: HttpCallable,
             endpoint: str, *,
             data: Optional[Dict] = None,
-            __ttl: int = None
+            files: Optional[Sequence[File]] = None
     ) -> Optional[Dict]:
         """
         Send an api request to the Discord REST API.
 
+        Failed attempts are retried as the
+        :class:`~.core.retry.RetryPolicy` allows, rate limited attempts
+        are retried until they used up its amount of attempts.
+
         :meta public:
 
         :param method:
@@ -125,62 +312,356 @@ class HTTPClient:
         :param data:
             The data which will be added to the request.
 
-        :param __ttl:
-            Private param used for recursively setting the retry amount.
-            (Eg set to 1 for 1 max retry)
+        :param files:
+            Files which get streamed as multipart attachments.
         """
-        ttl = __ttl or self.max_ttl
+        method_name = method.__name__.upper()
+        _log.debug(f"{method_name} {endpoint} | {dumps(data)}")
 
-        if ttl == 0:
-            logging.error(
-                # TODO: print better method name
-                f"{method.__name__.upper()} {endpoint} has reached the "
-                f"maximum retry count of {self.max_ttl}."
+        url = f"{self.url}/{endpoint}"
+        cached = None
+        headers = None
+
+        if (
+            self.cache is not None
+            and method_name == "GET"
+            and self.cache.ttl(endpoint) is not None
+        ):
+            cached = self.cache.get(endpoint, scope=self.__cache_scope)
+
+            if cached and cached.fresh:
+                return deepcopy(cached.data)
+
+            if cached and cached.etag:
+                headers = {"If-None-Match": cached.etag}
+
+        bucket = self.__ratelimiter.bucket(method_name, endpoint)
+        policy = self.retry_policy
+
+        if files:
+            # Streaming an upload may take longer than the timeout, so
+            # only connecting and waiting for the response are limited.
+            timeout = ClientTimeout(
+                sock_connect=policy.timeout, sock_read=policy.timeout
             )
+        else:
+            timeout = ClientTimeout(total=policy.timeout)
 
-            raise ServerError(f"Maximum amount of retries for `{endpoint}`.")
+        attempt = ratelimited = 0
 
-        # TODO: print better method name
-        _log.debug(f"{method.__name__.upper()} {endpoint} | {dumps(data)}")
+        with ensure_trace():
+            while True:
+                acquired = await self.__acquire(bucket, endpoint)
+                status = retry_after = None
+                attempt_id = next(_attempt_ids)
 
-        url = f"{self.url}/{endpoint}"
-        async with method(url, json=data) as res:
-            return await self.__handle_response(
-                res, method, endpoint, data, ttl
+                await send_trace(
+                    self.trace_configs,
+                    "on_request_start",
+                    RequestStartParams(method_name, endpoint, data, attempt_id)
+                )
+
+                try:
+                    start = perf_counter()
+
+                    if files:
+                        # A new body on every attempt rewinds the files.
+                        form = multipart_form(data, files)
+                        body = {
+                            "data": form,
+                            "headers": {
+                                **(headers or {}),
+                                "Content-Type": form.content_type
+                            }
+                        }
+                    else:
+                        body = {"json": data, "headers": headers}
+
+                    async with method(url, timeout=timeout, **body) as res:
+                        _request_time.observe(
+                            perf_counter() - start,
+                            method=method_name,
+                            route=route_template(endpoint)
+                        )
+
+                        bucket = self.__ratelimiter.update(
+                            acquired, method_name, endpoint, res.headers
+                        )
+
+                        await send_trace(
+                            self.trace_configs,
+                            "on_request_end",
+                            RequestEndParams(
+                                method_name, endpoint, res.status, attempt_id
+                            )
+                        )
+
+                        if res.status == 429:
+                            await self.__handle_ratelimit(
+                                res, method_name, endpoint, bucket
+                            )
+                            ratelimited += 1
+
+                            if ratelimited >= policy.attempts:
+                                raise await self.__error(
+                                    res, method_name, endpoint, bucket
+                                )
+
+                            continue
+
+                        if (
+                            self.cache is not None
+                            and method_name not in _SAFE_METHODS
+                        ):
+                            self.cache.invalidate(
+                                endpoint, scope=self.__cache_scope
+                            )
+
+                        if res.status == 304 and cached:
+                            _requests.inc(
+                                method=method_name,
+                                route=route_template(endpoint),
+                                status=res.status
+                            )
+                            self.cache.refresh(
+                                endpoint, scope=self.__cache_scope
+                            )
+                            return deepcopy(cached.data)
+
+                        if res.status < 500:
+                            result = await self.__handle_response(
+                                res, method_name, endpoint, bucket
+                            )
+
+                            if (
+                                self.cache is not None
+                                and method_name == "GET"
+                                and res.status == 200
+                            ):
+                                self.cache.set(
+                                    endpoint,
+                                    result,
+                                    res.headers.get("ETag"),
+                                    len(await res.read()),
+                                    scope=self.__cache_scope
+                                )
+
+                            return result
+
+                        _requests.inc(
+                            method=method_name,
+                            route=route_template(endpoint),
+                            status=res.status
+                        )
+                        status = res.status
+                        retry_after = res.headers.get("Retry-After")
+                        error = await self.__error(
+                            res, method_name, endpoint, bucket
+                        )
+
+                except (ClientConnectionError, asyncio.TimeoutError) as exc:
+                    error = exc
+
+                    await send_trace(
+                        self.trace_configs,
+                        "on_request_end",
+                        RequestEndParams(
+                            method_name, endpoint, None, attempt_id
+                        )
+                    )
+
+                finally:
+                    acquired.release()
+
+                attempt += 1
+                failed = error if status is None else None
+
+                if not policy.should_retry(
+                        method_name, attempt, status, failed
+                ):
+                    if isinstance(error, HTTPError):
+                        raise error
+
+                    raise ServerError(
+                        f"{method_name} {endpoint} failed after {attempt} "
+                        f"attempts: {error!r}",
+                        route=route_template(endpoint),
+                        bucket=bucket.key[0]
+                    ) from error
+
+                delay = policy.backoff(
+                    attempt, float(retry_after) if retry_after else None
+                )
+
+                _log.warning(
+                    "%s %s failed (%s), retrying in %.3fs" % (
+                        method_name, endpoint, status or repr(error), delay
+                    )
+                )
+
+                await send_trace(
+                    self.trace_configs,
+                    "on_request_retry",
+                    RequestRetryParams(method_name, endpoint, status, delay)
+                )
+                await asyncio.sleep(delay)
+
+    async def __acquire(self, bucket: Bucket, endpoint: str) -> Bucket:
+        """
+        Wait until the rate limits allow the request to be sent.
+
+        :meta public:
+
+        :param bucket:
+            The bucket of the request.
+
+        :param endpoint:
+            The endpoint to which the request is sent.
+
+        :return:
+            The bucket which was acquired.
+        """
+        route = route_template(endpoint)
+        _queue_depth.inc(route=route)
+        start = perf_counter()
+
+        try:
+            return await self.__ratelimiter.acquire(bucket, endpoint)
+        finally:
+            _queue_depth.dec(route=route)
+            _queue_wait.observe(perf_counter() - start, route=route)
+
+    async def __handle_ratelimit(
+            self,
+            res: ClientResponse,
+            method: str,
+            endpoint: str,
+            bucket: Bucket
+    ):
+        """
+        Block the bucket, or every request for a global rate limit, until
+        the request may be retried.
+
+        A global rate limit pauses all requests at once, instead of each
+        request running into it separately.
+
+        :meta public:
+
+        :param res:
+            The response with status code 429.
+
+        :param method:
+            The HTTP method of the request.
+
+        :param endpoint:
+            The endpoint to which the request was sent.
+
+        :param bucket:
+            The bucket of the request.
+        """
+        route = route_template(endpoint)
+        _requests.inc(method=method, route=route, status=res.status)
+        _ratelimits.inc(method=method, route=route)
+
+        try:
+            body = await res.json(content_type=None)
+        except ValueError:
+            body = {}
+
+        retry_after, is_global = parse_ratelimit(res.headers, body)
+
+        _log.warning(
+            "%s %s got rate limited%s, retrying in %.3fs" % (
+                method, endpoint, " globally" if is_global else "",
+                retry_after
             )
+        )
+
+        await send_trace(
+            self.trace_configs,
+            "on_request_ratelimited",
+            RequestRatelimitedParams(method, endpoint, retry_after)
+        )
+
+        self.__ratelimiter.ratelimited(bucket, retry_after, is_global)
+
+    async def __error(
+            self,
+            res: ClientResponse,
+            method: str,
+            endpoint: str,
+            bucket: Bucket
+    ) -> HTTPError:
+        """
+        Create the exception for an unsuccessful response.
+
+        :meta public:
+
+        :param res:
+            The response from the discord API.
+
+        :param method:
+            The HTTP method of the request.
+
+        :param endpoint:
+            The endpoint to which the request was sent.
+
+        :param bucket:
+            The bucket of the request.
+        """
+        try:
+            body = await res.json(content_type=None)
+        except ValueError:
+            body = None
+
+        message = (
+            body.get("message") if isinstance(body, dict) else None
+        ) or res.reason
+
+        exception = _http_exceptions.get(
+            res.status, ServerError if res.status >= 500 else HTTPError
+        )
+
+        return exception(
+            f"{method} {endpoint} failed with {res.status}: {message}",
+            status=res.status,
+            route=route_template(endpoint),
+            bucket=bucket.key[0]
+        )
 
     async def __handle_response(
             self,
             res: ClientResponse,
-            method: HttpCallable,
+            method: str,
             endpoint: str,
-            data: Optional[Dict],
-            __ttl: int,
+            bucket: Bucket
     ) -> Optional[Dict]:
         """
         Handle responses from the discord API.
 
         :meta public:
 
-        Side effects:
-            If a 5xx error code is returned it will retry the request.
-
         :param res:
             The response from the discord API.
 
         :param method:
-            The method which was used to call the endpoint.
+            The HTTP method of the request.
 
         :param endpoint:
             The endpoint to which the request was sent.
 
-        :param data:
-            The data which was added to the request.
+        :param bucket:
+            The bucket of the request.
 
-        :param __ttl:
-            Private param used for recursively setting the retry amount.
-            (Eg set to 1 for 1 max retry)
+        :raises HTTPError:
+            A new instance of the exception of the status code.
         """
+        _requests.inc(
+            method=method,
+            route=route_template(endpoint),
+            status=res.status
+        )
+
         if res.ok:
             if res.status == 204:
                 _log.debug(
@@ -195,29 +676,27 @@ class HTTPClient:
 
             return await res.json()
 
-        exception = self.__http_exceptions.get(res.status)
-
-        if exception:
-            _log.error(
-                f"An http exception occurred while trying to send "
-                f"a request to {endpoint}. ({res.status}, {res.reason})"
-            )
+        exception = await self.__error(res, method, endpoint, bucket)
 
-            exception.__init__(res.reason)
-            raise exception
+        _log.error(
+            f"An http exception occurred while trying to send "
+            f"a request to {endpoint}. ({res.status}, {res.reason})"
+        )
 
-        # status code is guaranteed to be 5xx
-        retry_in = 1 + (self.max_ttl - __ttl) * 2
+        raise exception
 
-        _log.debug(
-            "Server side error occurred with status code "
-            f"{res.status}. Retrying in {retry_in}s."
-        )
+    def bucket(self, route: str, method: str = "GET") -> Bucket:
+        """
+        Get the rate limit bucket of a route, eg to size requests to the
+        remaining budget.
 
-        await asyncio.sleep(retry_in)
+        :param route:
+            The Discord REST endpoint.
 
-        # try sending it again
-        return await self.__send(method, endpoint, __ttl=__ttl - 1, data=data)
+        :param method:
+            The HTTP method of the request.
+        """
+        return self.__ratelimiter.bucket(method.upper(), route)
 
     async def delete(self, route: str) -> Optional[Dict]:
         """
@@ -235,13 +714,56 @@ class HTTPClient:
         """
         Sends a get request to a Discord REST endpoint.
 
+        Concurrent requests to the same endpoint share one request, every
+        caller gets its own copy of the response or exception.
+
         :param route:
             The Discord REST endpoint to send a get request to.
 
         :return:
             JSON response from the discord API.
         """
-        return await self.__send(self.__session.get, route)
+        request = self.__inflight.get(route)
+        leader = request is None
+
+        if leader:
+            request = asyncio.ensure_future(
+                self.__send(self.__session.get, route)
+            )
+            self.__inflight[route] = request
+
+            def done(_):
+                if self.__inflight.get(route) is request:
+                    del self.__inflight[route]
+
+            request.add_done_callback(done)
+        else:
+            _coalesced.inc(route=route_template(route))
+
+            # The stages of the shared request are only reported in the
+            # trace of the first caller, this ties the others to it.
+            with ensure_trace():
+                await send_trace(
+                    self.trace_configs,
+                    "on_request_coalesced",
+                    RequestCoalescedParams("GET", route)
+                )
+
+        try:
+            # Shielded, so a cancelled caller doesn't cancel the request
+            # for the others.
+            response = await asyncio.shield(request)
+        except Exception as exception:
+            fresh = _fresh_exception(exception)
+
+            if fresh is exception:
+                raise
+
+            raise fresh from exception
+
+        # The shared response is never handed out, so no caller sees the
+        # changes another one makes to its copy.
+        return deepcopy(response)
 
     async def head(self, route: str) -> Optional[Dict]:
         """
@@ -267,7 +789,12 @@ class HTTPClient:
         """
         return await self.__send(self.__session.options, route)
 
-    async def patch(self, route: str, data: Dict) -> Optional[Dict]:
+    async def patch(
+            self,
+            route: str,
+            data: Dict, *,
+            files: Optional[Sequence[File]] = None
+    ) -> Optional[Dict]:
         """
         Sends a patch request to a Discord REST endpoint.
 
@@ -277,12 +804,25 @@ class HTTPClient:
         :param data:
             The update data for the patch request.
 
+        Keyword Arguments:
+
+        :param files:
+            Attachments which get streamed with the request, see
+            :class:`~.core.upload.File`.
+
         :return:
             JSON response from the discord API.
         """
-        return await self.__send(self.__session.patch, route, data=data)
+        return await self.__send(
+            self.__session.patch, route, data=data, files=files
+        )
 
-    async def post(self, route: str, data: Dict) -> Optional[Dict]:
+    async def post(
+            self,
+            route: str,
+            data: Dict, *,
+            files: Optional[Sequence[File]] = None
+    ) -> Optional[Dict]:
         """
         Sends a post request to a Discord REST endpoint.
 
@@ -292,10 +832,18 @@ class HTTPClient:
         :param data:
             The data for the post request.
 
+        Keyword Arguments:
+
+        :param files:
+            Attachments which get streamed with the request, see
+            :class:`~.core.upload.File`.
+
         :return:
             JSON response from the discord API.
         """
-        return await self.__send(self.__session.post, route, data=data)
+        return await self.__send(
+            self.__session.post, route, data=data, files=files
+        )
 
     async def put(self, route: str, data: Dict) -> Optional[Dict]:
         """
@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+from math import inf, isnan
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from pincer import __package__
+
+_log = logging.getLogger(__package__)
+
+LabelValues = Tuple[str, ...]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, inf
+)
+
+
+def _escape(value: str) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+
+    :param value:
+        The raw label value.
+    """
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _fmt_value(value: float) -> str:
+    """
+    Format a sample value for the Prometheus text format.
+
+    :param value:
+        The value of the sample.
+    """
+    if isnan(value):
+        return "NaN"
+
+    if value == inf:
+        return "+Inf"
+
+    if value == -inf:
+        return "-Inf"
+
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _fmt_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    """
+    Format a set of labels as ``{name="value",...}``.
+
+    :param names:
+        The label names.
+
+    :param values:
+        The label values, in the same order as the names.
+    """
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    """Base class for all metric types."""
+    type: str = "untyped"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labels: Tuple[str, ...] = ()
+    ):
+        """
+        :param name:
+            The name under which the metric gets exported.
+
+        :param description:
+            A short description of what the metric measures.
+
+        :param labels:
+            The label names which every sample must provide.
+        """
+        self.name: str = name
+        self.description: str = description
+        self.labels: Tuple[str, ...] = labels
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        """
+        Transform the given labels to a tuple of label values.
+
+        :param labels:
+            The labels of the sample.
+
+        :raises ValueError:
+            The given labels don't match the metric its labels.
+        """
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f"Metric `{self.name}` expects labels {self.labels}, "
+                f"got {tuple(labels)}."
+            )
+
+        return tuple(str(labels[label]) for label in self.labels)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """
+        :return:
+            A list of ``(suffix, formatted labels, value)`` tuples.
+        """
+
+    def render(self) -> str:
+        """
+        :return:
+            The metric in the Prometheus text exposition format.
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}"
+        ]
+
+        lines.extend(
+            f"{self.name}{suffix}{labels} {_fmt_value(value)}"
+            for suffix, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing value."""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        """
+        Increase the counter.
+
+        :param amount:
+            The amount with which the counter gets increased.
+
+        :param \\*\\*labels:
+            The labels for the sample.
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        """
+        :return:
+            The current value of the counter for the given labels.
+        """
+        return self.__values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            return [
+                ("", _fmt_labels(self.labels, key), value)
+                for key, value in self.__values.items()
+            ]
+
+
+class Gauge(_Metric):
+    """A value which can go up and down."""
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__values: Dict[LabelValues, float] = {}
+        self.__functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str):
+        """
+        Set the gauge to a value.
+
+        :param value:
+            The new value of the gauge.
+
+        :param \\*\\*labels:
+            The labels for the sample.
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self.__values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        """
+        Increase the gauge, a negative amount decreases it.
+
+        :param amount:
+            The amount with which the gauge gets increased.
+
+        :param \\*\\*labels:
+            The labels for the sample.
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        """
+        Decrease the gauge.
+
+        :param amount:
+            The amount with which the gauge gets decreased.
+
+        :param \\*\\*labels:
+            The labels for the sample.
+        """
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels: str):
+        """
+        Let the gauge its value be computed on every scrape.
+        This is useful for sizes of collections which live elsewhere.
+
+        :param func:
+            Callable which returns the current value.
+
+        :param \\*\\*labels:
+            The labels for the sample.
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self.__functions[key] = func
+
+    def get(self, **labels: str) -> float:
+        """
+        :return:
+            The current value of the gauge for the given labels.
+        """
+        key = self._key(labels)
+        func = self.__functions.get(key)
+        return func() if func else self.__values.get(key, 0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            values = dict(self.__values)
+            functions = dict(self.__functions)
+
+        values.update({key: func() for key, func in functions.items()})
+        return [
+            ("", _fmt_labels(self.labels, key), value)
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """Counts observations in configurable buckets."""
+    type = "histogram"
+
+    def __init__(
+            self,
+            *args,
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+            **kwargs
+    ):
+        """
+        Keyword Arguments:
+
+        :param buckets:
+            The upper bounds of the buckets, ``+Inf`` gets added if it
+            is missing.
+        """
+        super().__init__(*args, **kwargs)
+        buckets = tuple(sorted(buckets))
+        self.buckets: Tuple[float, ...] = (
+            buckets if buckets[-1] == inf else (*buckets, inf)
+        )
+        self.__values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        """
+        Register an observation.
+
+        :param value:
+            The observed value, eg a duration in seconds.
+
+        :param \\*\\*labels:
+            The labels for the sample.
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            # Layout: [bucket counts..., sum, count]
+            data = self.__values.setdefault(
+                key, [0] * (len(self.buckets) + 2)
+            )
+
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[idx] += 1
+
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        names = (*self.labels, "le")
+        result = []
+
+        with self._lock:
+            for key, data in self.__values.items():
+                result.extend(
+                    ("_bucket", _fmt_labels(names, (*key, _fmt_value(b))), n)
+                    for b, n in zip(self.buckets, data)
+                )
+
+                labels = _fmt_labels(self.labels, key)
+                result.append(("_sum", labels, data[-2]))
+                result.append(("_count", labels, data[-1]))
+
+        return result
+
+
+class MetricsRegistry:
+    """
+    Collection of all metrics which get exported.
+
+    Asking for a metric which has already been registered returns the
+    existing metric, so multiple instances of a class can share their
+    metrics.
+    """
+
+    def __init__(self):
+        self.__metrics: Dict[str, _Metric] = {}
+        self.__lock = Lock()
+
+    def __register(self, cls, name: str, *args, **kwargs) -> _Metric:
+        with self.__lock:
+            metric = self.__metrics.get(name)
+
+            if metric is None:
+                metric = self.__metrics[name] = cls(name, *args, **kwargs)
+
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    f"Metric `{name}` has already been registered as a "
+                    f"{metric.type}."
+                )
+
+        return metric
+
+    def counter(
+            self,
+            name: str,
+            description: str,
+            labels: Tuple[str, ...] = ()
+    ) -> Counter:
+        """
+        Get or register a counter.
+
+        :param name:
+            The name of the metric.
+
+        :param description:
+            A short description of the metric.
+
+        :param labels:
+            The label names of the metric.
+        """
+        return self.__register(Counter, name, description, labels)
+
+    def gauge(
+            self,
+            name: str,
+            description: str,
+            labels: Tuple[str, ...] = ()
+    ) -> Gauge:
+        """
+        Get or register a gauge.
+
+        :param name:
+            The name of the metric.
+
+        :param description:
+            A short description of the metric.
+
+        :param labels:
+            The label names of the metric.
+        """
+        return self.__register(Gauge, name, description, labels)
+
+    def histogram(
+            self,
+            name: str,
+            description: str,
+            labels: Tuple[str, ...] = (),
+            *,
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """
+        Get or register a histogram.
+
+        :param name:
+            The name of the metric.
+
+        :param description:
+            A short description of the metric.
+
+        :param labels:
+            The label names of the metric.
+
+        Keyword Arguments:
+
+        :param buckets:
+            The upper bounds of the histogram buckets.
+        """
+        return self.__register(
+            Histogram, name, description, labels, buckets=buckets
+        )
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """
+        :return:
+            The metric with the given name, if it has been registered.
+        """
+        return self.__metrics.get(name)
+
+    def render(self) -> str:
+        """
+        :return:
+            All metrics in the Prometheus text exposition format.
+        """
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# The registry to which all the library its metrics are reported.
+metrics = MetricsRegistry()
+
+
+class MetricsServer:
+    """
+    Small local HTTP server which exposes a registry on ``/metrics``
+    in the Prometheus text format.
+    """
+
+    def __init__(
+            self,
+            port: int,
+            *,
+            host: str = "127.0.0.1",
+            registry: MetricsRegistry = metrics
+    ):
+        """
+        :param port:
+            The port on which the endpoint will listen.
+
+        Keyword Arguments:
+
+        :param host:
+            The interface on which the endpoint will listen.
+            Defaults to localhost only.
+
+        :param registry:
+            The registry which will be exported.
+        """
+        self.host: str = host
+        self.port: int = port
+        self.registry: MetricsRegistry = registry
+        self.__runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether or not the server is currently listening."""
+        return self.__runner is not None
+
+    async def __handle(self, _: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    async def start(self):
+        """Start listening, does nothing if already started."""
+        if self.__runner:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle)
+
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, self.host, self.port).start()
+
+        _log.debug(
+            "Serving metrics on `http://%s:%i/metrics`" % (self.host, self.port)
+        )
+
+    async def stop(self):
+        """Stop listening."""
+        if not self.__runner:
+            return
+
+        await self.__runner.cleanup()
+        self.__runner = None
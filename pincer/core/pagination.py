@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+from asyncio import Task, ensure_future
+from typing import (
+    Any, AsyncIterator, Callable, Dict, List, Optional, Union
+)
+from urllib.parse import urlencode
+
+from pincer import __package__
+from pincer.core.http import HTTPClient
+from pincer.objects.audit_log import AuditLogEntry
+from pincer.objects.ban import Ban
+from pincer.objects.guild_member import GuildMember
+
+_log = logging.getLogger(__package__)
+
+Id = Union[int, str]
+
+
+class Paginator:
+    """
+    Iterates over the items of a paginated Discord endpoint.
+
+    The next page is requested while the current one is consumed, so
+    processing the items overlaps with the round trip. The page size
+    starts small for the first items to arrive fast and grows with
+    every page. Once the rate limit bucket is about to run out, the
+    largest pages are requested, as the next request has to wait for
+    the reset anyway.
+
+    >>> async for message in Paginator(http, "channels/1/messages", ...):
+    ...     print(message.content)
+    """
+
+    def __init__(
+            self,
+            http: HTTPClient,
+            route: str,
+            parser: Optional[Callable[[Dict], Any]] = None, *,
+            limit: Optional[int] = None,
+            before: Optional[Id] = None,
+            after: Optional[Id] = None,
+            max_page_size: int = 100,
+            first_page_size: int = 25,
+            key: Callable[[Dict], Any] = lambda item: item["id"],
+            items: Optional[Callable[[Any], List[Dict]]] = None,
+            params: Optional[Dict[str, Any]] = None
+    ):
+        """
+        :param http:
+            The http client which sends the requests.
+
+        :param route:
+            The paginated endpoint, without query.
+
+        :param parser:
+            Converts the raw items, eg ``Message.from_dict``. The raw
+            dicts are yielded if this is ``None``.
+
+        Keyword Arguments:
+
+        :param limit:
+            The maximum amount of items, ``None`` for all of them.
+
+        :param before:
+            Walk backwards from this id, newest items first.
+
+        :param after:
+            Walk forwards from this id, oldest items first. Takes
+            precedence over ``before`` as upper bound.
+
+        :param max_page_size:
+            The largest page the endpoint returns.
+
+        :param first_page_size:
+            The size of the first page, small so the first items arrive
+            fast.
+
+        :param key:
+            Get the id of a raw item, which is the cursor.
+
+        :param items:
+            Get the items from a response, for endpoints which don't
+            respond with a list.
+
+        :param params:
+            Extra query parameters.
+        """
+        self.http = http
+        self.route = route
+        self.parser = parser
+        self.limit = limit
+        self.before = before
+        self.after = after
+        self.max_page_size = max_page_size
+        self.first_page_size = min(first_page_size, max_page_size)
+        self.key = key
+        self.items = items
+        self.params = params or {}
+
+    @property
+    def ascending(self) -> bool:
+        """Whether the items are walked from old to new."""
+        return self.after is not None
+
+    def __next_page_size(self, size: int, left: Optional[int]) -> int:
+        """
+        Get the size of the next page, grown from the previous one.
+
+        :param size:
+            The size of the previous page.
+
+        :param left:
+            The amount of items which are still wanted.
+
+        :meta public:
+        """
+        bucket = self.http.bucket(self.route)
+
+        if bucket.remaining is not None and bucket.remaining <= 1:
+            size = self.max_page_size
+        else:
+            size = min(size * 2, self.max_page_size)
+
+        return size if left is None else min(size, left)
+
+    async def __fetch(self, cursor: Optional[Id], size: int) -> List[Dict]:
+        """
+        Request a page, sorted in walking order.
+
+        :param cursor:
+            The id from which the page starts.
+
+        :param size:
+            The amount of items to request.
+
+        :meta public:
+        """
+        params = {**self.params, "limit": size}
+
+        if self.ascending:
+            params["after"] = cursor
+        elif cursor is not None:
+            params["before"] = cursor
+
+        response = await self.http.get(f"{self.route}?{urlencode(params)}")
+        page = self.items(response) if self.items else response or []
+
+        page.sort(
+            key=lambda item: int(self.key(item)),
+            reverse=not self.ascending
+        )
+
+        # Endpoints accept only one of `after` and `before`, so the
+        # upper bound of a forwards walk is applied here.
+        if self.ascending and self.before is not None:
+            page = [i for i in page if int(self.key(i)) < int(self.before)]
+
+        return page
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        """Iterate over the pages, the next one is already requested."""
+        left = self.limit
+        cursor = self.after if self.ascending else self.before
+        size = self.first_page_size
+        if left is not None:
+            size = min(size, left)
+
+        task: Optional[Task] = ensure_future(self.__fetch(cursor, size))
+
+        try:
+            while task:
+                page = await task
+                task = None
+
+                if left is not None:
+                    page = page[:left]
+                    left -= len(page)
+
+                if len(page) >= size and left != 0:
+                    cursor = self.key(page[-1])
+                    size = self.__next_page_size(size, left)
+                    task = ensure_future(self.__fetch(cursor, size))
+
+                if page:
+                    yield page if self.parser is None else [
+                        self.parser(item) for item in page
+                    ]
+        finally:
+            if task:
+                task.cancel()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        async for page in self.pages():
+            for item in page:
+                yield item
+
+    async def flatten(self) -> List[Any]:
+        """Collect all items in a list."""
+        return [item async for item in self]
+
+
+def history(
+        http: HTTPClient,
+        channel_id: Id, *,
+        limit: Optional[int] = None,
+        before: Optional[Id] = None,
+        after: Optional[Id] = None,
+        raw: bool = False
+) -> Paginator:
+    """
+    Iterate over the messages of a channel, newest first unless
+    ``after`` is given.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param channel_id:
+        The channel of the messages.
+
+    Keyword Arguments:
+
+    :param limit:
+        The maximum amount of messages, ``None`` for all of them.
+
+    :param before:
+        Only messages before this message id.
+
+    :param after:
+        Only messages after this message id, oldest first.
+
+    :param raw:
+        Yield the raw dicts instead of :class:`~pincer.objects.Message`
+        objects.
+    """
+    parser = None
+
+    if not raw:
+        # Imported here, as the message module imports the interactions
+        # module, which imports it back.
+        from pincer.objects.message import Message
+        parser = Message.from_dict
+
+    return Paginator(
+        http, f"channels/{channel_id}/messages", parser,
+        limit=limit, before=before, after=after
+    )
+
+
+def members(
+        http: HTTPClient,
+        guild_id: Id, *,
+        limit: Optional[int] = None,
+        after: Id = 0,
+        raw: bool = False
+) -> Paginator:
+    """
+    Iterate over the members of a guild, ordered by user id.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param guild_id:
+        The guild of the members.
+
+    Keyword Arguments:
+
+    :param limit:
+        The maximum amount of members, ``None`` for all of them.
+
+    :param after:
+        Only members with a higher user id.
+
+    :param raw:
+        Yield the raw dicts instead of
+        :class:`~pincer.objects.GuildMember` objects.
+    """
+    return Paginator(
+        http, f"guilds/{guild_id}/members",
+        None if raw else GuildMember.from_dict,
+        limit=limit, after=after,
+        max_page_size=1000,
+        key=lambda member: member["user"]["id"]
+    )
+
+
+def bans(
+        http: HTTPClient,
+        guild_id: Id, *,
+        limit: Optional[int] = None,
+        before: Optional[Id] = None,
+        after: Optional[Id] = None,
+        raw: bool = False
+) -> Paginator:
+    """
+    Iterate over the bans of a guild, ordered by user id.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param guild_id:
+        The guild of the bans.
+
+    Keyword Arguments:
+
+    :param limit:
+        The maximum amount of bans, ``None`` for all of them.
+
+    :param before:
+        Only bans of users with a lower id, highest first.
+
+    :param after:
+        Only bans of users with a higher id, lowest first.
+
+    :param raw:
+        Yield the raw dicts instead of :class:`~pincer.objects.Ban`
+        objects.
+    """
+    return Paginator(
+        http, f"guilds/{guild_id}/bans",
+        None if raw else Ban.from_dict,
+        limit=limit, before=before,
+        after=0 if after is None and before is None else after,
+        max_page_size=1000,
+        key=lambda ban: ban["user"]["id"]
+    )
+
+
+def audit_log(
+        http: HTTPClient,
+        guild_id: Id, *,
+        limit: Optional[int] = None,
+        before: Optional[Id] = None,
+        after: Optional[Id] = None,
+        user_id: Optional[Id] = None,
+        action_type: Optional[int] = None,
+        raw: bool = False
+) -> Paginator:
+    """
+    Iterate over the audit log entries of a guild, newest first unless
+    ``after`` is given.
+
+    :param http:
+        The http client which sends the requests.
+
+    :param guild_id:
+        The guild of the audit log.
+
+    Keyword Arguments:
+
+    :param limit:
+        The maximum amount of entries, ``None`` for all of them.
+
+    :param before:
+        Only entries before this entry id.
+
+    :param after:
+        Only entries after this entry id, oldest first.
+
+    :param user_id:
+        Only entries of actions by this user.
+
+    :param action_type:
+        Only entries of this :class:`~pincer.objects.AuditLogEvent`.
+
+    :param raw:
+        Yield the raw dicts instead of
+        :class:`~pincer.objects.AuditLogEntry` objects.
+    """
+    params = {
+        name: value for name, value in (
+            ("user_id", user_id), ("action_type", action_type)
+        ) if value is not None
+    }
+
+    return Paginator(
+        http, f"guilds/{guild_id}/audit-logs",
+        None if raw else AuditLogEntry.from_dict,
+        limit=limit, before=before, after=after,
+        items=lambda response: response["audit_log_entries"],
+        params=params
+    )
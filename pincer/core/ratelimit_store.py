@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+from hashlib import blake2b
+from threading import Lock
+from time import time
+from typing import Optional, Tuple
+
+from pincer import __package__
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_log = logging.getLogger(__package__)
+
+_MAGIC = b"PINCRL01"
+_HEADER = struct.Struct("<8sI4x")
+_GLOBAL = struct.Struct("<ddI4x")
+_SLOT = struct.Struct("<Qiidd")
+
+#: The amount of slots which are searched for a bucket.
+_PROBES = 16
+
+
+class SharedRateLimitStore:
+    """
+    Rate limit state which is shared by all processes on a host through
+    a memory mapped file.
+
+    Every operation locks the file, reads and updates the state and
+    unlocks it again, so the processes never overshoot a bucket or the
+    global limit together. The lock is only held for a few
+    microseconds, so it is taken without leaving the event loop.
+
+    Every process must open the store itself, a store which is
+    inherited through a fork shares its lock with the parent.
+    This requires ``fcntl``, so it is not available on Windows.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> store = SharedRateLimitStore("/tmp/pincer-ratelimits")
+        >>> client = Client("token", ratelimit_store=store)
+    """
+
+    def __init__(self, path: str, *, slots: int = 4096):
+        """
+        :param path:
+            The file which holds the state, all processes must use the
+            same path.
+
+        Keyword Arguments:
+
+        :param slots:
+            The maximum amount of buckets which are tracked, buckets
+            which have reset get replaced when all slots are in use.
+            Buckets which find no free slot are only limited by the
+            process itself.
+        """
+        if fcntl is None:
+            raise RuntimeError(
+                "A shared rate limit store requires fcntl, which is not "
+                "available on this platform."
+            )
+
+        self.path = path
+        self.__lock = Lock()
+        self.__warned = False
+        self.__fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        size = _HEADER.size + _GLOBAL.size + slots * _SLOT.size
+
+        fcntl.flock(self.__fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self.__fd, _HEADER.size, 0)
+
+            if len(header) == _HEADER.size:
+                magic, slots = _HEADER.unpack(header)
+
+                if magic != _MAGIC:
+                    raise ValueError(f"{path} is not a rate limit store.")
+
+                size = _HEADER.size + _GLOBAL.size + slots * _SLOT.size
+            else:
+                os.ftruncate(self.__fd, size)
+                os.pwrite(self.__fd, _HEADER.pack(_MAGIC, slots), 0)
+
+        finally:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+        self.slots = slots
+        self.__map = mmap.mmap(self.__fd, size)
+
+    def close(self):
+        """Unmap and close the file, the state stays in the file."""
+        self.__map.close()
+        os.close(self.__fd)
+
+    def __enter__(self):
+        # flock does not exclude threads of the same process.
+        self.__lock.acquire()
+        fcntl.flock(self.__fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fcntl.flock(self.__fd, fcntl.LOCK_UN)
+        self.__lock.release()
+
+    @staticmethod
+    def __hash(key: Tuple[str, str]) -> int:
+        """
+        A hash of a bucket key which is the same in every process.
+
+        :meta public:
+
+        :param key:
+            The bucket key.
+        """
+        digest = blake2b("\0".join(key).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def __slot(self, key: Tuple[str, str]) -> Tuple[Optional[int], list]:
+        """
+        Find the slot of a bucket, or claim one for it. Must be called
+        with the lock held.
+
+        Only slots of buckets which have reset get replaced, evicting a
+        bucket which is still limited would let the processes overshoot
+        it together.
+
+        :meta public:
+
+        :param key:
+            The bucket key.
+
+        :return:
+            The offset of the slot and its values, the offset is
+            ``None`` if all slots are in use.
+        """
+        key_hash = self.__hash(key)
+        start = key_hash % self.slots
+        oldest, oldest_reset = None, time()
+
+        for probe in range(min(_PROBES, self.slots)):
+            offset = (
+                _HEADER.size + _GLOBAL.size
+                + (start + probe) % self.slots * _SLOT.size
+            )
+            values = list(_SLOT.unpack_from(self.__map, offset))
+
+            if values[0] == key_hash:
+                return offset, values
+
+            if values[0] == 0:
+                return offset, [key_hash, -1, -1, 0., 0.]
+
+            if values[3] <= oldest_reset:
+                oldest, oldest_reset = offset, values[3]
+
+        if oldest is None and not self.__warned:
+            self.__warned = True
+            _log.warning(
+                "Rate limit store `%s` is full, buckets without a slot "
+                "are only limited per process" % self.path
+            )
+
+        return oldest, [key_hash, -1, -1, 0., 0.]
+
+    def acquire(self, key: Tuple[str, str]) -> float:
+        """
+        Claim a request of a bucket.
+
+        :param key:
+            The bucket key.
+
+        :return:
+            ``0`` if a request was claimed, otherwise the amount of
+            seconds until the bucket resets.
+        """
+        with self:
+            offset, values = self.__slot(key)
+            _, limit, remaining, reset_at, window = values
+            now = time()
+
+            if offset is None or limit < 0:
+                return 0
+
+            if remaining <= 0:
+                if now < reset_at:
+                    return reset_at - now
+
+                remaining, reset_at = limit, now + window
+
+            _SLOT.pack_into(
+                self.__map, offset,
+                values[0], limit, remaining - 1, reset_at, window
+            )
+            return 0
+
+    def update(
+            self,
+            key: Tuple[str, str],
+            limit: int,
+            remaining: int,
+            reset_after: float
+    ):
+        """
+        Store the state of a bucket from the headers of a response.
+
+        :param key:
+            The bucket key.
+
+        :param limit:
+            The ``X-RateLimit-Limit`` header.
+
+        :param remaining:
+            The ``X-RateLimit-Remaining`` header.
+
+        :param reset_after:
+            The ``X-RateLimit-Reset-After`` header.
+        """
+        with self:
+            offset, values = self.__slot(key)
+            reset_at = time() + reset_after
+
+            if offset is None:
+                return
+
+            # Same rule as Bucket.update, within a window the
+            # lowest count wins.
+            if values[1] >= 0 and reset_at <= values[3] + .5:
+                remaining = min(remaining, values[2])
+
+            _SLOT.pack_into(
+                self.__map, offset,
+                values[0], limit, remaining, reset_at,
+                max(values[4], reset_after)
+            )
+
+    def exhaust(self, key: Tuple[str, str], retry_after: float):
+        """
+        Block a bucket after it got rate limited.
+
+        :param key:
+            The bucket key.
+
+        :param retry_after:
+            The amount of seconds until the bucket resets.
+        """
+        with self:
+            offset, values = self.__slot(key)
+
+            if offset is None:
+                return
+
+            _SLOT.pack_into(
+                self.__map, offset,
+                values[0], max(values[1], 1), 0,
+                max(values[3], time() + retry_after), values[4]
+            )
+
+    def acquire_global(self, rate: int, per: float = 1) -> float:
+        """
+        Claim a request of the global rate limit.
+
+        :param rate:
+            The maximum amount of requests per period.
+
+        :param per:
+            The length of the period in seconds.
+
+        :return:
+            ``0`` if a request was claimed, otherwise the amount of
+            seconds until one can be.
+        """
+        with self:
+            start, paused_until, count = _GLOBAL.unpack_from(
+                self.__map, _HEADER.size
+            )
+            now = time()
+
+            if now < paused_until:
+                return paused_until - now
+
+            if now - start >= per:
+                start, count = now, 0
+
+            if count >= rate:
+                return start + per - now
+
+            _GLOBAL.pack_into(
+                self.__map, _HEADER.size, start, paused_until, count + 1
+            )
+            return 0
+
+    def pause_global(self, retry_after: float):
+        """
+        Hold back the requests of all processes after the global limit
+        got hit.
+
+        :param retry_after:
+            The amount of seconds until requests may be sent again.
+        """
+        with self:
+            start, paused_until, count = _GLOBAL.unpack_from(
+                self.__map, _HEADER.size
+            )
+            _GLOBAL.pack_into(
+                self.__map, _HEADER.size, start,
+                max(paused_until, time() + retry_after), count
+            )
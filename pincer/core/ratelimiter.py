@@ -0,0 +1,639 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import re
+from asyncio import (
+    CancelledError, Future, TimerHandle, get_event_loop, sleep
+)
+from collections import OrderedDict, deque
+from time import monotonic
+from typing import Any, Deque, Dict, Hashable, Mapping, Optional, Tuple
+
+from pincer import __package__
+from pincer.core.ratelimit_store import SharedRateLimitStore
+
+_log = logging.getLogger(__package__)
+
+BucketKey = Tuple[str, str]
+
+_snowflake_re = re.compile(r"\d{15,21}")
+_major_re = re.compile(r"^/?(channels|guilds|webhooks)/(\d{15,21})")
+
+
+def route_template(endpoint: str) -> str:
+    """
+    Strip the ids and query from an endpoint, this keeps the amount of
+    distinct routes bounded.
+
+    :param endpoint:
+        The endpoint to which a request is sent.
+    """
+    return _snowflake_re.sub("{id}", endpoint.split("?", 1)[0])
+
+
+def major_parameter(endpoint: str) -> str:
+    """
+    Get the major parameter of an endpoint, Discord keeps separate rate
+    limits for every channel, guild and webhook.
+
+    :param endpoint:
+        The endpoint to which a request is sent.
+
+    :return:
+        The id of the channel, guild or webhook or an empty string.
+    """
+    match = _major_re.match(endpoint)
+    return match.group(2) if match else ""
+
+
+def parse_ratelimit(
+        headers: Mapping[str, str],
+        body: Mapping[str, Any]
+) -> Tuple[float, bool]:
+    """
+    Get when a rate limited request may be retried.
+
+    :param headers:
+        The headers of the response with status code 429.
+
+    :param body:
+        The decoded body of the response, or an empty dict if it could
+        not be decoded.
+
+    :return:
+        The amount of seconds to wait and whether the global rate limit
+        was hit.
+    """
+    retry_after = float(
+        body.get("retry_after") or headers.get("Retry-After") or 1
+    )
+    is_global = bool(
+        body.get("global") or headers.get("X-RateLimit-Global") == "true"
+    )
+    return retry_after, is_global
+
+
+class Bucket:
+    """
+    The rate limit of one Discord bucket for one major parameter.
+
+    Requests wait in a queue and get released on a schedule computed
+    from the reset time, so no request gets sent into an exhausted
+    bucket. As long as the limit of the bucket is unknown, only one
+    request at a time is let through, its response tells the limit.
+    """
+
+    def __init__(self, key: BucketKey):
+        """
+        :param key:
+            The bucket hash, or route if the hash is unknown, and the
+            major parameter.
+        """
+        self.key: BucketKey = key
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: float = 0
+        self.window: float = 0
+        self.unlimited: bool = False
+        self.moved_to: Optional[Bucket] = None
+
+        self.__waiters: Deque[Future] = deque()
+        self.__timer: Optional[TimerHandle] = None
+        self.__probing = False
+
+    @property
+    def queued(self) -> int:
+        """The amount of requests which are waiting on the bucket."""
+        return len(self.__waiters)
+
+    @property
+    def idle(self) -> bool:
+        """Whether the bucket has reset and nothing is waiting on it."""
+        return (
+            not self.__waiters
+            and not self.__probing
+            and self.reset_at <= monotonic()
+        )
+
+    def delay(self) -> float:
+        """
+        The amount of seconds until a request may be sent, resets the
+        remaining requests once the reset time has passed.
+        """
+        if self.remaining is None or self.remaining > 0:
+            return 0
+
+        now = monotonic()
+
+        if now >= self.reset_at:
+            # Until a response tells the exact reset time, assume the
+            # new window is as long as the previous one.
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+            return 0
+
+        return self.reset_at - now
+
+    def __take(self) -> bool:
+        """
+        Claim one of the remaining requests, if there is one.
+
+        :meta public:
+        """
+        if self.unlimited:
+            return True
+
+        if self.delay():
+            return False
+
+        if self.remaining is None:
+            if self.__probing:
+                return False
+
+            self.__probing = True
+            return True
+
+        self.remaining -= 1
+        return True
+
+    def __release_waiters(self):
+        """
+        Let through as many waiting requests as the bucket allows.
+
+        :meta public:
+        """
+        self.__timer = None
+
+        while self.__waiters:
+            if self.__waiters[0].done():
+                self.__waiters.popleft()
+                continue
+
+            if not self.__take():
+                break
+
+            self.__waiters.popleft().set_result(None)
+
+        self.__schedule()
+
+    def __schedule(self):
+        """
+        Schedule the release of the waiting requests for when the bucket
+        resets.
+
+        :meta public:
+        """
+        if self.__timer:
+            self.__timer.cancel()
+            self.__timer = None
+
+        if not self.__waiters or (self.remaining is None and self.__probing):
+            return
+
+        delay = self.delay()
+
+        if delay:
+            _log.debug(
+                "Bucket %s is exhausted, releasing %s requests in %.3fs"
+                % (self.key, len(self.__waiters), delay)
+            )
+
+        self.__timer = get_event_loop().call_later(
+            delay, self.__release_waiters
+        )
+
+    async def acquire(self) -> Bucket:
+        """
+        Wait until a request may be sent to this bucket and claim one of
+        its remaining requests.
+
+        :return:
+            The bucket which was acquired, this is the bucket it was
+            moved to if it turned out to be the same as another one.
+        """
+        if self.moved_to:
+            return await self.moved_to.acquire()
+
+        if not self.__waiters and self.__take():
+            return self
+
+        waiter = get_event_loop().create_future()
+        self.__waiters.append(waiter)
+        self.__schedule()
+
+        try:
+            moved_to = await waiter
+        except CancelledError:
+            if (
+                waiter.done()
+                and not waiter.cancelled()
+                and waiter.result() is None
+            ):
+                self.__give_back()
+
+            raise
+
+        return await moved_to.acquire() if moved_to else self
+
+    def move(self, bucket: Bucket):
+        """
+        Hand the waiting requests over to another bucket, once a
+        response tells this bucket is the same as that one.
+
+        :param bucket:
+            The bucket which the requests now wait on.
+        """
+        self.moved_to = bucket
+
+        if self.__timer:
+            self.__timer.cancel()
+            self.__timer = None
+
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(bucket)
+
+    def __give_back(self):
+        """
+        Return a claimed request which did not get sent.
+
+        :meta public:
+        """
+        if self.__probing:
+            self.release()
+        elif self.remaining is not None:
+            self.remaining += 1
+            self.__schedule()
+
+    def release(self):
+        """Let the next request through, once the response is handled."""
+        if self.__probing:
+            self.__probing = False
+            self.__schedule()
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Update the bucket from the ``X-RateLimit-*`` response headers.
+
+        :param headers:
+            The headers of a response from this bucket.
+        """
+        if "X-RateLimit-Limit" not in headers:
+            if self.remaining is None:
+                self.unlimited = True
+
+            return
+
+        limit = int(headers["X-RateLimit-Limit"])
+        remaining = int(headers["X-RateLimit-Remaining"])
+        reset_after = float(headers["X-RateLimit-Reset-After"])
+        reset_at = monotonic() + reset_after
+        self.window = max(self.window, reset_after)
+
+        # Responses of a new window reset the count, older responses of
+        # the same window can arrive out of order so they only lower it.
+        if self.remaining is None or reset_at > self.reset_at + .5:
+            self.remaining = remaining
+        else:
+            self.remaining = min(self.remaining, remaining)
+
+        self.limit = limit
+        self.reset_at = reset_at
+        self.unlimited = False
+        self.__schedule()
+
+    def exhaust(self, retry_after: float):
+        """
+        Block the bucket after it got rate limited.
+
+        :param retry_after:
+            The amount of seconds until the bucket resets.
+        """
+        self.remaining = 0
+        self.reset_at = max(self.reset_at, monotonic() + retry_after)
+        self.unlimited = False
+        self.__schedule()
+
+
+class GlobalLimiter:
+    """
+    Paces all requests below the global rate limit, and pauses all of
+    them at once when the global limit does get hit.
+
+    Waiting requests are released round robin over their buckets, so a
+    busy bucket can not starve the others.
+    """
+
+    def __init__(self, rate: int = 50, per: float = 1):
+        """
+        :param rate:
+            The maximum amount of requests per period.
+
+        :param per:
+            The length of the period in seconds.
+        """
+        self.per = per
+        self.paused_until: float = 0
+
+        self.__sent: Deque[float] = deque(maxlen=rate)
+        self.__queues: OrderedDict[Hashable, Deque[Future]] = OrderedDict()
+        self.__timer: Optional[TimerHandle] = None
+
+    def delay(self) -> float:
+        """The amount of seconds until the next request may be sent."""
+        now = monotonic()
+        delay = self.paused_until - now
+
+        if len(self.__sent) == self.__sent.maxlen:
+            delay = max(delay, self.__sent[0] + self.per - now)
+
+        return max(delay, 0)
+
+    def __release_waiters(self):
+        """
+        Let through as many waiting requests as the limit allows, taking
+        one from every bucket in turn.
+
+        :meta public:
+        """
+        self.__timer = None
+
+        while self.__queues and not self.delay():
+            key, waiters = next(iter(self.__queues.items()))
+            waiter = waiters.popleft()
+
+            if waiters:
+                self.__queues.move_to_end(key)
+            else:
+                del self.__queues[key]
+
+            if not waiter.done():
+                self.__sent.append(monotonic())
+                waiter.set_result(None)
+
+        self.__schedule()
+
+    def __schedule(self):
+        """
+        Schedule the release of the waiting requests.
+
+        :meta public:
+        """
+        if self.__timer:
+            self.__timer.cancel()
+            self.__timer = None
+
+        if self.__queues:
+            self.__timer = get_event_loop().call_later(
+                self.delay(), self.__release_waiters
+            )
+
+    async def acquire(self, key: Hashable = None):
+        """
+        Wait until a request may be sent without passing the limit.
+
+        :param key:
+            The bucket of the request, requests are released fairly
+            over their buckets.
+        """
+        if not self.__queues and not self.delay():
+            self.__sent.append(monotonic())
+            return
+
+        waiter = get_event_loop().create_future()
+        self.__queues.setdefault(key, deque()).append(waiter)
+
+        if not self.__timer:
+            self.__schedule()
+
+        await waiter
+
+    def pause(self, retry_after: float):
+        """
+        Hold back all requests after the global limit got hit.
+
+        :param retry_after:
+            The amount of seconds until requests may be sent again.
+        """
+        self.paused_until = max(self.paused_until, monotonic() + retry_after)
+        self.__schedule()
+
+
+class RateLimiter:
+    """
+    Keeps track of the Discord rate limit buckets.
+
+    Routes get mapped to their bucket hash once it is known from the
+    ``X-RateLimit-Bucket`` header. Every bucket has its own state, so
+    requests to different buckets never wait on each other.
+    """
+
+    #: The amount of buckets after which idle buckets are dropped.
+    max_buckets: int = 1024
+
+    def __init__(
+            self,
+            global_rate: int = 50,
+            store: Optional[SharedRateLimitStore] = None
+    ):
+        """
+        :param global_rate:
+            The maximum amount of requests per second over all routes.
+
+        :param store:
+            Rate limit state which is shared with other processes.
+        """
+        self.global_limit = GlobalLimiter(global_rate)
+        self.global_rate = global_rate
+        self.store = store
+
+        self.__hashes: Dict[Tuple[str, str], str] = {}
+        self.__buckets: Dict[BucketKey, Bucket] = {}
+
+    def __prune(self):
+        """
+        Drop buckets which have reset and are not in use.
+
+        :meta public:
+        """
+        for key, bucket in tuple(self.__buckets.items()):
+            if bucket.idle:
+                del self.__buckets[key]
+
+    def bucket(self, method: str, endpoint: str) -> Bucket:
+        """
+        Get the bucket of a request.
+
+        :param method:
+            The HTTP method of the request.
+
+        :param endpoint:
+            The endpoint to which the request is sent.
+        """
+        route = (method, route_template(endpoint))
+        key = (
+            self.__hashes.get(route, " ".join(route)),
+            major_parameter(endpoint)
+        )
+
+        bucket = self.__buckets.get(key)
+
+        if bucket is None:
+            if len(self.__buckets) >= self.max_buckets:
+                self.__prune()
+
+            bucket = self.__buckets[key] = Bucket(key)
+
+        return bucket
+
+    async def acquire(self, bucket: Bucket, endpoint: str) -> Bucket:
+        """
+        Wait in the queue of the bucket, then for the global rate limit
+        and the state shared with other processes.
+
+        Interaction responses are not bound to the global rate limit.
+
+        :param bucket:
+            The bucket of the request.
+
+        :param endpoint:
+            The endpoint to which the request is sent.
+
+        :return:
+            The bucket which was acquired and has to be released.
+        """
+        bucket = await bucket.acquire()
+
+        try:
+            if not endpoint.startswith("interactions/"):
+                await self.global_limit.acquire(bucket.key)
+
+                while self.store and (
+                    delay := self.store.acquire_global(self.global_rate)
+                ):
+                    await sleep(delay)
+
+            while self.store and (delay := self.store.acquire(bucket.key)):
+                await sleep(delay)
+
+        except BaseException:
+            bucket.release()
+            raise
+
+        return bucket
+
+    def ratelimited(
+            self,
+            bucket: Bucket,
+            retry_after: float,
+            is_global: bool = False
+    ):
+        """
+        Block the bucket, or all requests for a global rate limit, after
+        a request got rate limited.
+
+        :param bucket:
+            The bucket of the request.
+
+        :param retry_after:
+            The amount of seconds until the request may be retried.
+
+        :param is_global:
+            Whether the global rate limit was hit.
+        """
+        if is_global:
+            self.global_limit.pause(retry_after)
+        else:
+            bucket.exhaust(retry_after)
+
+        if self.store and is_global:
+            self.store.pause_global(retry_after)
+        elif self.store:
+            self.store.exhaust(bucket.key, retry_after)
+
+    def update(
+            self,
+            bucket: Bucket,
+            method: str,
+            endpoint: str,
+            headers: Mapping[str, str]
+    ) -> Bucket:
+        """
+        Update the rate limit state from the headers of a response.
+
+        :param bucket:
+            The bucket which was acquired for the request.
+
+        :param method:
+            The HTTP method of the request.
+
+        :param endpoint:
+            The endpoint to which the request was sent.
+
+        :param headers:
+            The headers of the response.
+
+        :return:
+            The bucket of the route, which differs from the given bucket
+            if its hash was just learned.
+        """
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        route = (method, route_template(endpoint))
+
+        if bucket_hash and self.__hashes.get(route) != bucket_hash:
+            _log.debug("Route %s %s uses bucket %s" % (*route, bucket_hash))
+            self.__hashes[route] = bucket_hash
+
+            key = (bucket_hash, bucket.key[1])
+
+            if key not in self.__buckets:
+                bucket.key = key
+                self.__buckets[key] = bucket
+            elif self.__buckets[key] is not bucket:
+                # Requests which queued while the hash was unknown would
+                # otherwise bypass the limit of the known bucket.
+                if self.__buckets.get(bucket.key) is bucket:
+                    del self.__buckets[bucket.key]
+
+                bucket.move(self.__buckets[key])
+
+            bucket = self.__buckets[key]
+
+        bucket.update(headers)
+
+        if self.store and "X-RateLimit-Limit" in headers:
+            self.store.update(
+                bucket.key,
+                int(headers["X-RateLimit-Limit"]),
+                int(headers["X-RateLimit-Remaining"]),
+                float(headers["X-RateLimit-Reset-After"])
+            )
+
+        return bucket
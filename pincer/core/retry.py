@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+from random import uniform
+from typing import Iterable, Optional
+
+from aiohttp import ClientConnectorError
+
+#: Methods which can be sent again without changing the result.
+IDEMPOTENT_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PUT")
+
+
+class RetryPolicy:
+    """
+    Decides which failed REST requests get retried and how long to wait
+    before doing so.
+
+    The delay grows exponentially with full jitter, so requests which
+    failed together don't retry together. A ``Retry-After`` header is
+    honored. Requests with a non idempotent method (POST and PATCH) are
+    only retried if they could not have reached Discord.
+
+    Subclass it and override :meth:`should_retry` or :meth:`backoff` for
+    a custom policy.
+    """
+
+    def __init__(
+            self,
+            attempts: int = 5,
+            *,
+            base: float = .5,
+            cap: float = 30,
+            timeout: Optional[float] = 15,
+            statuses: Iterable[int] = (500, 502, 503, 504),
+            methods: Iterable[str] = IDEMPOTENT_METHODS
+    ):
+        """
+        :param attempts:
+            The maximum amount of attempts of a request.
+
+        Keyword Arguments:
+
+        :param base:
+            The maximum delay before the first retry in seconds, it
+            doubles for every next retry.
+
+        :param cap:
+            The maximum delay between two attempts in seconds.
+
+        :param timeout:
+            The amount of seconds after which an attempt is cancelled.
+            This does not include the time spent waiting for the rate
+            limits. For requests with files it limits connecting and
+            each read of the response instead, so large uploads are not
+            cancelled.
+
+        :param statuses:
+            The status codes which get retried.
+
+        :param methods:
+            The methods which are retried after a server error or
+            timeout.
+        """
+        self.attempts: int = attempts
+        self.base: float = base
+        self.cap: float = cap
+        self.timeout: Optional[float] = timeout
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(methods)
+
+    def should_retry(
+            self,
+            method: str,
+            attempt: int,
+            status: Optional[int] = None,
+            exception: Optional[BaseException] = None
+    ) -> bool:
+        """
+        Whether a failed attempt should be retried.
+
+        :param method:
+            The HTTP method of the request.
+
+        :param attempt:
+            The amount of attempts which have been made.
+
+        :param status:
+            The status code of the response, if there was one.
+
+        :param exception:
+            The connection error or timeout, if there was no response.
+        """
+        if attempt >= self.attempts:
+            return False
+
+        # The connection was never made, so the request wasn't sent.
+        if isinstance(exception, ClientConnectorError):
+            return True
+
+        if method not in self.methods:
+            return False
+
+        return exception is not None or status in self.statuses
+
+    def backoff(
+            self,
+            attempt: int,
+            retry_after: Optional[float] = None
+    ) -> float:
+        """
+        The amount of seconds to wait before the next attempt.
+
+        :param attempt:
+            The amount of attempts which have been made.
+
+        :param retry_after:
+            The ``Retry-After`` header of the response, if it had one.
+        """
+        if retry_after is not None:
+            return retry_after
+
+        return uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import re
+from json import JSONDecoder
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from pincer.core.dispatch import GatewayDispatch
+
+_decoder = JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+_event_name = re.compile(r'"t"\s*:\s*"([A-Z_]+)"')
+_string = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+# Everything up to the next bracket or brace, skipping over strings.
+_bracket = re.compile(
+    r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*([\[\]{}])'
+)
+
+# Discord usually sends the event name first, so it is looked for in
+# the start of the payload before the whole payload gets walked.
+_EVENT_NAME_WINDOW = 256
+
+
+def _skip_ws(doc: str, idx: int) -> int:
+    return _whitespace.match(doc, idx).end()
+
+
+def _expect(doc: str, idx: int, char: str) -> int:
+    """
+    Check that the next non whitespace character is ``char``.
+
+    :return:
+        The index right after that character.
+    """
+    idx = _skip_ws(doc, idx)
+
+    if doc[idx:idx + 1] != char:
+        raise ValueError(f"Expected `{char}` at position {idx}.")
+
+    return idx + 1
+
+
+def _scan(doc: str, idx: int) -> Tuple[int, int]:
+    """
+    Find the end of the array or object which starts at ``idx``,
+    without decoding it. Strings are skipped, so only the brackets and
+    braces are looked at one by one.
+
+    :param doc:
+        The JSON document.
+
+    :param idx:
+        The index of the opening bracket or brace.
+
+    :return:
+        The amount of elements or members, and the index after the
+        closing bracket or brace.
+    """
+    depth = commas = 0
+
+    for match in _bracket.finditer(doc, idx):
+        if depth == 1:
+            # Elements are separated by the commas between the nested
+            # values, strings in between can contain commas too.
+            between = doc[match.start():match.start(1)]
+
+            if '"' in between:
+                between = _string.sub("", between)
+
+            commas += between.count(",")
+
+        if match.group(1) in "[{":
+            depth += 1
+            continue
+
+        depth -= 1
+
+        if not depth:
+            end = match.end()
+            empty = _skip_ws(doc, idx + 1) == end - 1
+            return (0 if empty else commas + 1), end
+
+    raise ValueError(f"Unterminated array or object at position {idx}.")
+
+
+def _skip_value(doc: str, idx: int) -> int:
+    """
+    Find the end of the value which starts at ``idx``. Arrays and
+    objects are skipped without decoding them.
+
+    :return:
+        The index after the value.
+    """
+    idx = _skip_ws(doc, idx)
+
+    if doc[idx:idx + 1] in ("[", "{"):
+        return _scan(doc, idx)[1]
+
+    return _decoder.raw_decode(doc, idx)[1]
+
+
+def _iter_array(doc: str, idx: int) -> Iterator[Tuple[Any, int]]:
+    """
+    Iterate over the elements of the array which starts at ``idx``.
+    Only one element is decoded at a time.
+
+    :param doc:
+        The JSON document.
+
+    :param idx:
+        The index of the opening bracket of the array.
+
+    :return:
+        Tuples with the element and the index after the array its last
+        character when that element is the last one.
+    """
+    idx = _skip_ws(doc, _expect(doc, idx, "["))
+
+    if doc[idx:idx + 1] == "]":
+        return
+
+    while True:
+        element, idx = _decoder.raw_decode(doc, _skip_ws(doc, idx))
+        idx = _skip_ws(doc, idx)
+
+        if doc[idx:idx + 1] == "]":
+            yield element, idx + 1
+            return
+
+        idx = _expect(doc, idx, ",")
+        yield element, idx
+
+
+class StreamedArray:
+    """
+    A JSON array of a payload which has not been decoded yet.
+    Iterating over it decodes the elements one at a time, so the
+    decoded array never exists as a whole.
+
+    It can be iterated over multiple times, every iteration decodes the
+    elements again.
+    """
+
+    def __init__(self, doc: str, start: int, length: int):
+        """
+        :param doc:
+            The JSON document which contains the array.
+
+        :param start:
+            The index of the array its opening bracket in the document.
+
+        :param length:
+            The amount of elements in the array.
+        """
+        self.__doc = doc
+        self.__start = start
+        self.__length = length
+
+    def __iter__(self) -> Iterator[Any]:
+        for element, _ in _iter_array(self.__doc, self.__start):
+            yield element
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __repr__(self) -> str:
+        return f"<StreamedArray length={self.__length}>"
+
+    @classmethod
+    def scan(cls, doc: str, idx: int) -> Tuple[StreamedArray, int]:
+        """
+        Find the bounds and length of the array which starts at ``idx``,
+        without decoding its elements.
+
+        :param doc:
+            The JSON document.
+
+        :param idx:
+            The index of the array its opening bracket.
+
+        :return:
+            The streamed array and the index after the array.
+        """
+        start = _skip_ws(doc, idx)
+        _expect(doc, start, "[")
+        length, end = _scan(doc, start)
+        return cls(doc, start, length), end
+
+
+def _decode_object(
+        doc: str,
+        idx: int,
+        streamed: Set[str] = frozenset(),
+        on_key=None
+) -> Tuple[Dict[str, Any], int]:
+    """
+    Decode the object which starts at ``idx``, the arrays of the keys in
+    ``streamed`` become :class:`~.StreamedArray` objects.
+
+    :param doc:
+        The JSON document.
+
+    :param idx:
+        The index of the object its opening brace.
+
+    :param streamed:
+        The keys of which the arrays must be streamed.
+
+    :param on_key:
+        Optional callable which decodes the value of a key itself.
+        It receives the key and index and returns the value and the
+        index after it, or ``None`` to use the default decoding.
+
+    :return:
+        The object and the index after its closing brace.
+    """
+    result: Dict[str, Any] = {}
+    idx = _skip_ws(doc, _expect(doc, idx, "{"))
+
+    if doc[idx:idx + 1] == "}":
+        return result, idx + 1
+
+    while True:
+        key, idx = _decoder.raw_decode(doc, _skip_ws(doc, idx))
+        idx = _skip_ws(doc, _expect(doc, idx, ":"))
+
+        custom = on_key(key, idx) if on_key else None
+
+        if custom:
+            result[key], idx = custom
+        elif key in streamed and doc[idx:idx + 1] == "[":
+            result[key], idx = StreamedArray.scan(doc, idx)
+        else:
+            result[key], idx = _decoder.raw_decode(doc, idx)
+
+        idx = _skip_ws(doc, idx)
+
+        if doc[idx:idx + 1] == "}":
+            return result, idx + 1
+
+        idx = _expect(doc, idx, ",")
+
+
+def _event(payload: str) -> Optional[str]:
+    """
+    Get the event name of a gateway payload without decoding it.
+
+    :param payload:
+        The JSON payload which was received from the gateway.
+
+    :return:
+        The event name, or ``None`` if the payload has none.
+    """
+    match = _event_name.search(payload, 0, _EVENT_NAME_WINDOW)
+
+    # A match after a second brace could be a key of the event data.
+    if match and payload.count("{", 0, match.start()) == 1:
+        return match.group(1)
+
+    idx = _skip_ws(payload, _expect(payload, 0, "{"))
+
+    while payload[idx:idx + 1] == '"':
+        key, idx = _decoder.raw_decode(payload, idx)
+        idx = _skip_ws(payload, _expect(payload, idx, ":"))
+
+        if key == "t":
+            value = _decoder.raw_decode(payload, idx)[0]
+            return value if isinstance(value, str) else None
+
+        idx = _skip_ws(payload, _skip_value(payload, idx))
+
+        if payload[idx:idx + 1] != ",":
+            break
+
+        idx = _skip_ws(payload, idx + 1)
+
+    return None
+
+
+def stream_decode(
+        payload: str,
+        events: Dict[str, Iterable[str]]
+) -> Optional[GatewayDispatch]:
+    """
+    Decode a gateway payload, streaming the arrays which are configured
+    for its event.
+
+    :param payload:
+        The JSON payload which was received from the gateway.
+
+    :param events:
+        The upper case event names, with the keys of the event data
+        which contain arrays which must be streamed.
+        Eg ``{"GUILD_CREATE": ("members", "presences")}``.
+
+    :return:
+        The payload, or ``None`` if its event is not configured
+        for streaming.
+    """
+    keys = events.get(_event(payload))
+
+    if not keys:
+        return None
+
+    keys = set(keys)
+
+    def decode_data(key: str, idx: int):
+        if key == "d" and payload[idx:idx + 1] == "{":
+            return _decode_object(payload, idx, keys)
+
+    data, _ = _decode_object(payload, 0, on_key=decode_data)
+    return GatewayDispatch(
+        data.get("op"), data.get("d"), data.get("s"), data.get("t")
+    )
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from inspect import isawaitable
+from time import perf_counter
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, TYPE_CHECKING
+)
+from uuid import uuid4
+
+if TYPE_CHECKING:
+    from pincer.core.dispatch import GatewayDispatch
+
+TraceCallback = Callable[["TraceContext", Any], Any]
+
+
+@dataclass
+class TraceContext:
+    """
+    Context which follows a single gateway event or REST request through
+    every stage of the library.
+
+    :param trace_id:
+        Unique identifier of the trace.
+
+    :param event_name:
+        The name of the gateway event which started the trace,
+        ``None`` for REST requests which were not made from an event.
+
+    :param start:
+        The :func:`time.perf_counter` value at which the trace started.
+
+    :param attributes:
+        Free to use storage, which lets callbacks share state between
+        the different stages of a trace.
+    """
+    trace_id: str = field(default_factory=lambda: uuid4().hex)
+    event_name: Optional[str] = None
+    start: float = field(default_factory=perf_counter)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+_current: ContextVar[Optional[TraceContext]] = ContextVar(
+    "pincer_trace", default=None
+)
+
+
+def current_trace() -> Optional[TraceContext]:
+    """
+    :return:
+        The trace context of the event or request which is currently
+        being handled, if any.
+    """
+    return _current.get()
+
+
+def start_trace(event_name: Optional[str] = None) -> TraceContext:
+    """
+    Start a new trace in the current context. Tasks which get created
+    afterwards inherit the trace.
+
+    :param event_name:
+        The name of the event which started the trace.
+    """
+    ctx = TraceContext(event_name=event_name)
+    _current.set(ctx)
+    return ctx
+
+
+def use_trace(ctx: Optional[TraceContext]):
+    """
+    Make a trace the current one, tasks which get created afterwards
+    inherit it. This is used to carry a trace over to another task.
+
+    :param ctx:
+        The trace to use.
+    """
+    _current.set(ctx)
+
+
+@contextmanager
+def ensure_trace() -> Iterator[TraceContext]:
+    """
+    Use the current trace, or start a new one which only lasts for
+    the duration of the with block.
+    """
+    ctx = _current.get()
+
+    if ctx:
+        yield ctx
+        return
+
+    token = _current.set(TraceContext())
+
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+@dataclass
+class FrameReceivedParams:
+    """
+    :param size:
+        The length of the raw websocket frame.
+    """
+    size: int
+
+
+@dataclass
+class DecodedParams:
+    """
+    :param payload:
+        The decoded payload.
+
+    :param duration:
+        The time it took to decode the frame in seconds.
+    """
+    payload: GatewayDispatch
+    duration: float
+
+
+@dataclass
+class MiddlewareStartParams:
+    """
+    :param key:
+        The key of the middleware in the events.
+
+    :param payload:
+        The payload which is passed to the middleware.
+
+    :param middleware:
+        The coroutine function which will be called.
+    """
+    key: str
+    payload: GatewayDispatch
+    middleware: Callable
+
+
+@dataclass
+class MiddlewareEndParams:
+    """
+    :param key:
+        The key of the middleware in the events.
+
+    :param next_call:
+        The key of the next middleware or event, ``None`` if the
+        middleware raised an exception.
+
+    :param exception:
+        The exception raised by the middleware, if any.
+    """
+    key: str
+    next_call: Optional[str]
+    exception: Optional[BaseException] = None
+
+
+@dataclass
+class HandlerStartParams:
+    """
+    :param name:
+        The name of the event, eg ``on_ready``.
+
+    :param handler:
+        The coroutine function which will be called.
+    """
+    name: str
+    handler: Callable
+
+
+@dataclass
+class HandlerEndParams:
+    """
+    :param name:
+        The name of the event, eg ``on_ready``.
+
+    :param handler:
+        The coroutine function which has been called.
+
+    :param exception:
+        The exception raised by the handler, if any.
+    """
+    name: str
+    handler: Callable
+    exception: Optional[BaseException] = None
+
+
+@dataclass
+class RequestStartParams:
+    """
+    :param method:
+        The HTTP method of the request.
+
+    :param route:
+        The endpoint to which the request is sent.
+
+    :param data:
+        The JSON body of the request.
+
+    :param attempt_id:
+        Identifies the attempt, every attempt of a request gets its own
+        start which shares this id with the matching end.
+    """
+    method: str
+    route: str
+    data: Optional[Dict]
+    attempt_id: int = 0
+
+
+@dataclass
+class RequestEndParams:
+    """
+    :param method:
+        The HTTP method of the request.
+
+    :param route:
+        The endpoint to which the request was sent.
+
+    :param status:
+        The status code of the response, ``None`` if the attempt failed
+        before a response was received.
+
+    :param attempt_id:
+        The id of the attempt, as passed to the start of it.
+    """
+    method: str
+    route: str
+    status: Optional[int]
+    attempt_id: int = 0
+
+
+@dataclass
+class RequestRetryParams:
+    """
+    :param method:
+        The HTTP method of the request.
+
+    :param route:
+        The endpoint to which the request was sent.
+
+    :param status:
+        The status code which caused the retry.
+
+    :param delay:
+        The amount of seconds before the request gets retried.
+    """
+    method: str
+    route: str
+    status: int
+    delay: float
+
+
+@dataclass
+class RequestRatelimitedParams:
+    """
+    :param method:
+        The HTTP method of the request.
+
+    :param route:
+        The endpoint to which the request was sent.
+
+    :param retry_after:
+        The amount of seconds Discord asked to wait, if known.
+    """
+    method: str
+    route: str
+    retry_after: Optional[float]
+
+
+@dataclass
+class RequestCoalescedParams:
+    """
+    :param method:
+        The HTTP method of the request.
+
+    :param route:
+        The endpoint to which the request is sent.
+    """
+    method: str
+    route: str
+
+
+class TraceSignal(List[TraceCallback]):
+    """
+    A list of callbacks which get called with the current
+    :class:`~.TraceContext` and the params of the stage.
+    Callbacks can be either regular functions or coroutine functions.
+    """
+
+    async def send(self, ctx: TraceContext, params: Any):
+        """
+        Call all registered callbacks.
+
+        :param ctx:
+            The context of the current trace.
+
+        :param params:
+            The params for the stage.
+        """
+        for callback in self:
+            result = callback(ctx, params)
+
+            if isawaitable(result):
+                await result
+
+
+class TraceConfig:
+    """
+    Collection of hooks for the stages of gateway events and REST
+    requests, similar to aiohttp its ``TraceConfig``.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> trace_config = TraceConfig()
+        >>>
+        >>> async def on_handler_end(ctx, params):
+        ...     print(ctx.trace_id, params.name, perf_counter() - ctx.start)
+        >>>
+        >>> trace_config.on_handler_end.append(on_handler_end)
+        >>> client = Client("token", trace_configs=[trace_config])
+    """
+
+    def __init__(self):
+        self.on_frame_received = TraceSignal()
+        self.on_decoded = TraceSignal()
+        self.on_middleware_start = TraceSignal()
+        self.on_middleware_end = TraceSignal()
+        self.on_handler_start = TraceSignal()
+        self.on_handler_end = TraceSignal()
+        self.on_request_start = TraceSignal()
+        self.on_request_end = TraceSignal()
+        self.on_request_retry = TraceSignal()
+        self.on_request_ratelimited = TraceSignal()
+        self.on_request_coalesced = TraceSignal()
+
+
+async def send_trace(
+        configs: Iterable[TraceConfig],
+        signal: str,
+        params: Any
+):
+    """
+    Send a stage to the signal of every trace config. A new trace gets
+    started if the current context does not have one yet.
+
+    :param configs:
+        The trace configs to send the stage to.
+
+    :param signal:
+        The name of the signal, eg ``on_handler_start``.
+
+    :param params:
+        The params for the stage.
+    """
+    if not configs:
+        return
+
+    ctx = _current.get() or start_trace()
+
+    for config in configs:
+        await getattr(config, signal).send(ctx, params)
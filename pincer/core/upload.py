@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import mmap
+from asyncio import get_event_loop
+from json import dumps
+from os import PathLike, fspath
+from os.path import basename
+from typing import (
+    Any, AsyncIterable, AsyncIterator, BinaryIO, Callable, Dict, Optional,
+    Sequence, Union
+)
+
+from aiohttp import MultipartWriter
+from aiohttp.payload import AsyncIterablePayload
+
+from pincer import __package__
+
+_log = logging.getLogger(__package__)
+
+FileSource = Union[
+    str, PathLike, BinaryIO, bytes, bytearray, memoryview, mmap.mmap,
+    AsyncIterable[bytes], Callable[[], AsyncIterable[bytes]]
+]
+
+#: The amount of bytes which are read from a file at once.
+CHUNK_SIZE = 64 * 1024
+
+
+class File:
+    """
+    A file which gets uploaded as message attachment.
+
+    The file is streamed in chunks while the request is being sent, so
+    it is never loaded into memory as a whole.
+
+    :Usage example:
+
+    .. code-block:: pycon
+
+        >>> await client.post(
+        ...     f"channels/{channel_id}/messages",
+        ...     {"content": "Today's logs"},
+        ...     files=[File("bot.log"), File(image_bytes, "chart.png")]
+        ... )
+    """
+
+    def __init__(
+            self,
+            source: FileSource,
+            filename: Optional[str] = None,
+            *,
+            description: Optional[str] = None,
+            content_type: str = "application/octet-stream",
+            spoiler: bool = False
+    ):
+        """
+        :param source:
+            The content of the file. This can be a path, a binary file
+            object, a bytes-like object such as an :class:`mmap.mmap`, or
+            an async iterable of bytes. Async iterables can only be sent
+            once, pass a function which returns a new one to let failed
+            requests be retried.
+
+        :param filename:
+            The name of the file, defaults to the name of the path or
+            file object.
+
+        Keyword Arguments:
+
+        :param description:
+            The description (alt text) of the attachment.
+
+        :param content_type:
+            The MIME type of the file.
+
+        :param spoiler:
+            Whether the attachment gets hidden behind a spoiler.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            source = memoryview(source)
+
+        if filename is None:
+            if isinstance(source, (str, PathLike)):
+                filename = basename(fspath(source))
+            elif isinstance(getattr(source, "name", None), str):
+                filename = basename(source.name)
+            else:
+                raise ValueError("A filename is required for this source.")
+
+        self.source = source
+        self.filename = f"SPOILER_{filename}" if spoiler else filename
+        self.description = description
+        self.content_type = content_type
+
+        self.__start: Optional[int] = None
+        self.__consumed = False
+
+        if getattr(source, "seekable", lambda: False)():
+            self.__start = source.tell()
+
+    @property
+    def rewindable(self) -> bool:
+        """Whether the file can be sent (again)."""
+        if not self.__consumed:
+            return True
+
+        if hasattr(self.source, "__aiter__"):
+            return False
+
+        return not hasattr(self.source, "read") or self.__start is not None
+
+    def rewind(self):
+        """
+        Prepare the file for being sent (again).
+
+        :raises ValueError:
+            The source has already been read and can't be read again.
+        """
+        if not self.rewindable:
+            raise ValueError(
+                f"The content of {self.filename} has already been sent and "
+                "can not be read again."
+            )
+
+        if self.__start is not None:
+            self.source.seek(self.__start)
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Read the content of the file chunk by chunk."""
+        self.__consumed = True
+        source = self.source
+
+        if isinstance(source, memoryview):
+            for start in range(0, len(source), CHUNK_SIZE):
+                yield source[start:start + CHUNK_SIZE]
+
+        elif isinstance(source, (str, PathLike)):
+            loop = get_event_loop()
+            file = await loop.run_in_executor(None, open, source, "rb")
+
+            try:
+                while chunk := await loop.run_in_executor(
+                        None, file.read, CHUNK_SIZE
+                ):
+                    yield chunk
+            finally:
+                file.close()
+
+        elif hasattr(source, "read"):
+            loop = get_event_loop()
+
+            while chunk := await loop.run_in_executor(
+                    None, source.read, CHUNK_SIZE
+            ):
+                yield chunk
+
+        else:
+            iterable = source if hasattr(source, "__aiter__") else source()
+
+            async for chunk in iterable:
+                yield chunk
+
+
+def multipart_form(
+        data: Optional[Dict[str, Any]],
+        files: Sequence[File]
+) -> MultipartWriter:
+    """
+    Create the multipart body of a request with attachments. A new body
+    must be created for every attempt of the request.
+
+    :param data:
+        The JSON part of the request, the attachment metadata gets added
+        to it if it is not present.
+
+    :param files:
+        The files which get attached.
+    """
+    data = dict(data or {})
+    attachments = []
+
+    for index, file in enumerate(files):
+        attachment = {"id": index, "filename": file.filename}
+
+        if file.description:
+            attachment["description"] = file.description
+
+        attachments.append(attachment)
+
+    data.setdefault("attachments", attachments)
+
+    form = MultipartWriter("form-data")
+    part = form.append(dumps(data), {"Content-Type": "application/json"})
+    part.set_content_disposition("form-data", name="payload_json")
+
+    for index, file in enumerate(files):
+        file.rewind()
+
+        part = form.append_payload(
+            AsyncIterablePayload(
+                file.chunks(), content_type=file.content_type
+            )
+        )
+        part.set_content_disposition(
+            "form-data", name=f"files[{index}]", filename=file.filename
+        )
+
+    return form
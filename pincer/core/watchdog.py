@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+import sys
+from asyncio import AbstractEventLoop, CancelledError, Task, sleep
+from dataclasses import dataclass
+from inspect import unwrap
+from threading import Event, Lock, Thread, get_ident
+from time import perf_counter
+from traceback import format_stack
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+from pincer import __package__
+from pincer.core.metrics import metrics
+from pincer.core.tracing import (
+    TraceConfig, TraceContext, HandlerEndParams, HandlerStartParams,
+    MiddlewareEndParams, MiddlewareStartParams
+)
+
+_log = logging.getLogger(__package__)
+
+_lag = metrics.histogram(
+    "pincer_loop_lag_seconds",
+    "Delay between when the event loop should and did wake up.",
+    buckets=(.001, .005, .01, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+_stalls = metrics.counter(
+    "pincer_loop_stalls_total",
+    "Amount of times the event loop was blocked longer than the threshold.",
+    ("stage", "event")
+)
+
+
+@dataclass
+class _Stage:
+    kind: str
+    name: str
+    event_name: Optional[str]
+    code: Optional[CodeType]
+
+
+@dataclass
+class Stall:
+    """
+    Information about an event loop stall.
+
+    :param duration:
+        For how long the loop had been blocked when it was sampled.
+
+    :param stage:
+        The handler or middleware which was running,
+        ``None`` if the stall happened outside of them.
+
+    :param event_name:
+        The event which was being handled, if known.
+
+    :param stack:
+        The stack of the event loop its thread while it was blocked.
+    """
+    duration: float
+    stage: Optional[str]
+    event_name: Optional[str]
+    stack: List[str]
+
+
+class LoopWatchdog(TraceConfig):
+    """
+    Measures the lag of the event loop and reports every time it gets
+    blocked for longer than a threshold.
+
+    A coroutine on the loop wakes up every ``interval`` seconds, a
+    separate thread checks whether it did. When it did not for longer
+    than the threshold, the thread samples the stack of the loop and
+    attributes the stall to the handler or middleware which was
+    running. As a trace config it keeps track of those stages itself.
+    """
+
+    def __init__(self, threshold: float = .25, *, interval: float = .05):
+        """
+        :param threshold:
+            The amount of seconds the loop may be blocked before it is
+            reported.
+
+        Keyword Arguments:
+
+        :param interval:
+            How often the lag is measured in seconds.
+        """
+        super().__init__()
+        self.threshold: float = threshold
+        self.interval: float = interval
+        self.last_stall: Optional[Stall] = None
+
+        self.__lock = Lock()
+        self.__active: Dict[Tuple[str, str, str], _Stage] = {}
+        self.__last_tick: float = perf_counter()
+        self.__reported: bool = False
+        self.__loop_thread: Optional[int] = None
+        self.__stopped = Event()
+        self.__thread: Optional[Thread] = None
+        self.__ticker: Optional[Task] = None
+
+        self.on_middleware_start.append(self.__middleware_start)
+        self.on_middleware_end.append(self.__middleware_end)
+        self.on_handler_start.append(self.__handler_start)
+        self.on_handler_end.append(self.__handler_end)
+
+    def __enter_stage(
+            self,
+            ctx: TraceContext,
+            kind: str,
+            name: str,
+            func
+    ):
+        code = getattr(unwrap(func), "__code__", None)
+
+        with self.__lock:
+            self.__active[(ctx.trace_id, kind, name)] = _Stage(
+                kind, name, ctx.event_name, code
+            )
+
+    def __exit_stage(self, ctx: TraceContext, kind: str, name: str):
+        with self.__lock:
+            self.__active.pop((ctx.trace_id, kind, name), None)
+
+    def __middleware_start(
+            self,
+            ctx: TraceContext,
+            params: MiddlewareStartParams
+    ):
+        self.__enter_stage(ctx, "middleware", params.key, params.middleware)
+
+    def __middleware_end(self, ctx: TraceContext, params: MiddlewareEndParams):
+        self.__exit_stage(ctx, "middleware", params.key)
+
+    def __handler_start(self, ctx: TraceContext, params: HandlerStartParams):
+        self.__enter_stage(ctx, "handler", params.name, params.handler)
+
+    def __handler_end(self, ctx: TraceContext, params: HandlerEndParams):
+        self.__exit_stage(ctx, "handler", params.name)
+
+    def start(self, loop: AbstractEventLoop):
+        """
+        Start watching a loop, does nothing if already started.
+        Must be called from within the loop its thread.
+
+        :param loop:
+            The loop to watch.
+        """
+        if self.__thread:
+            return
+
+        self.__loop_thread = get_ident()
+        self.__last_tick = perf_counter()
+        self.__stopped.clear()
+        self.__ticker = loop.create_task(self.__tick())
+        self.__thread = Thread(
+            target=self.__watch, name="pincer-loop-watchdog", daemon=True
+        )
+        self.__thread.start()
+
+    async def stop(self):
+        """
+        Stop watching the loop, waits until the ticker has finished.
+        Must be awaited on the watched loop.
+        """
+        if not self.__thread:
+            return
+
+        self.__stopped.set()
+        self.__ticker.cancel()
+
+        try:
+            await self.__ticker
+        except CancelledError:
+            pass
+
+        self.__thread.join()
+        self.__thread = None
+        self.__ticker = None
+
+    async def __tick(self):
+        """Wake up periodically and measure how late that was."""
+        while True:
+            expected = perf_counter() + self.interval
+            await sleep(self.interval)
+
+            self.__last_tick = now = perf_counter()
+            lag = max(now - expected, 0)
+            _lag.observe(lag)
+
+            if self.__reported:
+                self.__reported = False
+                _log.warning(
+                    "Event loop was blocked for %.3fs in total." % lag
+                )
+
+    def __watch(self):
+        """Check from a separate thread whether the loop is blocked."""
+        while not self.__stopped.wait(self.interval):
+            blocked = perf_counter() - self.__last_tick - self.interval
+
+            if blocked < self.threshold or self.__reported:
+                continue
+
+            self.__reported = True
+            self.last_stall = stall = self.__sample(blocked)
+
+            _stalls.inc(
+                stage=stall.stage or "", event=stall.event_name or ""
+            )
+            _log.warning(
+                "Event loop has been blocked for %.3fs by %s (event: %s)\n%s"
+                % (
+                    stall.duration,
+                    stall.stage or "code outside of handlers",
+                    stall.event_name,
+                    "".join(stall.stack)
+                )
+            )
+
+    def __sample(self, blocked: float) -> Stall:
+        """
+        Sample the stack of the loop its thread and find the stage
+        which is running in it.
+
+        :param blocked:
+            For how long the loop has been blocked.
+        """
+        frame: Optional[FrameType] = sys._current_frames().get(
+            self.__loop_thread
+        )
+
+        with self.__lock:
+            stages = {
+                stage.code: stage
+                for stage in self.__active.values() if stage.code
+            }
+
+        running: Optional[_Stage] = None
+        current = frame
+
+        # Walk from the innermost frame outwards, so nested
+        # stages get attributed to the most specific one.
+        while current and not running:
+            running = stages.get(current.f_code)
+            current = current.f_back
+
+        return Stall(
+            blocked,
+            f"{running.kind} {running.name}" if running else None,
+            running.event_name if running else None,
+            format_stack(frame) if frame else []
+        )
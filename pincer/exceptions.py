@@ -134,6 +134,33 @@ class UnavailableGuildError(PincerError):
 class HTTPError(PincerError):
     """HTTP Exception base class."""
 
+    def __init__(
+            self,
+            message: str = "", *,
+            status: Optional[int] = None,
+            route: Optional[str] = None,
+            bucket: Optional[str] = None
+    ):
+        """
+        :param message:
+            Description of the error.
+
+        Keyword Arguments:
+
+        :param status:
+            The status code of the response.
+
+        :param route:
+            The route template of the request, eg ``channels/{id}``.
+
+        :param bucket:
+            The rate limit bucket of the request.
+        """
+        super(HTTPError, self).__init__(message)
+        self.status = status
+        self.route = route
+        self.bucket = bucket
+
 
 class NotModifiedError(HTTPError):
     """Error code 304."""
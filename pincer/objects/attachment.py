@@ -23,8 +23,9 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import AsyncIterator, Optional
 
+from pincer.core.download import Downloader, default_downloader
 from pincer.utils.api_object import APIObject
 from pincer.utils.constants import MISSING, APINullable
 from pincer.utils.snowflake import Snowflake
@@ -68,3 +69,45 @@ class Attachment(APIObject):
     content_type: APINullable[str] = MISSING
     height: APINullable[Optional[int]] = MISSING
     width: APINullable[Optional[int]] = MISSING
+
+    async def read_stream(
+            self,
+            downloader: Optional[Downloader] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Read the content of the attachment chunk by chunk.
+
+        :param downloader:
+            The downloader which fetches the attachment, defaults to
+            :func:`~.core.download.default_downloader`.
+        """
+        downloader = downloader or default_downloader()
+
+        async for chunk in downloader.stream(self.url):
+            yield chunk
+
+    async def save(
+            self,
+            path: Optional[str] = None, *,
+            downloader: Optional[Downloader] = None
+    ) -> str:
+        """
+        Download the attachment to disk.
+
+        :param path:
+            Where the attachment gets saved, defaults to its filename in
+            the working directory.
+
+        Keyword Arguments:
+
+        :param downloader:
+            The downloader which fetches the attachment, defaults to
+            :func:`~.core.download.default_downloader`. Pass one with a
+            ``cache_dir`` to use its cache.
+
+        :return:
+            The path of the saved file.
+        """
+        path = path or self.filename
+        downloader = downloader or default_downloader()
+        return await downloader.save(self.url, path)
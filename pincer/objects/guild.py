@@ -278,4 +278,4 @@ class Guild(APIObject):
                 " to a discord outage."
             )
 
-        return cls.from_dict(data)
+        return super().from_dict(data)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+A local proxy for the Discord REST API.
+
+All processes of a bot send their requests to the proxy, which applies
+one rate limit engine per token and reuses its upstream connections.
+
+.. code-block:: sh
+
+    $ pincer-proxy --port 8080
+
+.. code-block:: python
+
+    client = Client("token", http_base_url="http://127.0.0.1:8080/api/v9")
+"""
+
+from __future__ import annotations
+
+import logging
+from argparse import ArgumentParser
+from asyncio import get_event_loop
+from typing import Dict, Optional, Sequence
+
+from aiohttp import ClientSession, web
+from multidict import CIMultiDict
+
+from pincer import __package__
+from pincer.core.http import create_connector
+from pincer.core.metrics import CONTENT_TYPE, metrics
+from pincer.core.ratelimiter import RateLimiter, parse_ratelimit
+
+_log = logging.getLogger(__package__)
+
+_proxied = metrics.counter(
+    "pincer_proxy_requests_total",
+    "Amount of requests which were passed on by the proxy.",
+    ("method", "status")
+)
+
+_REQUEST_HEADERS = (
+    "Authorization", "Content-Length", "Content-Type", "If-Modified-Since",
+    "If-None-Match", "User-Agent", "X-Audit-Log-Reason"
+)
+_SKIP_RESPONSE_HEADERS = (
+    "connection", "content-encoding", "content-length", "keep-alive",
+    "transfer-encoding"
+)
+
+
+class RestProxy:
+    """
+    HTTP server which passes Discord REST requests on to the Discord API
+    while applying its rate limits.
+
+    Every token gets its own rate limit engine, requests which get rate
+    limited are retried by the proxy. The Prometheus metrics of the
+    proxy are served on ``/metrics``.
+
+    Request bodies smaller than ``buffer_limit`` bytes are buffered so
+    they can be sent again. Larger ones, like file uploads, are streamed to
+    Discord as they arrive. If such a request gets rate limited, the
+    429 response is passed on for the client to retry it.
+    """
+
+    def __init__(
+            self,
+            port: int = 8080,
+            *,
+            host: str = "127.0.0.1",
+            upstream: str = "https://discord.com",
+            global_rate: int = 50,
+            connector_limit: int = 100,
+            buffer_limit: int = 1024 * 1024
+    ):
+        """
+        :param port:
+            The port on which the proxy will listen.
+
+        Keyword Arguments:
+
+        :param host:
+            The interface on which the proxy will listen.
+            Defaults to localhost only.
+
+        :param upstream:
+            The url of the Discord API.
+
+        :param global_rate:
+            The maximum amount of requests per second per token.
+
+        :param connector_limit:
+            The maximum amount of simultaneous upstream connections.
+
+        :param buffer_limit:
+            The size in bytes from which request bodies are streamed.
+        """
+        self.host: str = host
+        self.port: int = port
+        self.upstream: str = upstream.rstrip("/")
+        self.global_rate: int = global_rate
+        self.connector_limit: int = connector_limit
+        self.buffer_limit: int = buffer_limit
+
+        self.__limiters: Dict[str, RateLimiter] = {}
+        self.__runner: Optional[web.AppRunner] = None
+        self.__session: Optional[ClientSession] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether or not the proxy is currently listening."""
+        return self.__runner is not None
+
+    async def __metrics(self, _: web.Request) -> web.Response:
+        return web.Response(
+            body=metrics.render().encode(),
+            headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        """
+        Pass a request on to the Discord API once its rate limits allow
+        it, retrying it when it still gets rate limited.
+
+        :meta public:
+
+        :param request:
+            The request of a bot process.
+        """
+        token = request.headers.get("Authorization")
+
+        if not token:
+            return web.json_response(
+                {"message": "401: Unauthorized", "code": 0}, status=401
+            )
+
+        limiter = self.__limiters.get(token)
+
+        if limiter is None:
+            limiter = self.__limiters[token] = RateLimiter(self.global_rate)
+
+        method = request.method
+        endpoint = request.match_info["endpoint"]
+        url = self.upstream + request.path_qs
+        headers = {
+            key: request.headers[key]
+            for key in _REQUEST_HEADERS if key in request.headers
+        }
+        streamed = request.body_exists and (
+            request.content_length is None
+            or request.content_length >= self.buffer_limit
+        )
+        body = None if streamed else await request.read() or None
+        bucket = limiter.bucket(method, endpoint)
+
+        while True:
+            acquired = await limiter.acquire(bucket, endpoint)
+
+            try:
+                async with self.__session.request(
+                        method, url, headers=headers,
+                        data=request.content if streamed else body
+                ) as res:
+                    bucket = limiter.update(
+                        acquired, method, endpoint, res.headers
+                    )
+                    payload = await res.read()
+                    _proxied.inc(method=method, status=res.status)
+
+                    # A streamed body has been consumed, so it can't be
+                    # sent again.
+                    if res.status != 429 or streamed:
+                        return web.Response(
+                            status=res.status,
+                            body=payload,
+                            headers=CIMultiDict(
+                                (key, value)
+                                for key, value in res.headers.items()
+                                if key.lower() not in _SKIP_RESPONSE_HEADERS
+                            )
+                        )
+
+                    try:
+                        data = await res.json(content_type=None)
+                    except ValueError:
+                        data = {}
+
+                    retry_after, is_global = parse_ratelimit(
+                        res.headers, data
+                    )
+                    _log.warning(
+                        "Proxied %s %s got rate limited, retrying in %.3fs"
+                        % (method, endpoint, retry_after)
+                    )
+                    limiter.ratelimited(bucket, retry_after, is_global)
+
+            finally:
+                acquired.release()
+
+    async def start(self):
+        """Start listening, does nothing if already started."""
+        if self.__runner:
+            return
+
+        self.__session = ClientSession(
+            connector=create_connector(limit=self.connector_limit)
+        )
+
+        app = web.Application(client_max_size=self.buffer_limit)
+        app.router.add_get("/metrics", self.__metrics)
+        app.router.add_route(
+            "*", r"/api/v{version:\d+}/{endpoint:.+}", self.__handle
+        )
+
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, self.host, self.port).start()
+
+        _log.info(
+            "Proxying Discord REST requests on `http://%s:%i/api/v<n>`"
+            % (self.host, self.port)
+        )
+
+    async def stop(self):
+        """Stop listening and close the upstream connections."""
+        if not self.__runner:
+            return
+
+        await self.__runner.cleanup()
+        await self.__session.close()
+        self.__runner = self.__session = None
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """
+    Run a :class:`RestProxy` until it gets interrupted.
+
+    :param argv:
+        The command line arguments, defaults to ``sys.argv``.
+    """
+    parser = ArgumentParser(
+        prog="pincer-proxy",
+        description="Local proxy which rate limits Discord REST requests."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--upstream", default="https://discord.com")
+    parser.add_argument("--global-rate", type=int, default=50)
+    parser.add_argument("--connector-limit", type=int, default=100)
+    parser.add_argument("--buffer-limit", type=int, default=1024 * 1024)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    proxy = RestProxy(
+        args.port,
+        host=args.host,
+        upstream=args.upstream,
+        global_rate=args.global_rate,
+        connector_limit=args.connector_limit,
+        buffer_limit=args.buffer_limit
+    )
+
+    loop = get_event_loop()
+    loop.run_until_complete(proxy.start())
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(proxy.stop())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,11 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from __future__ import annotations
+
+from pincer.utils.timestamp import DISCORD_EPOCH
+
+
 class Snowflake(int):
     """
     Discord utilizes Twitter's snowflake format for uniquely
@@ -36,6 +41,17 @@ class Snowflake(int):
     to prevent integer overflows in some languages.
     """
 
+    @classmethod
+    def from_timestamp(cls, timestamp: float) -> Snowflake:
+        """
+        The lowest snowflake of a point in time, eg to use as bound for
+        ``before`` and ``after`` queries.
+
+        :param timestamp:
+            Seconds since the unix epoch.
+        """
+        return cls(int((timestamp - DISCORD_EPOCH) * 1000) << 22)
+
     @property
     def timestamp(self) -> int:
         """
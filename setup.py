@@ -96,5 +96,10 @@ setup(
     ],
     include_package_data=True,
     keywords=["discord", "api", "asynchronous"],
-    extras_require={},
+    extras_require={
+        "speed": ["uvloop; platform_system != 'Windows'"]
+    },
+    entry_points={
+        "console_scripts": ["pincer-proxy = pincer.proxy:main"]
+    },
 )
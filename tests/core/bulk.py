@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import run, sleep
+from time import time
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from pincer.core.bulk import bulk_ban, bulk_delete_messages, bulk_add_role
+from pincer.core.http import HTTPClient
+from pincer.utils.timestamp import DISCORD_EPOCH
+from tests.core.server import serve
+
+GUILD = 123456789012345678
+USERS = range(223456789012345678, 223456789012345698)
+
+
+def snowflake(age: float) -> int:
+    return int((time() - age - DISCORD_EPOCH) * 1000) << 22
+
+
+class FakeHTTP:
+    def __init__(self, fail=(), limit=None):
+        self.calls = []
+        self.fail = fail
+        self.limit = limit
+        self.in_flight = self.max_in_flight = 0
+        self.buckets = []
+
+    def bucket(self, route, method="GET"):
+        self.buckets.append((method, route))
+        return SimpleNamespace(limit=self.limit)
+
+    async def request(self, method, route, data=None):
+        self.calls.append((method, route, data))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await sleep(0)
+        self.in_flight -= 1
+
+        if any(str(i) in route for i in self.fail):
+            raise RuntimeError(route)
+
+    async def post(self, route, data):
+        return await self.request("POST", route, data)
+
+    async def put(self, route, data):
+        return await self.request("PUT", route, data)
+
+    async def delete(self, route):
+        return await self.request("DELETE", route)
+
+
+class TestBulk:
+    def test_bulk_delete_chunks(self):
+        """Recent messages are deleted in chunks of 100."""
+        http = FakeHTTP()
+        ids = [snowflake(60) + i for i in range(250)]
+        result = run(bulk_delete_messages(http, 1, ids))
+
+        assert result.ok and len(result.succeeded) == 250
+        assert [len(c[2]["messages"]) for c in http.calls] == [100, 100, 50]
+
+    def test_bulk_delete_old(self):
+        """Messages older than 14 days are deleted one by one."""
+        http = FakeHTTP()
+        old = snowflake(15 * 24 * 60 * 60)
+        ids = [old, snowflake(60), snowflake(60) + 1]
+
+        result = run(bulk_delete_messages(http, 1, ids))
+        assert result.ok
+        assert [c[0] for c in http.calls] == ["POST", "DELETE"]
+
+        http = FakeHTTP()
+        result = run(bulk_delete_messages(http, 1, ids, delete_old=False))
+        assert list(result.failed) == [old]
+        assert len(http.calls) == 1
+
+    def test_bulk_delete_single_recent(self):
+        """
+        A recent message which is left over after the chunks is deleted
+        on its own, instead of being reported as too old.
+        """
+        http = FakeHTTP()
+        ids = [snowflake(60) + i for i in range(101)]
+        result = run(bulk_delete_messages(http, 1, ids, delete_old=False))
+
+        assert result.ok and len(result.succeeded) == 101
+        assert [c[0] for c in http.calls] == ["POST", "DELETE"]
+        assert http.calls[1][1] == f"channels/1/messages/{ids[-1]}"
+
+    def test_concurrency_from_bucket(self):
+        """
+        The amount of requests in flight follows the limit of the rate
+        limit bucket, or the given concurrency.
+        """
+        http = FakeHTTP(limit=3)
+        run(bulk_add_role(http, 10, 20, range(100, 120)))
+        assert http.max_in_flight == 3
+        assert http.buckets == [("PUT", "guilds/10/members/100/roles/20")]
+
+        http = FakeHTTP(limit=3)
+        run(bulk_add_role(http, 10, 20, range(100, 120), concurrency=7))
+        assert http.max_in_flight == 7
+
+        http = FakeHTTP()
+        run(bulk_add_role(http, 10, 20, range(100, 120)))
+        assert http.max_in_flight == 10
+
+    def test_partial_failure(self):
+        """A failing member doesn't stop the others."""
+        progress = []
+        http = FakeHTTP(fail=(102,))
+        result = run(bulk_add_role(
+            http, 10, 20, [101, 102, 103],
+            progress=lambda done, total: progress.append((done, total))
+        ))
+
+        assert sorted(result.succeeded) == [101, 103]
+        assert list(result.failed) == [102]
+        assert progress[-1] == (3, 3)
+
+    def test_concurrency_from_real_bucket(self):
+        """
+        The limit which the rate limiter learned for the route of the
+        real ids sizes the pipeline.
+        """
+        application = web.Application()
+        application["in_flight"] = [0, 0]
+
+        async def handler(request: web.Request):
+            in_flight = request.app["in_flight"]
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await sleep(.01)
+            in_flight[0] -= 1
+
+            return web.json_response({}, headers={
+                "X-RateLimit-Limit": "3",
+                "X-RateLimit-Remaining": "50",
+                "X-RateLimit-Reset-After": "60",
+                "X-RateLimit-Bucket": "bans"
+            })
+
+        application.router.add_put("/guilds/{guild}/bans/{user}", handler)
+
+        async def main():
+            async with serve(application) as url:
+                async with HTTPClient("token", base_url=url) as http:
+                    await http.put(f"guilds/{GUILD}/bans/{USERS[0]}", {})
+                    application["in_flight"][1] = 0
+                    return await bulk_ban(http, GUILD, USERS)
+
+        assert run(main()).ok
+        assert application["in_flight"][1] == 3
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from pincer.core.cache import ResponseCache
+
+
+class TestResponseCache:
+    guild = "guilds/123456789012345678"
+
+    def test_lru(self):
+        """
+        Tests whether or not the least recently used responses get
+        dropped once the cache is full.
+        """
+        cache = ResponseCache({"guilds/{id}": 60}, max_bytes=10)
+        cache.set(self.guild, {}, None, 6)
+        cache.set("guilds/876543210987654321", {}, None, 6)
+
+        assert cache.get(self.guild) is None
+        assert len(cache) == 1
+        assert cache.size == 6
+
+    def test_invalidate(self):
+        """
+        Tests whether or not a mutating request drops the responses of
+        the resource, its children and its parent.
+        """
+        cache = ResponseCache({"guilds/{id}": 60, "guilds/{id}/roles": 60})
+        cache.set(self.guild, {}, None, 1)
+        cache.set(f"{self.guild}/roles", [], None, 1)
+        cache.set("guilds/876543210987654321", {}, None, 1)
+
+        cache.invalidate(f"{self.guild}/roles/876543210987654321")
+        assert cache.get(f"{self.guild}/roles") is None
+        assert cache.get(self.guild).fresh
+
+        cache.invalidate(self.guild)
+        assert len(cache) == 1
+
+    def test_invalidate_guild_channels(self):
+        """
+        Tests whether or not a modified channel drops the channel list of
+        its guild, but a message sent to it doesn't.
+        """
+        channel = "channels/876543210987654321"
+        cache = ResponseCache({"guilds/{id}/channels": 60})
+        cache.set(
+            f"{self.guild}/channels",
+            [{"id": "876543210987654321"}], None, 1
+        )
+
+        cache.invalidate(f"{channel}/messages")
+        assert len(cache) == 1
+
+        cache.invalidate(channel)
+        assert len(cache) == 0
+
+        cache.set(
+            f"{self.guild}/channels",
+            [{"id": "876543210987654321"}], None, 1
+        )
+        cache.invalidate(f"{channel}/permissions/123456789012345678")
+        assert len(cache) == 0
+
+    def test_scope(self):
+        """
+        Tests whether or not responses of different scopes, eg bots,
+        are kept apart.
+        """
+        cache = ResponseCache({"guilds/{id}": 60})
+        cache.set(self.guild, {"bot": "a"}, None, 1, scope="a")
+
+        assert cache.get(self.guild, scope="b") is None
+        assert cache.get(self.guild, scope="a").data == {"bot": "a"}
+
+        cache.invalidate(self.guild, scope="b")
+        assert len(cache) == 1
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+from asyncio import gather, run, sleep
+from tempfile import TemporaryDirectory
+
+from aiohttp import web
+
+from pincer.core.chrome_trace import ChromeTracer
+from pincer.core.http import HTTPClient
+from pincer.core.retry import RetryPolicy
+from pincer.core.tracing import (
+    HandlerEndParams, HandlerStartParams, RequestRetryParams, send_trace,
+    start_trace
+)
+from tests.core.server import serve
+
+
+async def handle(tracer: ChromeTracer, name: str):
+    start_trace(f"event {name}")
+    await send_trace([tracer], "on_handler_start", HandlerStartParams(
+        name, handle
+    ))
+    await send_trace([tracer], "on_request_retry", RequestRetryParams(
+        "GET", "users/@me", 502, .5
+    ))
+    await send_trace([tracer], "on_handler_end", HandlerEndParams(
+        name, handle
+    ))
+
+
+class TestChromeTracer:
+    def test_json(self):
+        """
+        Tests whether or not a closed trace file is valid JSON with a
+        begin and end pair per span on the track of its trace.
+        """
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+
+            with ChromeTracer(path) as tracer:
+                run(handle(tracer, "on_message"))
+
+            with open(path) as file:
+                events = json.load(file)
+
+        assert [event["ph"] for event in events] == ["n", "b", "e"]
+        assert events[0]["name"] == "retry GET users/@me"
+        assert events[1]["name"] == events[2]["name"] == "on_message"
+        assert len({event["id"] for event in events}) == 1
+        assert events[1]["ts"] <= events[2]["ts"]
+
+    def test_rotation(self):
+        """
+        Tests whether or not the file gets rotated once it is too large,
+        keeping every rotated file valid JSON.
+        """
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+
+            with ChromeTracer(path, max_bytes=1, backup_count=2) as tracer:
+                for name in ("a", "b", "c"):
+                    run(handle(tracer, name))
+
+            files = sorted(os.listdir(directory))
+            contents = []
+
+            for name in files:
+                with open(os.path.join(directory, name)) as file:
+                    contents.append(json.load(file))
+
+        assert files == ["trace.json", "trace.json.1", "trace.json.2"]
+        assert all(contents)
+
+    def test_request_attempts(self):
+        """
+        Tests whether or not every attempt of a request, and requests
+        which overlap within one trace, get their own paired span.
+        """
+        failed = []
+
+        async def handler(request):
+            if request.match_info["id"] == "1" and not failed:
+                failed.append(request)
+                return web.Response(status=502)
+
+            await sleep(.05 if request.match_info["id"] == "1" else .2)
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_get("/users/{id}", handler)
+
+        async def main(tracer):
+            async with serve(app) as url:
+                async with HTTPClient(
+                    "token",
+                    base_url=url,
+                    trace_configs=[tracer],
+                    retry_policy=RetryPolicy(base=0)
+                ) as http:
+                    start_trace("event")
+                    await gather(http.get("users/1"), http.get("users/2"))
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+
+            with ChromeTracer(path) as tracer:
+                run(main(tracer))
+
+            with open(path) as file:
+                events = json.load(file)
+
+        spans = [
+            (begin["name"], begin["args"]["status"], end["ts"] - begin["ts"])
+            for begin, end in zip(events, events[1:])
+            if begin["ph"] == "b"
+        ]
+
+        assert sorted(name for name, _, _ in spans) == [
+            "GET users/1", "GET users/1", "GET users/2"
+        ]
+        assert sorted(status for _, status, _ in spans) == [200, 200, 502]
+        assert max(spans, key=lambda span: span[2])[0] == "GET users/2"
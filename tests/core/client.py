@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import run
+
+import pytest
+
+from pincer.client import Client, ClientPool
+from pincer.core.cache import ResponseCache
+from pincer.core.gateway import Dispatcher
+from pincer.core.ratelimit_store import SharedRateLimitStore
+from pincer.core.upload import File
+from pincer.exceptions import InvalidTokenError
+from pincer.objects.channel import Channel
+from pincer.objects.embed import Embed
+from pincer.objects.guild import Guild
+from pincer.objects.guild_member import GuildMember
+
+TOKENS = ("a" * 59, "b" * 59)
+
+GUILD = {
+    "id": "1", "name": "guild", "owner_id": "2", "afk_timeout": 300,
+    "verification_level": 0, "default_message_notifications": 0,
+    "explicit_content_filter": 0, "roles": [], "emojis": [],
+    "features": [], "mfa_level": 0, "system_channel_flags": 0,
+    "premium_tier": 0, "preferred_locale": "en-US", "nsfw_level": 0,
+    **dict.fromkeys((
+        "afk_channel_id", "application_id", "banner", "description",
+        "discovery_splash", "icon", "public_updates_channel_id",
+        "rules_channel_id", "splash", "system_channel_id",
+        "vanity_url_code"
+    ))
+}
+CHANNEL = {"id": "3", "type": 0, "name": "general"}
+MEMBER = {
+    "roles": [], "joined_at": "2021-01-01T00:00:00+00:00",
+    "deaf": False, "mute": False, "nick": "nick"
+}
+MESSAGE = {"id": "4", "channel_id": "3", "content": "hi"}
+
+
+class RecordingClient(Client):
+    async def start(self):
+        self.started_with = self.connector
+
+
+class FakeHTTP:
+    """Answers every request with a fixed response, and records them."""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    async def get(self, route):
+        self.calls.append(("GET", route, None, None))
+        return self.response
+
+    async def post(self, route, data=None, files=None):
+        self.calls.append(("POST", route, data, files))
+        return self.response
+
+    async def patch(self, route, data=None, files=None):
+        self.calls.append(("PATCH", route, data, files))
+        return self.response
+
+
+def client(response) -> Client:
+    """A client whose requests are answered by a :class:`FakeHTTP`."""
+    bot = Client(TOKENS[0])
+    bot._Client__http = FakeHTTP(response)
+    return bot
+
+
+class TestClientPool:
+    def test_options(self):
+        """
+        Tests whether or not the metrics are served by the pool instead
+        of every client, and shared options reach all clients.
+        """
+        cache = ResponseCache()
+        pool = ClientPool(
+            TOKENS, client_cls=RecordingClient,
+            metrics_port=0, response_cache=cache
+        )
+
+        assert pool.metrics_server is not None
+        assert all(
+            client.response_cache is cache for client in pool.clients
+        )
+        assert all(
+            client._Dispatcher__metrics_server is None
+            for client in pool.clients
+        )
+
+    def test_reject_store(self, tmp_path):
+        """
+        Tests whether or not a rate limit store, which is bound to one
+        bot, can't be shared.
+        """
+        store = SharedRateLimitStore(str(tmp_path / "store"))
+
+        with pytest.raises(ValueError):
+            ClientPool(TOKENS, ratelimit_store=store)
+
+        store.close()
+
+    def test_shared_connector(self):
+        """
+        Tests whether or not all clients start with the same connector,
+        which gets closed once they stopped.
+        """
+        pool = ClientPool(TOKENS, client_cls=RecordingClient)
+        run(pool.start())
+
+        connectors = {id(client.started_with) for client in pool.clients}
+        assert len(connectors) == 1
+        assert pool.clients[0].started_with is pool.connector
+        assert pool.connector.closed
+
+
+class FlakyClient(Client):
+    starts = 0
+
+    async def start(self):
+        self.starts += 1
+
+        if self.starts == 1:
+            raise RuntimeError("Shard crashed")
+
+
+class RevokedClient(Client):
+    starts = 0
+
+    async def start(self):
+        self.starts += 1
+        raise InvalidTokenError()
+
+
+class TestClientPoolSupervision:
+    def test_isolated(self):
+        """
+        Tests whether or not a crashing client is restarted without
+        stopping the others, and a client with an invalid token is not
+        restarted.
+        """
+        pool = ClientPool(restart_delay=0)
+        pool.clients = [
+            FlakyClient(TOKENS[0]),
+            RevokedClient(TOKENS[1]),
+            RecordingClient(TOKENS[0])
+        ]
+
+        run(pool.start())
+
+        flaky, revoked, healthy = pool.clients
+        assert (flaky.starts, revoked.starts) == (2, 1)
+        assert healthy.started_with is pool.connector
+
+    def test_no_restart(self):
+        """Tests whether or not restarts can be turned off."""
+        pool = ClientPool(restart_delay=None)
+        pool.clients = [FlakyClient(TOKENS[0])]
+
+        run(pool.start())
+        assert pool.clients[0].starts == 1
+
+
+class TestReconnect:
+    def test_reconnect_loop(self):
+        """
+        Tests whether or not the dispatcher connects again as long as
+        the connection asks for a reconnect.
+        """
+        dispatcher = Dispatcher("x" * 59, handlers={})
+        connects = []
+
+        async def connect(_):
+            connects.append(len(connects))
+            return len(connects) < 3
+
+        dispatcher._Dispatcher__dispatcher = connect
+        run(dispatcher.start())
+
+        assert connects == [0, 1, 2]
+
+
+class TestRest:
+    def test_fetch_guild(self):
+        """
+        Tests whether or not a guild is fetched from its route and
+        parsed, unless the raw response is asked for.
+        """
+        bot = client(GUILD)
+
+        guild = run(bot.fetch_guild(1, with_counts=True))
+        assert isinstance(guild, Guild) and guild.name == "guild"
+        assert run(bot.fetch_guild(1, raw=True)) is GUILD
+
+        assert [call[1] for call in bot._http.calls] == [
+            "guilds/1?with_counts=true", "guilds/1"
+        ]
+
+    def test_fetch_channel(self):
+        """Tests whether or not a channel is fetched and parsed."""
+        bot = client(CHANNEL)
+
+        channel = run(bot.fetch_channel(3))
+        assert isinstance(channel, Channel) and channel.name == "general"
+        assert run(bot.fetch_channel(3, raw=True)) is CHANNEL
+        assert bot._http.calls[0][:2] == ("GET", "channels/3")
+
+    def test_send_message(self):
+        """
+        Tests whether or not the content, embeds, files and other fields
+        of a message are sent to the channel.
+        """
+        bot = client(MESSAGE)
+        file = File(b"data", "data.bin")
+
+        response = run(bot.send_message(
+            3, "hi", embeds=[Embed(title="embed")], files=[file], tts=True,
+            raw=True
+        ))
+
+        method, route, data, files = bot._http.calls[0]
+
+        assert response is MESSAGE
+        assert (method, route) == ("POST", "channels/3/messages")
+        assert data["content"] == "hi" and data["tts"] is True
+        assert data["embeds"][0]["title"] == "embed"
+        assert files == [file]
+
+    def test_edit_member(self):
+        """Tests whether or not only the given fields are sent."""
+        bot = client(MEMBER)
+
+        member = run(bot.edit_member(1, 2, nick="nick"))
+        assert isinstance(member, GuildMember) and member.nick == "nick"
+        assert bot._http.calls[0][1:3] == (
+            "guilds/1/members/2", {"nick": "nick"}
+        )
+        assert run(bot.edit_member(1, 2, raw=True, nick="nick")) is MEMBER
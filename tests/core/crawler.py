@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+from asyncio import run, sleep
+from urllib.parse import parse_qs
+
+import pytest
+
+from pincer.core.crawler import HistoryCrawler
+from pincer.core.ratelimiter import Bucket
+from pincer.utils.snowflake import Snowflake
+
+IDS = list(range(1003, 2000, 7))
+
+
+class FakeHTTP:
+    """Serves the history of a channel with the messages in ``IDS``."""
+
+    def bucket(self, route, method="GET"):
+        return Bucket(route)
+
+    async def get(self, route):
+        query = parse_qs(route.split("?")[1])
+        after, limit = int(query["after"][0]), int(query["limit"][0])
+
+        # The early ranges answer slowest, so they complete last.
+        await sleep(.01 if after < 1500 else 0)
+
+        page = [i for i in IDS if i > after][:limit]
+        return [{"id": str(i)} for i in reversed(page)]
+
+
+def crawler(**kwargs) -> HistoryCrawler:
+    return HistoryCrawler(
+        FakeHTTP(), 1, after=1000, before=2000, raw=True, **kwargs
+    )
+
+
+class TestHistoryCrawler:
+    def test_from_timestamp(self):
+        """A synthetic snowflake has the given timestamp."""
+        snowflake = Snowflake.from_timestamp(1420070400 + 1.5)
+        assert snowflake.timestamp == 1500
+        assert snowflake.increment == 0
+
+    def test_split(self):
+        """The ranges are disjoint and cover the whole history."""
+        partitions = HistoryCrawler.split(1000, 1999, 4)
+
+        assert partitions[0][0] == 1000 and partitions[-1][1] == 1999
+        assert all(
+            left[1] == right[0]
+            for left, right in zip(partitions, partitions[1:])
+        )
+        assert len(partitions) == 4
+
+    def test_split_small(self):
+        """A range smaller than the amount of partitions isn't padded."""
+        assert HistoryCrawler.split(10, 12, 8) == [[10, 11], [11, 12]]
+
+    def test_ordered(self):
+        """
+        The messages of all ranges are yielded oldest first, even when
+        later ranges are crawled first.
+        """
+        messages = run(crawler(partitions=8, concurrency=8).flatten())
+        assert [int(m["id"]) for m in messages] == IDS
+
+    def test_resume(self, tmp_path):
+        """
+        A stopped crawl resumes from its checkpoint, only the message at
+        which it stopped is yielded again.
+        """
+        checkpoint = str(tmp_path / "crawl.json")
+
+        async def partial():
+            iterator = crawler(checkpoint=checkpoint).__aiter__()
+            ids = [int((await iterator.__anext__())["id"]) for _ in range(50)]
+            await iterator.aclose()
+            return ids
+
+        first = run(partial())
+        second = [
+            int(m["id"])
+            for m in run(crawler(checkpoint=checkpoint).flatten())
+        ]
+
+        assert second[0] == first[-1]
+        assert first + second[1:] == IDS
+
+        with open(checkpoint) as file:
+            state = json.load(file)
+
+        assert all(low == high for low, high in state["partitions"])
+
+    def test_resume_other_channel(self, tmp_path):
+        """A checkpoint of another channel is refused."""
+        checkpoint = tmp_path / "crawl.json"
+        checkpoint.write_text(json.dumps({
+            "channel_id": "2", "partitions": [[1000, 1999]]
+        }))
+
+        with pytest.raises(ValueError):
+            crawler(checkpoint=str(checkpoint))
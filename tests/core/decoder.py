@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import zlib
+from asyncio import Future, run
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pincer.core.decoder import PayloadDecoder, ZLIB_SUFFIX
+from pincer.core.streaming import StreamedArray
+
+
+def message(size: int = 0) -> str:
+    return json.dumps({
+        "op": 0, "s": 3, "t": "GUILD_CREATE",
+        "d": {"id": "1", "padding": "x" * size}
+    })
+
+
+class TestPayloadDecoder:
+    def test_inline(self):
+        """Tests whether or not small messages are decoded inline."""
+        payload = PayloadDecoder(threshold=1024).parse(message())
+
+        assert not isinstance(payload, Future)
+        assert (payload.event_name, payload.seq) == ("GUILD_CREATE", 3)
+
+    def test_inline_without_executor(self):
+        """
+        Tests whether or not large messages are decoded inline when no
+        executor is given.
+        """
+        payload = PayloadDecoder(threshold=1024).parse(message(2048))
+
+        assert not isinstance(payload, Future)
+        assert payload.data["id"] == "1"
+
+    def test_executor(self):
+        """Tests whether or not large messages go to the given executor."""
+        calls = []
+
+        class Recording(ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                calls.append(len(args[0]))
+                return super().submit(fn, *args, **kwargs)
+
+        with Recording(1) as executor:
+            payload = run(PayloadDecoder(
+                threshold=1024, executor=executor
+            ).decode(message(2048)))
+
+        assert payload.data["id"] == "1"
+        assert calls and calls[0] > 2048
+
+    def test_process_pool(self):
+        """Tests whether or not a process pool decodes payloads."""
+        with ProcessPoolExecutor(1) as executor:
+            payload = run(PayloadDecoder(
+                threshold=0, executor=executor
+            ).decode(message()))
+
+        assert payload.seq == 3
+
+    def test_streamed_on_executor(self):
+        """
+        Tests whether or not large messages of streamed events are
+        scanned on the executor, and their arrays survive a process pool.
+        """
+        with ProcessPoolExecutor(1) as executor:
+            payload = run(PayloadDecoder(
+                threshold=0, executor=executor,
+                stream_events={"guild_create": ("padding_list",)}
+            ).decode(json.dumps({
+                "op": 0, "s": 3, "t": "GUILD_CREATE",
+                "d": {"id": "1", "padding_list": [{"id": 1}, {"id": 2}]}
+            })))
+
+        assert isinstance(payload.data["padding_list"], StreamedArray)
+        assert list(payload.data["padding_list"]) == [{"id": 1}, {"id": 2}]
+
+    def test_compressed(self):
+        """
+        Tests whether or not a zlib-stream payload which is split over
+        multiple messages is inflated once it is complete.
+        """
+        data = zlib.compressobj()
+        raw = data.compress(message().encode()) + data.flush(zlib.Z_SYNC_FLUSH)
+        assert raw.endswith(ZLIB_SUFFIX)
+
+        payload_decoder = PayloadDecoder(compressed=True)
+
+        async def main():
+            first = await payload_decoder.decode(raw[:10])
+            return first, await payload_decoder.decode(raw[10:])
+
+        first, payload = run(main())
+        assert first is None and payload.data["id"] == "1"
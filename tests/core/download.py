@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import ensure_future, run, sleep, wait_for
+
+from aiohttp import web
+
+from pincer.core.download import (
+    Downloader, default_downloader, using_default_downloader
+)
+from tests.core.server import serve
+
+CONTENT = bytes(range(256)) * 64
+
+
+def app() -> web.Application:
+    """Serve ``CONTENT`` with support for range requests."""
+    application = web.Application()
+    application["ranges"] = ranges = []
+
+    async def handler(request: web.Request):
+        ranges.append(request.headers.get("Range"))
+
+        if not request.http_range.start:
+            return web.Response(body=CONTENT)
+
+        start = request.http_range.start
+
+        if start >= len(CONTENT):
+            return web.Response(
+                status=416,
+                headers={"Content-Range": f"bytes */{len(CONTENT)}"}
+            )
+
+        return web.Response(
+            status=206,
+            body=CONTENT[start:],
+            headers={
+                "Content-Range":
+                    f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+            }
+        )
+
+    application.router.add_get("/file", handler)
+    return application
+
+
+async def download(application: web.Application, path, **kwargs) -> str:
+    async with serve(application) as url:
+        async with Downloader(**kwargs) as downloader:
+            return await downloader.save(f"{url}/file", str(path))
+
+
+async def read(downloader: Downloader, url: str) -> bytes:
+    return b"".join([chunk async for chunk in downloader.stream(url)])
+
+
+class TestSave:
+    def test_save(self, tmp_path):
+        """Tests whether or not a file is saved without a part file."""
+        path = tmp_path / "file.bin"
+        run(download(app(), path))
+
+        assert path.read_bytes() == CONTENT
+        assert not (tmp_path / "file.bin.part").exists()
+
+    def test_resume(self, tmp_path):
+        """Tests whether or not only the missing bytes are requested."""
+        application = app()
+        path = tmp_path / "file.bin"
+        (tmp_path / "file.bin.part").write_bytes(CONTENT[:1000])
+
+        run(download(application, path))
+
+        assert application["ranges"] == ["bytes=1000-"]
+        assert path.read_bytes() == CONTENT
+
+    def test_complete_part(self, tmp_path):
+        """
+        Tests whether or not a complete part file is accepted when the
+        server has nothing left to send.
+        """
+        application = app()
+        path = tmp_path / "file.bin"
+        (tmp_path / "file.bin.part").write_bytes(CONTENT)
+
+        run(download(application, path))
+
+        assert application["ranges"] == [f"bytes={len(CONTENT)}-"]
+        assert path.read_bytes() == CONTENT
+
+    def test_stale_part(self, tmp_path):
+        """
+        Tests whether or not a part file which is larger than the file
+        gets downloaded again.
+        """
+        application = app()
+        path = tmp_path / "file.bin"
+        (tmp_path / "file.bin.part").write_bytes(CONTENT + b"stale")
+
+        run(download(application, path))
+
+        assert application["ranges"] == [f"bytes={len(CONTENT) + 5}-", None]
+        assert path.read_bytes() == CONTENT
+
+    def test_cache(self, tmp_path):
+        """Tests whether or not repeated downloads are read from cache."""
+        application = app()
+
+        async def main():
+            async with serve(application) as url:
+                async with Downloader(
+                    cache_dir=str(tmp_path / "cache")
+                ) as downloader:
+                    for name in ("a.bin", "b.bin"):
+                        await downloader.save(
+                            f"{url}/file", str(tmp_path / name)
+                        )
+
+        run(main())
+
+        assert application["ranges"] == [None]
+        assert (tmp_path / "b.bin").read_bytes() == CONTENT
+
+
+class TestStream:
+    def test_stream(self, tmp_path):
+        """Tests whether or not a streamed file is stored in the cache."""
+        application = app()
+
+        async def main():
+            async with serve(application) as url:
+                async with Downloader(
+                    cache_dir=str(tmp_path), chunk_size=1024
+                ) as downloader:
+                    return (
+                        await read(downloader, f"{url}/file"),
+                        await read(downloader, f"{url}/file")
+                    )
+
+        assert run(main()) == (CONTENT, CONTENT)
+        assert application["ranges"] == [None]
+
+    def test_slot_released(self, tmp_path):
+        """
+        Tests whether or not a paused stream doesn't keep other
+        downloads waiting.
+        """
+        async def main():
+            async with serve(app()) as url:
+                async with Downloader(
+                    concurrency=1, chunk_size=1024
+                ) as downloader:
+                    stream = downloader.stream(f"{url}/file")
+                    first = await stream.__anext__()
+
+                    await wait_for(
+                        downloader.save(f"{url}/file", str(tmp_path / "f")),
+                        1
+                    )
+
+                    rest = [chunk async for chunk in stream]
+                    return first + b"".join(rest)
+
+        assert run(main()) == CONTENT
+        assert (tmp_path / "f").read_bytes() == CONTENT
+
+
+    def test_max_streams(self, tmp_path):
+        """
+        Tests whether or not a stream waits for a connection while
+        too many paused streams keep theirs open.
+        """
+        async def main():
+            async with serve(app()) as url:
+                async with Downloader(
+                    max_streams=1, chunk_size=1024
+                ) as downloader:
+                    first = downloader.stream(f"{url}/file")
+                    second = downloader.stream(f"{url}/file")
+                    await first.__anext__()
+
+                    waiting = ensure_future(second.__anext__())
+                    await sleep(.1)
+                    blocked = not waiting.done()
+
+                    await first.aclose()
+                    await wait_for(waiting, 1)
+                    await second.aclose()
+                    return blocked
+
+        assert run(main())
+
+
+class TestDefaultDownloader:
+    def test_shared(self):
+        """
+        Tests whether or not the default downloader is shared within a
+        loop but not across loops.
+        """
+        async def main():
+            return default_downloader(), default_downloader()
+
+        first, same = run(main())
+        second, _ = run(main())
+
+        assert first is same
+        assert first is not second
+
+    def test_closed_by_last_user(self):
+        """
+        Tests whether or not the default downloader stays open until the
+        last client which uses it stops.
+        """
+        async def main():
+            async with using_default_downloader() as downloader:
+                async with using_default_downloader():
+                    session = downloader.session
+
+                open_after_first = not session.closed
+
+            return open_after_first, session.closed
+
+        assert run(main()) == (True, True)
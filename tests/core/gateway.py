@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+from asyncio import Queue, get_running_loop, run, sleep
+from concurrent.futures import ThreadPoolExecutor
+
+from pincer.core.decoder import PayloadDecoder
+from pincer.core.dispatch import GatewayDispatch
+from pincer.core.gateway import Dispatcher, _Frame, _queue_depth, _queues
+
+
+def message(seq: int, size: int = 0) -> str:
+    return json.dumps({
+        "op": 0, "s": seq, "t": "EVENT", "d": {"padding": "x" * size}
+    })
+
+
+class TestPipeline:
+    def test_frame_decoded(self):
+        """
+        Tests whether or not the decode time of a payload from an
+        executor is known as soon as the payload has been awaited.
+        """
+        async def main():
+            future = get_running_loop().create_future()
+            frame = _Frame(None, 0, future)
+            future.set_result(GatewayDispatch(0, {}))
+
+            await frame.payload
+            return frame.decoded
+
+        assert run(main()) is not None
+
+    def test_order(self):
+        """
+        Tests whether or not payloads get dispatched in the order they
+        were received, when large ones are decoded on an executor.
+        """
+        seen = []
+
+        async def handler(_, payload: GatewayDispatch):
+            seen.append(payload.seq)
+
+        dispatcher = Dispatcher("x" * 59, handlers={0: handler})
+
+        async def main():
+            received, decoded = Queue(), Queue()
+
+            with ThreadPoolExecutor(2) as executor:
+                dispatcher._Dispatcher__decoder = PayloadDecoder(
+                    threshold=1024, executor=executor
+                )
+
+                for seq in range(1, 9):
+                    size = 512 * 1024 if seq % 3 == 0 else 0
+                    await received.put((0, message(seq, size)))
+
+                await received.put(None)
+
+                await dispatcher._Dispatcher__decode_stage(received, decoded)
+                await dispatcher._Dispatcher__dispatch_stage(
+                    None, decoded, get_running_loop()
+                )
+                await sleep(0)
+
+        run(main())
+        assert seen == list(range(1, 9))
+
+    def test_queue_depth(self):
+        """
+        Tests whether or not the queue depth gauge sums the queues of all
+        dispatchers, instead of reporting the last one started.
+        """
+        async def main():
+            first, second = Queue(), Queue()
+            first.put_nowait(1)
+            second.put_nowait(1)
+            second.put_nowait(2)
+
+            _queues["decode"].add(first)
+            _queues["decode"].add(second)
+
+            try:
+                return _queue_depth.get(queue="decode")
+            finally:
+                _queues["decode"].discard(first)
+                _queues["decode"].discard(second)
+
+        assert run(main()) == 3
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+from asyncio import ensure_future, run, sleep
+from time import sleep as block
+
+from pincer.core.dispatch import GatewayDispatch
+from pincer.core.heartbeat import Heartbeat, _late, _latency
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message: str):
+        self.sent.append(json.loads(message))
+
+
+class TestHeartbeat:
+    hello = GatewayDispatch(10, {"heartbeat_interval": 50})
+
+    def test_beat(self):
+        """
+        Tests whether or not the hello sends a heartbeat, and an
+        acknowledgement sends the next one after the interval.
+        """
+        socket = FakeSocket()
+        heartbeat = Heartbeat()
+
+        async def main():
+            await heartbeat.handle_hello(socket, self.hello)
+            await heartbeat.handle_heartbeat(socket, None)
+
+        run(main())
+
+        assert heartbeat.get() == .05
+        assert [message["op"] for message in socket.sent] == [1, 1]
+        assert _latency.get() >= 0
+
+    def test_late(self):
+        """
+        Tests whether or not a heartbeat which is delayed by a blocked
+        loop gets counted.
+        """
+        socket = FakeSocket()
+        heartbeat = Heartbeat()
+        before = _late.get()
+
+        async def main():
+            await heartbeat.handle_hello(socket, self.hello)
+            beat = ensure_future(heartbeat.handle_heartbeat(socket, None))
+
+            await sleep(0)
+            block(.2)
+            await beat
+
+        run(main())
+        assert _late.get() - before == 1
+
+    def test_stop_resting(self):
+        """
+        Tests whether or not stopping cancels the heartbeat which is
+        resting, so it isn't sent on the next connection.
+        """
+        socket = FakeSocket()
+        heartbeat = Heartbeat()
+
+        async def main():
+            await heartbeat.handle_hello(socket, self.hello)
+            beat = ensure_future(heartbeat.handle_heartbeat(socket, None))
+
+            await sleep(0)
+            heartbeat.stop()
+            await sleep(.1)
+            return beat
+
+        beat = run(main())
+
+        assert beat.done() and not beat.cancelled()
+        assert [message["op"] for message in socket.sent] == [1]
+
+    def test_thread(self):
+        """
+        Tests whether or not the thread sends heartbeats on its own
+        schedule through the loop, until it is stopped.
+        """
+        socket = FakeSocket()
+        heartbeat = Heartbeat()
+
+        hello = GatewayDispatch(10, {"heartbeat_interval": 100})
+
+        async def main():
+            await heartbeat.handle_hello(socket, hello, threaded=True)
+            await sleep(.25)
+            await heartbeat.handle_heartbeat(socket, None)
+
+            heartbeat.stop()
+            sent = len(socket.sent)
+            await sleep(.15)
+            return sent
+
+        sent = run(main())
+
+        assert sent == 3
+        assert len(socket.sent) == sent
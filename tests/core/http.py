@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import gather, run, sleep
+
+import pytest
+from aiohttp import web
+
+from pincer.core.http import HTTPClient, _coalesced
+from pincer.core.retry import RetryPolicy
+from pincer.core.upload import File
+from pincer.exceptions import RateLimitError
+from tests.core.server import serve
+
+
+def app(status: int = 200) -> web.Application:
+    application = web.Application()
+    application["hits"] = hits = []
+
+    async def handler(request: web.Request):
+        hits.append(request.path)
+        await sleep(.05)
+        return web.json_response({"name": "guild"}, status=status)
+
+    application.router.add_get("/guilds/{id}", handler)
+    return application
+
+
+class TestCoalescing:
+    def test_deduplicated(self):
+        """
+        Tests whether or not identical concurrent GETs share one request
+        and get counted in the coalescing metric.
+        """
+        application = app()
+        before = _coalesced.get(route="guilds/{id}")
+
+        async def main():
+            async with serve(application) as url:
+                async with HTTPClient("token", base_url=url) as http:
+                    return await gather(*(
+                        http.get("guilds/123456789012345678")
+                        for _ in range(10)
+                    ))
+
+        responses = run(main())
+
+        assert len(application["hits"]) == 1
+        assert all(r == {"name": "guild"} for r in responses)
+        assert _coalesced.get(route="guilds/{id}") - before == 9
+
+    def test_copies(self):
+        """
+        Tests whether or not every caller, the first one included, gets
+        its own copy of the shared response.
+        """
+        async def caller(http: HTTPClient):
+            response = await http.get("guilds/123456789012345678")
+            seen = dict(response)
+            response["name"] = "mutated"
+            await sleep(0)
+            return seen
+
+        async def main():
+            async with serve(app()) as url:
+                async with HTTPClient("token", base_url=url) as http:
+                    return await gather(*(caller(http) for _ in range(5)))
+
+        assert all(seen == {"name": "guild"} for seen in run(main()))
+
+    def test_fresh_exceptions(self):
+        """
+        Tests whether or not every caller of a failed shared request
+        raises its own exception.
+        """
+        async def main():
+            async with serve(app(404)) as url:
+                async with HTTPClient("token", base_url=url) as http:
+                    return await gather(
+                        *(http.get("guilds/123456789012345678")
+                          for _ in range(3)),
+                        return_exceptions=True
+                    )
+
+        errors = run(main())
+
+        assert len({id(error) for error in errors}) == 3
+        assert all(error.status == 404 for error in errors)
+
+
+class TestRateLimits:
+    def test_capped(self):
+        """
+        Tests whether or not a request which keeps getting rate limited
+        raises once it used up the attempts of the retry policy.
+        """
+        requests = []
+
+        async def handler(request: web.Request):
+            requests.append(request)
+            return web.json_response(
+                {"retry_after": .01, "global": False}, status=429
+            )
+
+        application = web.Application()
+        application.router.add_get("/users/@me", handler)
+
+        async def main():
+            async with serve(application) as url:
+                async with HTTPClient(
+                    "token", base_url=url, retry_policy=RetryPolicy(3)
+                ) as http:
+                    await http.get("users/@me")
+
+        with pytest.raises(RateLimitError) as info:
+            run(main())
+
+        assert info.value.status == 429
+        assert len(requests) == 3
+
+
+class TestUploads:
+    def test_slow_upload(self):
+        """
+        Tests whether or not an upload which takes longer than the
+        timeout of an attempt is not cancelled.
+        """
+        application = web.Application()
+
+        async def handler(request: web.Request):
+            await request.read()
+            return web.json_response({"id": "1"})
+
+        application.router.add_post("/channels/1/messages", handler)
+
+        async def chunks():
+            for _ in range(5):
+                await sleep(.1)
+                yield b"x" * 1024
+
+        async def main():
+            async with serve(application) as url:
+                async with HTTPClient(
+                    "token",
+                    base_url=url,
+                    retry_policy=RetryPolicy(1, timeout=.2)
+                ) as http:
+                    return await http.post(
+                        "channels/1/messages",
+                        {"content": "logs"},
+                        files=[File(chunks, "bot.log")]
+                    )
+
+        assert run(main()) == {"id": "1"}
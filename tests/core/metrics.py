@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from math import inf, nan
+
+from pincer.core.metrics import MetricsRegistry, _fmt_value
+
+
+class TestMetrics:
+    def test_counter_fmt(self):
+        """
+        Tests whether or not a counter with labels gets rendered in the
+        Prometheus text format.
+        """
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests.", ("route",))
+        counter.inc(route="guilds/{id}")
+        counter.inc(2, route="guilds/{id}")
+
+        assert registry.render() == (
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{route="guilds/{id}"} 3\n'
+        )
+
+    def test_histogram_fmt(self):
+        """
+        Tests whether or not histogram observations are counted in
+        every bucket they fit in.
+        """
+        registry = MetricsRegistry()
+        registry.histogram("decode", "Decode.", buckets=(1, 2)).observe(1.5)
+
+        assert registry.render() == (
+            "# HELP decode Decode.\n"
+            "# TYPE decode histogram\n"
+            'decode_bucket{le="1"} 0\n'
+            'decode_bucket{le="2"} 1\n'
+            'decode_bucket{le="+Inf"} 1\n'
+            "decode_sum 1.5\n"
+            "decode_count 1\n"
+        )
+
+    def test_shared_metric(self):
+        """
+        Tests whether or not registering a metric twice returns the
+        same metric.
+        """
+        registry = MetricsRegistry()
+        assert registry.gauge("a", "A.") is registry.gauge("a", "A.")
+
+    def test_special_values(self):
+        """
+        Tests whether or not NaN and infinite values get rendered the way
+        the Prometheus text format spells them.
+        """
+        assert _fmt_value(nan) == "NaN"
+        assert _fmt_value(inf) == "+Inf"
+        assert _fmt_value(-inf) == "-Inf"
+        assert _fmt_value(2.0) == "2"
+        assert _fmt_value(.25) == "0.25"
+
+        registry = MetricsRegistry()
+        registry.gauge("ratio", "Ratio.").set(nan)
+        assert registry.render().endswith("ratio NaN\n")
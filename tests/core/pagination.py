@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import run
+from urllib.parse import parse_qs
+
+from pincer.core.pagination import Paginator
+from pincer.core.ratelimiter import Bucket
+
+IDS = list(range(1, 351))
+
+
+class FakeHTTP:
+    def __init__(self):
+        self.queries = []
+
+    def bucket(self, route, method="GET"):
+        return Bucket(route)
+
+    async def get(self, route):
+        query = parse_qs(route.split("?")[1])
+        query = {key: int(value[0]) for key, value in query.items()}
+        self.queries.append(query)
+
+        if "after" in query:
+            page = [i for i in IDS if i > query["after"]][:query["limit"]]
+        else:
+            before = query.get("before", IDS[-1] + 1)
+            page = [i for i in IDS if i < before][-query["limit"]:]
+
+        return [{"id": str(i)} for i in page]
+
+
+class TestPaginator:
+    def test_backwards(self):
+        """
+        Pages walk from the newest item with growing sizes, until a
+        page isn't full.
+        """
+        http = FakeHTTP()
+        items = run(Paginator(http, "x", first_page_size=50).flatten())
+
+        assert [int(i["id"]) for i in items] == IDS[::-1]
+        assert [q["limit"] for q in http.queries] == [50, 100, 100, 100, 100]
+
+    def test_forwards_limit(self):
+        """
+        With after and limit, only the wanted items are requested, the
+        pages start small.
+        """
+        http = FakeHTTP()
+        items = run(Paginator(http, "x", after=100, limit=120).flatten())
+
+        assert [int(i["id"]) for i in items] == IDS[100:220]
+        assert [q["limit"] for q in http.queries] == [25, 50, 45]
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import socket
+from asyncio import run
+
+from aiohttp import ClientSession, web
+
+from pincer.proxy import RestProxy
+from tests.core.server import serve
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def upstream() -> web.Application:
+    app = web.Application(client_max_size=0)
+    app["requests"] = requests = []
+
+    async def handler(request: web.Request):
+        body = await request.read()
+        requests.append((dict(request.headers), len(body)))
+
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+
+        if len(requests) == 1 and request.method == "PATCH":
+            return web.json_response(
+                {"message": "rate limited", "retry_after": .05,
+                 "global": False},
+                status=429
+            )
+
+        return web.json_response({"received": len(body)})
+
+    app.router.add_route("*", "/{tail:.*}", handler)
+    return app
+
+
+async def proxied(
+        app: web.Application,
+        method: str,
+        headers=(),
+        **kwargs
+):
+    async with serve(app) as url:
+        proxy = RestProxy(free_port(), upstream=url, buffer_limit=1024)
+        await proxy.start()
+        headers = {"Authorization": "Bot token", **dict(headers)}
+
+        try:
+            async with ClientSession() as session:
+                async with session.request(
+                        method,
+                        f"http://127.0.0.1:{proxy.port}/api/v9/users/@me",
+                        headers=headers,
+                        **kwargs
+                ) as res:
+                    return res.status, await res.read()
+        finally:
+            await proxy.stop()
+
+
+class TestRestProxy:
+    def test_conditional(self):
+        """
+        Tests whether or not the ETag of a cached response reaches
+        Discord, so it can answer with a 304.
+        """
+        app = upstream()
+        status, _ = run(proxied(
+            app, "GET", headers={"If-None-Match": '"v1"'}
+        ))
+
+        assert status == 304
+        assert app["requests"][0][0]["If-None-Match"] == '"v1"'
+
+    def test_retry_buffered(self):
+        """
+        Tests whether or not a small body is sent again after a 429.
+        """
+        app = upstream()
+        status, body = run(proxied(app, "PATCH", data=b"x" * 100))
+
+        assert status == 200
+        assert [length for _, length in app["requests"]] == [100, 100]
+
+    def test_stream(self):
+        """
+        Tests whether or not a body larger than the buffer limit
+        gets streamed to Discord intact, and a 429 for it is passed on.
+        """
+        async def chunks():
+            for _ in range(64):
+                yield b"x" * 1024
+
+        app = upstream()
+        status, body = run(proxied(app, "POST", data=chunks()))
+
+        assert status == 200 and body == b'{"received": 65536}'
+
+        app = upstream()
+        status, _ = run(proxied(app, "PATCH", data=chunks()))
+
+        assert status == 429
+        assert len(app["requests"]) == 1
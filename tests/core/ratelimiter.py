@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from asyncio import ensure_future, run, sleep, wait_for
+
+from pincer.core.ratelimit_store import SharedRateLimitStore
+from pincer.core.ratelimiter import (
+    GlobalLimiter, RateLimiter, major_parameter
+)
+
+
+class TestRateLimiter:
+    channel = "channels/123456789012345678/messages"
+    other_channel = "channels/876543210987654321/messages"
+    headers = {
+        "X-RateLimit-Bucket": "abcd",
+        "X-RateLimit-Limit": "5",
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset-After": "10"
+    }
+
+    def test_major_parameter(self):
+        """
+        Tests whether or not the channel, guild or webhook id is used as
+        major parameter.
+        """
+        assert major_parameter(self.channel) == "123456789012345678"
+        assert major_parameter("users/123456789012345678") == ""
+
+    def test_bucket_hash(self):
+        """
+        Tests whether or not a route gets mapped to its bucket hash, while
+        its major parameters keep separate limits.
+        """
+        limiter = RateLimiter()
+        bucket = limiter.bucket("GET", self.channel)
+
+        assert limiter.update(bucket, "GET", self.channel, self.headers) \
+            is bucket
+        assert limiter.bucket("GET", self.channel) is bucket
+        assert bucket.key == ("abcd", "123456789012345678")
+        assert bucket.delay() > 9
+
+        other = limiter.bucket("GET", self.other_channel)
+        assert other is not bucket
+        assert other.delay() == 0
+
+    def test_moved_waiters(self):
+        """
+        Tests whether or not requests which queued on a route before its
+        bucket hash was known wait on the known bucket afterwards.
+        """
+        async def main():
+            limiter = RateLimiter()
+            known = limiter.bucket("GET", self.channel)
+            limiter.update(known, "GET", self.channel, self.headers)
+
+            provisional = limiter.bucket("POST", self.channel)
+            assert await limiter.acquire(provisional, self.channel) \
+                is provisional
+
+            waiting = ensure_future(limiter.acquire(provisional, self.channel))
+            await sleep(0)
+
+            assert limiter.update(
+                provisional, "POST", self.channel, self.headers
+            ) is known
+            provisional.release()
+            await sleep(.05)
+            assert not waiting.done()
+
+            known.update({
+                **self.headers,
+                "X-RateLimit-Remaining": "1",
+                "X-RateLimit-Reset-After": "20"
+            })
+            return await wait_for(waiting, 1) is known
+
+        assert run(main())
+
+    def test_global_pause(self):
+        """
+        Tests whether or not a global rate limit holds back all requests
+        until it has passed.
+        """
+        limiter = GlobalLimiter()
+        assert limiter.delay() == 0
+
+        limiter.pause(5)
+        assert 4 < limiter.delay() <= 5
+
+    def test_shared_store(self, tmp_path):
+        """
+        Tests whether or not requests claimed through one store are seen
+        by another store on the same file.
+        """
+        path = str(tmp_path / "ratelimits")
+        first, second = SharedRateLimitStore(path), SharedRateLimitStore(path)
+        key = ("abcd", "123456789012345678")
+
+        first.update(key, 5, 1, 10)
+        assert second.acquire(key) == 0
+        assert 9 < first.acquire(key) <= 10
+
+        first.close()
+        second.close()
+
+    def test_full_store(self, tmp_path, caplog):
+        """
+        Tests whether or not a full store keeps the buckets which are
+        still limited and lets other buckets through.
+        """
+        store = SharedRateLimitStore(str(tmp_path / "ratelimits"), slots=1)
+        key = ("abcd", "123456789012345678")
+        other = ("efgh", "123456789012345678")
+
+        store.update(key, 5, 0, 10)
+        store.update(other, 5, 0, 10)
+
+        assert store.acquire(other) == 0
+        assert 9 < store.acquire(key) <= 10
+        assert "is full" in caplog.text
+
+        store.close()
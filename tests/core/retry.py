@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from pincer.core.retry import RetryPolicy
+
+
+class TestRetryPolicy:
+    def test_should_retry(self):
+        """
+        Tests whether or not only idempotent requests get retried after
+        a server error, until the attempts run out.
+        """
+        policy = RetryPolicy(3)
+
+        assert policy.should_retry("GET", 1, 503)
+        assert not policy.should_retry("GET", 3, 503)
+        assert not policy.should_retry("POST", 1, 503)
+        assert not policy.should_retry("GET", 1, 501)
+
+    def test_backoff(self):
+        """
+        Tests whether or not the delay honors Retry-After and otherwise
+        stays below the capped exponential bound.
+        """
+        policy = RetryPolicy(base=1, cap=4)
+
+        assert policy.backoff(1, retry_after=2.5) == 2.5
+        assert 0 <= policy.backoff(2) <= 2
+        assert 0 <= policy.backoff(10) <= 4
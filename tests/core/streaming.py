@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import json
+
+import pytest
+
+from pincer.core.streaming import StreamedArray, stream_decode
+
+
+class TestStreaming:
+    payload = (
+        '{"t": "GUILD_CREATE", "s": 2, "op": 0, "d": {'
+        '"members": [{"id": 1}, {"id": 2}], "channels": [], '
+        '"id": "123", "roles": [{"id": 3}]}}'
+    )
+
+    def test_stream_decode(self):
+        """
+        Tests whether or not the configured arrays get streamed and the
+        rest of the payload gets decoded as usual.
+        """
+        dispatch = stream_decode(
+            self.payload, {"GUILD_CREATE": ("members", "channels")}
+        )
+        members = dispatch.data["members"]
+
+        assert isinstance(members, StreamedArray)
+        assert len(members) == 2
+        assert list(members) == [{"id": 1}, {"id": 2}]
+        assert list(dispatch.data["channels"]) == []
+        assert dispatch.data["roles"] == [{"id": 3}]
+        assert dispatch.data["id"] == "123"
+        assert (dispatch.op, dispatch.seq) == (0, 2)
+
+    def test_other_event(self):
+        """
+        Tests whether or not events which are not configured for
+        streaming are left to the regular decoder.
+        """
+        assert stream_decode(self.payload, {"READY": ("guilds",)}) is None
+
+    def test_scan(self):
+        """
+        Tests whether or not the bounds and length of an array are found
+        when its strings contain brackets, commas and escaped quotes.
+        """
+        elements = [
+            {"name": "a [b], {c}", "nested": [[1, 2], {"d": []}]},
+            'quote \\" ], "', 3, None, [], {}
+        ]
+        doc = '{"x": ' + json.dumps(elements) + ' , "y": 1}'
+
+        array, end = StreamedArray.scan(doc, doc.index("["))
+
+        assert len(array) == len(elements)
+        assert list(array) == elements
+        assert doc[end:] == ' , "y": 1}'
+
+    def test_scan_empty(self):
+        """Tests whether or not empty arrays have no elements."""
+        array, end = StreamedArray.scan("[ ]", 0)
+        assert (len(array), list(array), end) == (0, [], 3)
+
+    def test_scan_does_not_decode(self):
+        """
+        Tests whether or not scanning leaves the elements undecoded,
+        they are only decoded while iterating.
+        """
+        array, _ = StreamedArray.scan('[{"a": tru}, 1]', 0)
+        assert len(array) == 2
+
+        with pytest.raises(ValueError):
+            list(array)
+
+    def test_late_event_name(self):
+        """
+        Tests whether or not the event name is found when it comes after
+        the event data, which has a key of the same name.
+        """
+        payload = json.dumps({
+            "op": 0,
+            "d": {"t": "READY", "members": [{"id": i} for i in range(50)]},
+            "s": 2,
+            "t": "GUILD_CREATE"
+        })
+        dispatch = stream_decode(payload, {"GUILD_CREATE": ("members",)})
+
+        assert dispatch.event_name == "GUILD_CREATE"
+        assert isinstance(dispatch.data["members"], StreamedArray)
+        assert len(dispatch.data["members"]) == 50
+        assert stream_decode(payload, {"READY": ("members",)}) is None
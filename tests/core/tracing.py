@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import create_task, gather, run, sleep
+
+from aiohttp import web
+
+from pincer.core.http import HTTPClient
+from pincer.core.tracing import (
+    TraceConfig, TraceSignal, current_trace, ensure_trace, send_trace,
+    start_trace, use_trace
+)
+from tests.core.server import serve
+
+
+class TestTracing:
+    def test_signal(self):
+        """
+        Tests whether or not a signal calls both regular and coroutine
+        functions with the context and params.
+        """
+        calls = []
+
+        async def callback(ctx, params):
+            calls.append(("async", ctx, params))
+
+        signal = TraceSignal()
+        signal.append(lambda ctx, params: calls.append(("sync", ctx, params)))
+        signal.append(callback)
+
+        run(signal.send("ctx", "params"))
+        assert calls == [
+            ("sync", "ctx", "params"), ("async", "ctx", "params")
+        ]
+
+    def test_propagation(self):
+        """
+        Tests whether or not tasks inherit the trace of the task which
+        created them, and not the one of their siblings.
+        """
+        async def child():
+            return current_trace()
+
+        async def event(name):
+            ctx = start_trace(name)
+            await sleep(0)
+            return ctx, await create_task(child())
+
+        async def main():
+            return await gather(event("a"), event("b"))
+
+        (a, a_child), (b, b_child) = run(main())
+
+        assert a is a_child and b is b_child
+        assert a is not b and a.event_name == "a"
+
+    def test_ensure_trace(self):
+        """
+        Tests whether or not a trace started by ``ensure_trace`` only
+        lasts for the with block, and an existing one is reused.
+        """
+        async def main():
+            with ensure_trace() as temporary:
+                assert current_trace() is temporary
+
+            assert current_trace() is None
+
+            ctx = start_trace()
+            with ensure_trace() as reused:
+                assert reused is ctx
+
+            use_trace(None)
+            return current_trace()
+
+        assert run(main()) is None
+
+    def test_send_trace(self):
+        """
+        Tests whether or not sending a stage without a trace starts one.
+        """
+        config = TraceConfig()
+        seen = []
+        config.on_handler_start.append(lambda ctx, _: seen.append(ctx))
+
+        async def main():
+            await send_trace([config], "on_handler_start", None)
+            return current_trace()
+
+        assert seen == [run(main())]
+
+    def test_coalesced_attribution(self):
+        """
+        Tests whether or not a caller which shares the request of
+        another one gets the coalesced stage in its own trace.
+        """
+        config = TraceConfig()
+        stages = []
+
+        for signal in ("on_request_start", "on_request_coalesced"):
+            getattr(config, signal).append(
+                lambda ctx, _, signal=signal: stages.append(
+                    (signal, ctx.event_name)
+                )
+            )
+
+        async def handler(_):
+            await sleep(.05)
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_get("/users/{id}", handler)
+
+        async def caller(http, name):
+            start_trace(name)
+            await http.get("users/@me")
+
+        async def main():
+            async with serve(app) as url:
+                async with HTTPClient(
+                    "token", base_url=url, trace_configs=[config]
+                ) as http:
+                    await gather(caller(http, "a"), caller(http, "b"))
+
+        run(main())
+        assert sorted(stages) == [
+            ("on_request_coalesced", "b"), ("on_request_start", "a")
+        ]
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import tracemalloc
+from asyncio import run
+from io import BytesIO
+from json import loads
+
+import pytest
+
+from pincer.core.upload import CHUNK_SIZE, File, multipart_form
+
+
+class Sink:
+    """Collects what a multipart body writes."""
+
+    def __init__(self, keep: bool = True):
+        self.keep = keep
+        self.size = 0
+        self.data = bytearray()
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+
+        if self.keep:
+            self.data += chunk
+
+
+async def read(file: File) -> bytes:
+    return b"".join([bytes(chunk) async for chunk in file.chunks()])
+
+
+class NonSeekable:
+    """A file object without ``seekable``, like some sockets or pipes."""
+
+    name = "pipe.bin"
+
+    def __init__(self, data: bytes):
+        self.buffer = BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.buffer.read(size)
+
+
+class TestFile:
+    def test_bytes(self):
+        """Tests whether or not bytes are sent in chunks."""
+        data = b"a" * (CHUNK_SIZE + 1)
+        file = File(data, "data.bin")
+
+        assert run(read(file)) == data
+        assert file.rewindable
+
+    def test_path(self, tmp_path):
+        """Tests whether or not a path is read and named after the file."""
+        path = tmp_path / "bot.log"
+        path.write_bytes(b"log")
+        file = File(path)
+
+        assert file.filename == "bot.log"
+        assert run(read(file)) == b"log"
+
+    def test_rewind(self):
+        """Tests whether or not a seekable file is sent from its start."""
+        source = BytesIO(b"skipped content")
+        source.seek(8)
+        file = File(source, "content.txt")
+
+        assert run(read(file)) == b"content"
+        file.rewind()
+        assert run(read(file)) == b"content"
+
+    def test_non_seekable(self):
+        """
+        Tests whether or not a file object without ``seekable`` can be
+        sent once but not rewound.
+        """
+        file = File(NonSeekable(b"data"))
+
+        assert file.filename == "pipe.bin"
+        assert run(read(file)) == b"data"
+        assert not file.rewindable
+
+        with pytest.raises(ValueError):
+            file.rewind()
+
+    def test_async_iterable(self):
+        """
+        Tests whether or not async iterables are sent once and factories
+        on every attempt.
+        """
+        async def chunks():
+            yield b"a"
+            yield b"b"
+
+        once = File(chunks(), "once.txt")
+        factory = File(chunks, "factory.txt")
+
+        assert run(read(once)) == b"ab"
+        assert not once.rewindable
+
+        assert run(read(factory)) == b"ab"
+        factory.rewind()
+        assert run(read(factory)) == b"ab"
+
+    def test_filename_required(self):
+        """Tests whether or not unnamed sources need a filename."""
+        with pytest.raises(ValueError):
+            File(b"data")
+
+    def test_spoiler(self):
+        """Tests whether or not spoilers get the filename prefix."""
+        assert File(b"", "a.png", spoiler=True).filename == "SPOILER_a.png"
+
+
+class TestMultipartForm:
+    def test_parts(self):
+        """
+        Tests whether or not the form has the JSON payload with the
+        attachment metadata followed by the files.
+        """
+        files = [
+            File(b"first", "a.txt", description="A"),
+            File(b"second", "b.txt")
+        ]
+        form = multipart_form({"content": "hi"}, files)
+        sink = Sink()
+
+        run(form.write(sink))
+        body = bytes(sink.data)
+        payload = body.split(b"\r\n\r\n", 1)[1].split(b"\r\n--", 1)[0]
+
+        assert loads(payload) == {
+            "content": "hi",
+            "attachments": [
+                {"id": 0, "filename": "a.txt", "description": "A"},
+                {"id": 1, "filename": "b.txt"}
+            ]
+        }
+        assert b'name="files[0]"; filename="a.txt"' in body
+        assert b'name="files[1]"; filename="b.txt"' in body
+        assert b"\r\n\r\nfirst\r\n" in body
+        assert b"\r\n\r\nsecond\r\n" in body
+
+    def test_memory(self, tmp_path):
+        """
+        Tests whether or not a large file is streamed without being
+        loaded into memory.
+        """
+        size = 32 * 1024 * 1024
+        path = tmp_path / "large.bin"
+
+        with open(path, "wb") as file:
+            file.truncate(size)
+
+        async def main():
+            sink = Sink(keep=False)
+            await multipart_form(None, [File(path)]).write(sink)
+            return sink.size
+
+        tracemalloc.start()
+
+        try:
+            written = run(main())
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert written > size
+        assert peak < size / 8
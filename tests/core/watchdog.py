@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# MIT License
+#
+# Copyright (c) 2021 Pincer
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from asyncio import all_tasks, current_task, get_running_loop, run, sleep
+from time import sleep as block
+
+from pincer.core.tracing import (
+    HandlerEndParams, HandlerStartParams, send_trace, start_trace
+)
+from pincer.core.watchdog import LoopWatchdog
+
+
+def on_message():
+    block(.3)
+
+
+class TestLoopWatchdog:
+    def test_attribution(self):
+        """
+        Tests whether or not a blocking handler is detected and the
+        stall gets attributed to it and its event.
+        """
+        watchdog = LoopWatchdog(.1, interval=.02)
+
+        async def main():
+            watchdog.start(get_running_loop())
+            await sleep(.05)
+
+            start_trace("MESSAGE_CREATE")
+            await send_trace(
+                [watchdog], "on_handler_start",
+                HandlerStartParams("on_message", on_message)
+            )
+            on_message()
+            await send_trace(
+                [watchdog], "on_handler_end",
+                HandlerEndParams("on_message", on_message)
+            )
+
+            await watchdog.stop()
+
+        run(main())
+        stall = watchdog.last_stall
+
+        assert stall is not None and stall.duration >= .1
+        assert stall.stage == "handler on_message"
+        assert stall.event_name == "MESSAGE_CREATE"
+        assert any("on_message" in line for line in stall.stack)
+
+    def test_no_stall(self):
+        """
+        Tests whether or not a loop which isn't blocked isn't reported.
+        """
+        watchdog = LoopWatchdog(.1, interval=.02)
+
+        async def main():
+            watchdog.start(get_running_loop())
+            await sleep(.2)
+            await watchdog.stop()
+
+        run(main())
+        assert watchdog.last_stall is None
+
+    def test_stop(self):
+        """
+        Tests whether or not stopping waits until the ticker is done.
+        """
+        watchdog = LoopWatchdog()
+
+        async def main():
+            watchdog.start(get_running_loop())
+            await watchdog.stop()
+            return all_tasks() - {current_task()}
+
+        assert run(main()) == set()